@@ -1,13 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import os
 import io
+import re
+import json
+import shutil
+import sys
+import hashlib
 import pdfplumber
 from dotenv import load_dotenv
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import statistics
+import threading
+import multiprocessing
+import time
+from collections import OrderedDict
+import uuid
+import contextlib
+try:
+    import fcntl
+except ImportError:  # Windows: single-worker development servers only
+    fcntl = None
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 load_dotenv() 
 
@@ -23,42 +44,251 @@ if GEMINI_API_KEY:
 
 ANSWER_MODE = os.getenv("ANSWER_MODE", "ai-only").strip().lower()
 CSV_CONTEXT_MAX_CHARS = int(os.getenv("CSV_CONTEXT_MAX_CHARS", "120000"))
-
+# LLM context for /chat: "retrieval" sends the CHAT_CONTEXT_ROWS transactions most relevant
+# to the question plus aggregate summaries, "full" the last CSV_CONTEXT_MAX_CHARS of all of them
+CHAT_CONTEXT_MODE = os.getenv("CHAT_CONTEXT_MODE", "retrieval").strip().lower()
+CHAT_CONTEXT_ROWS = int(os.getenv("CHAT_CONTEXT_ROWS", "200"))
+# Rows per chunk for streaming CSV ingestion (0 reads the whole file at once)
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "0"))
+# Worker processes for Kotak PDF table extraction (1 extracts every page in the request thread)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "1"))
+# Statements shorter than this are not worth starting a process pool for
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+# On-disk cache of parsed uploads keyed by file content (unset disables it)
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "").strip()
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "256"))
+# Per-session datasets: idle sessions expire after the TTL, and the least recently used
+# ones are evicted once the estimated size of all datasets exceeds the budget
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_STORE_MAX_MB = int(os.getenv("SESSION_STORE_MAX_MB", "512"))
+# Directory shared by all workers for Arrow snapshots of session datasets (unset keeps
+# datasets in the uploading worker's memory only)
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "").strip()
+# Queue uploads as background jobs (/upload returns a job id to poll) instead of parsing
+# them inside the request
+ASYNC_UPLOADS = os.getenv("ASYNC_UPLOADS", "false").strip().lower() in ("1", "true", "yes")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# "sketch" answers the /advanced-analytics statistics from a quantile sketch kept up to date
+# as rows are ingested, with quantiles within ANALYTICS_SKETCH_ACCURACY relative error
+ANALYTICS_STATS_MODE = os.getenv("ANALYTICS_STATS_MODE", "exact").strip().lower()
+ANALYTICS_SKETCH_ACCURACY = float(os.getenv("ANALYTICS_SKETCH_ACCURACY", "0.01"))
+# How long the Gemini model that answered is reused before the candidates are walked again,
+# and the first backoff of a model that is missing or down (doubling on each failure)
+LLM_MODEL_TTL_SECONDS = int(os.getenv("LLM_MODEL_TTL_SECONDS", "3600"))
+LLM_BREAKER_SECONDS = int(os.getenv("LLM_BREAKER_SECONDS", "30"))
+# /chat answers kept per (dataset version, answer mode, normalized question): for how long,
+# and the memory cap of all of them together (0 disables the cache)
+CHAT_CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL_SECONDS", "3600"))
+CHAT_CACHE_MAX_MB = float(os.getenv("CHAT_CACHE_MAX_MB", "8"))
+
+
+# Gemini models to try, in order of preference (based on actual available models)
+_LLM_MODELS = [
+    "models/gemini-2.5-flash",
+    "models/gemini-2.0-flash",
+    "models/gemini-flash-latest",
+    "models/gemini-2.5-pro",
+    "models/gemini-2.0-flash-exp",
+    "models/gemini-pro-latest",
+]
+# Longest a failing model is skipped for (its backoff doubles from LLM_BREAKER_SECONDS)
+_LLM_BREAKER_MAX_SECONDS = 3600
+# Model state shared by all requests (guarded by _LLM_LOCK):
+#   clients  - GenerativeModel per model name, reused across requests
+#   resolved - (model name, time.monotonic() it expires) of the last model that answered
+#   breakers - model name -> (consecutive failures, time.monotonic() it may be tried again)
+_LLM_STATE = {"clients": {}, "resolved": None, "breakers": {}}
+_LLM_LOCK = threading.Lock()
+
+# Errors meaning a model is missing or down, by type or, for errors raised as other types,
+# by the HTTP status that starts the message or a gRPC status name ("429 ... limit: 1500" is not)
+_LLM_MODEL_ERRORS = (google_exceptions.NotFound, google_exceptions.InternalServerError,
+                     google_exceptions.ServiceUnavailable)
+_LLM_MODEL_ERROR_STATUS = re.compile(r"^\s*(?:404|500|503)\b|\b(?:NOT_FOUND|INTERNAL|UNAVAILABLE)\b")
+
+def _llm_model_error(error: Exception) -> bool:
+    """Whether an error means this model is unusable (missing or down), so the next should be tried."""
+    return isinstance(error, _LLM_MODEL_ERRORS) or bool(_LLM_MODEL_ERROR_STATUS.search(str(error)))
+
+def _llm_candidates(now: float) -> list:
+    """Models to try: the resolved one while fresh, then the rest whose breakers are closed."""
+    with _LLM_LOCK:
+        resolved = _LLM_STATE["resolved"]
+        breakers = _LLM_STATE["breakers"]
+        first = [resolved[0]] if resolved and resolved[1] > now else []
+        return first + [name for name in _LLM_MODELS
+                        if name not in first and breakers.get(name, (0, 0))[1] <= now]
+
+def _llm_client(model_name: str):
+    with _LLM_LOCK:
+        client = _LLM_STATE["clients"].get(model_name)
+        if client is None:
+            client = _LLM_STATE["clients"][model_name] = genai.GenerativeModel(model_name)
+        return client
 
 def _llm_chat(prompt: str):
     """Call Gemini API directly.
     Returns (answer, meta) or raises an Exception with the last error.
+
+    The model that answers is reused for LLM_MODEL_TTL_SECONDS; models that are missing or
+    down are skipped behind a per-model circuit breaker with exponential backoff.
     """
     if not GEMINI_API_KEY:
         raise RuntimeError("LLM client not configured")
 
-    # Try different Gemini models with correct identifiers (based on actual available models)
-    candidates = [
-        "models/gemini-2.5-flash",
-        "models/gemini-2.0-flash",
-        "models/gemini-flash-latest",
-        "models/gemini-2.5-pro",
-        "models/gemini-2.0-flash-exp",
-        "models/gemini-pro-latest",
-    ]
-
     last_err = None
-    for model_name in candidates:
+    for model_name in _llm_candidates(time.monotonic()):
         try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
-            return response.text, {"model": model_name}
+            response = _llm_client(model_name).generate_content(prompt)
+            answer = response.text
         except Exception as e:
             msg = str(e)
             last_err = msg
-            # If it's a NOT_FOUND/404 for a given model, try the next
-            if "404" in msg or "NOT_FOUND" in msg or "was not found" in msg or "not found" in msg:
-                continue
-            # other errors should stop the loop
-            break
-
-    raise RuntimeError(last_err or "Unknown LLM error")
+            # Other errors (quota, key, prompt) would fail on every model: stop
+            if not _llm_model_error(e):
+                break
+            _llm_model_failed(model_name, msg)
+            continue
+        _llm_model_answered(model_name)
+        return answer, {"model": model_name}
+
+    raise RuntimeError(last_err or "All LLM models are temporarily unavailable")
+
+def _llm_stream(prompt: str, meta: dict):
+    """Streaming _llm_chat: yields the answer text as Gemini generates it and records the
+    model that answers in meta. Other models are only tried while none has sent a chunk."""
+    if not GEMINI_API_KEY:
+        raise RuntimeError("LLM client not configured")
 
+    last_err = None
+    for model_name in _llm_candidates(time.monotonic()):
+        try:
+            chunks = iter(_llm_client(model_name).generate_content(prompt, stream=True))
+            first = next(chunks, None)
+            text = first.text if first is not None else ""
+        except Exception as e:
+            msg = str(e)
+            last_err = msg
+            if not _llm_model_error(e):
+                break
+            _llm_model_failed(model_name, msg)
+            continue
+        _llm_model_answered(model_name)
+        meta["model"] = model_name
+        yield text
+        for chunk in chunks:
+            yield chunk.text
+        return
+
+    raise RuntimeError(last_err or "All LLM models are temporarily unavailable")
+
+def _llm_model_failed(model_name: str, msg: str):
+    """Open (or extend) the breaker of a model that is missing or down."""
+    with _LLM_LOCK:
+        failures = _LLM_STATE["breakers"].get(model_name, (0, 0))[0] + 1
+        backoff = min(LLM_BREAKER_SECONDS * 2 ** (failures - 1), _LLM_BREAKER_MAX_SECONDS)
+        _LLM_STATE["breakers"][model_name] = (failures, time.monotonic() + backoff)
+        if _LLM_STATE["resolved"] and _LLM_STATE["resolved"][0] == model_name:
+            _LLM_STATE["resolved"] = None
+    print(f"LLM model {model_name} unavailable, skipping it for {backoff:.0f}s: {msg[:200]}")
+
+def _llm_model_answered(model_name: str):
+    """Close the breaker of a model that answered and reuse it for LLM_MODEL_TTL_SECONDS."""
+    with _LLM_LOCK:
+        _LLM_STATE["breakers"].pop(model_name, None)
+        _LLM_STATE["resolved"] = (model_name, time.monotonic() + LLM_MODEL_TTL_SECONDS)
+
+# LLM answers to /chat questions (least recently used first): key -> (answer, meta, bytes,
+# time.monotonic() it expires). Keys hold the dataset version, so a new upload never sees the
+# answers about the previous data; those age out with the TTL or are evicted above the cap.
+_ANSWER_CACHE = OrderedDict()
+_ANSWER_CACHE_LOCK = threading.Lock()
+_ANSWER_CACHE_STATE = {"bytes": 0}
+
+def _answer_cache_key(entry: dict, question: str) -> tuple:
+    """Cache key of a question about a session's dataset: case, punctuation and spacing are ignored."""
+    words = re.findall(r"[a-z0-9₹]+(?:\.[0-9]+)?", (question or "").lower())
+    return (entry["version"], ANSWER_MODE, " ".join(words))
+
+def _cached_answer(key: tuple):
+    """(answer, meta) cached for key, or None if missing or expired."""
+    if CHAT_CACHE_MAX_MB <= 0:
+        return None
+    now = time.monotonic()
+    with _ANSWER_CACHE_LOCK:
+        cached = _ANSWER_CACHE.get(key)
+        if cached is None:
+            return None
+        if cached[3] <= now:
+            del _ANSWER_CACHE[key]
+            _ANSWER_CACHE_STATE["bytes"] -= cached[2]
+            return None
+        _ANSWER_CACHE.move_to_end(key)
+        return cached[0], cached[1]
+
+def _cache_answer(key: tuple, answer: str, meta: dict):
+    """Keep an answer for CHAT_CACHE_TTL_SECONDS. Least recently used answers are evicted
+    while they have expired or all answers exceed CHAT_CACHE_MAX_MB."""
+    if CHAT_CACHE_MAX_MB <= 0:
+        return
+    size = len(answer.encode("utf-8")) + len(key[2]) + len(key[0]) + 256  # plus tuple/dict overhead
+    now = time.monotonic()
+    with _ANSWER_CACHE_LOCK:
+        old = _ANSWER_CACHE.pop(key, None)
+        if old is not None:
+            _ANSWER_CACHE_STATE["bytes"] -= old[2]
+        _ANSWER_CACHE[key] = (answer, dict(meta), size, now + CHAT_CACHE_TTL_SECONDS)
+        _ANSWER_CACHE_STATE["bytes"] += size
+        limit = CHAT_CACHE_MAX_MB * 1024 * 1024
+        while len(_ANSWER_CACHE) > 1:
+            oldest = next(iter(_ANSWER_CACHE.values()))
+            if oldest[3] > now and _ANSWER_CACHE_STATE["bytes"] <= limit:
+                break
+            _ANSWER_CACHE_STATE["bytes"] -= _ANSWER_CACHE.popitem(last=False)[1][2]
+
+
+def _clean_answer(text: str) -> str:
+    """Chat-style LLM answer: Markdown, lists and extra blank lines removed."""
+    # Remove Markdown bold/italic, bullets, and numbers
+    text = re.sub(r"\*\*([^*]+)\*\*", r"\1", text)
+    text = re.sub(r"\*([^*]+)\*", r"\1", text)
+    text = re.sub(r"^\s*[-*]\s+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^\s*\d+\.\s+", "", text, flags=re.MULTILINE)
+    # Remove extra newlines, keep max 2 in a row
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    # Add a space after every sentence for chat feel
+    text = re.sub(r"([.!?])([^ \n])", r"\1 \2", text)
+    # Remove leading/trailing whitespace
+    return text.strip()
+
+_ANSWER_LINE_START = re.compile(r"[\s*.\d-]*")
+
+def _clean_answer_settled(raw: str) -> int:
+    """Length of the start of a partial answer that later text can no longer change once
+    cleaned: it ends before trailing whitespace, before a line with nothing but bullet or
+    numbering characters so far, and before any * that is not yet part of a closed pair."""
+    cut = len(raw.rstrip())
+    line_start = raw.rfind("\n", 0, cut) + 1
+    if _ANSWER_LINE_START.fullmatch(raw, line_start, cut):
+        cut = line_start
+    # A trailing * may still become **; otherwise back off until every * is paired
+    while cut and (raw[cut - 1] == "*" or "*" in re.sub(r"\*([^*]+)\*", "", re.sub(r"\*\*([^*]+)\*\*", r"\1", raw[:cut]))):
+        cut = raw.rfind("*", 0, cut)
+    return cut
+
+def _clean_answer_stream(chunks):
+    """_clean_answer applied while an answer streams in: yields the cleaned text in pieces,
+    each as soon as later chunks can no longer change it."""
+    raw, sent = "", ""
+    for chunk in chunks:
+        raw += chunk
+        cleaned = _clean_answer(raw[:_clean_answer_settled(raw)])
+        if len(cleaned) > len(sent) and cleaned.startswith(sent):
+            yield cleaned[len(sent):]
+            sent = cleaned
+    cleaned = _clean_answer(raw)
+    if len(cleaned) > len(sent) and cleaned.startswith(sent):
+        yield cleaned[len(sent):]
 
 def _savings_intent(text: str) -> bool:
     t = (text or "").lower()
@@ -69,51 +299,48 @@ def _savings_intent(text: str) -> bool:
     return any(k in t for k in keywords)
 
 
-def _local_savings_suggestions(df: pd.DataFrame) -> str:
-    if df is None or df.empty or "Amount" not in df.columns:
+def _local_savings_suggestions(entry: dict) -> str:
+    """Savings suggestions from a session entry's aggregates (see _build_aggregates).
+
+    Computed once per dataset version and kept with its aggregates.
+    """
+    aggregates = entry["aggregates"]
+    if not aggregates or not aggregates["rows"] or "Amount" not in aggregates["columns"]:
         return "I need valid transaction data (Amount column) to suggest savings."
+    if "savings" not in aggregates:
+        aggregates["savings"] = _savings_suggestions(entry)
+    return aggregates["savings"]
+
+def _savings_suggestions(entry: dict) -> str:
+    aggregates = entry["aggregates"]
     # Basic aggregates
     cat_totals = (
-        df.groupby("Category")["Amount"].sum().sort_values(ascending=False)
-        if "Category" in df.columns else None
-    )
-    cat_medians = (
-        df.groupby("Category")["Amount"].median() if "Category" in df.columns else None
+        aggregates["by"][("Category",)]["sum"].sort_values(ascending=False)
+        if ("Category",) in aggregates["by"] else None
     )
+    cat_medians = _aggregate(entry, "category_medians")
     # Treat Description as merchant/item label
-    desc_stats = (
-        df.groupby(["Description"])
-          .agg(total=("Amount", "sum"), avg=("Amount", "mean"), count=("Amount", "count"))
-          .sort_values("total", ascending=False)
-          .reset_index()
-    )
-    # Attach category for each description by its most frequent category
-    if "Category" in df.columns:
-        top_cat = (
-            df.groupby(["Description", "Category"]).size().reset_index(name="n")
-              .sort_values(["Description", "n"], ascending=[True, False])
-              .drop_duplicates("Description")[["Description", "Category"]]
-        )
-        desc_stats = desc_stats.merge(top_cat, on="Description", how="left")
+    by_desc = aggregates["by"][("Description",)]
+    desc_stats = pd.DataFrame(
+        {"total": by_desc["sum"], "avg": by_desc["sum"] / by_desc["count"], "count": by_desc["count"]}
+    ).sort_values("total", ascending=False)
+    # Attach category for each description by its most frequent category (first on ties)
+    if ("Description", "Category") in aggregates["by"]:
+        counts = aggregates["by"][("Description", "Category")]["count"].reset_index()
+        modal = counts.loc[counts.groupby("Description", observed=True)["count"].idxmax()]
+        desc_stats["Category"] = modal.set_index("Description")["Category"]
     # Compute premium vs category median
     if cat_medians is not None and not cat_medians.empty and "Category" in desc_stats.columns:
-        def premium(row):
-            cat = row.get("Category")
-            med = cat_medians.get(cat, None)
-            if med and med > 0:
-                return (row["avg"] - med) / med
-            return 0.0
-        desc_stats["premium_vs_cat_median"] = desc_stats.apply(premium, axis=1)
+        median = pd.Series(cat_medians.reindex(desc_stats["Category"].to_numpy()).to_numpy(), index=desc_stats.index)
+        desc_stats["premium_vs_cat_median"] = ((desc_stats["avg"] - median) / median).where(median > 0, 0.0)
     else:
         desc_stats["premium_vs_cat_median"] = 0.0
+    desc_stats = desc_stats.reset_index()
 
-    # Detect subscription-like: same amount repeating (low unique amounts and count>=2)
+    # Subscriptions: recurring payments, costliest first (see _recurring_payments)
     subs = []
-    if "Description" in df.columns:
-        for desc, grp in df.groupby("Description"):
-            amounts = grp["Amount"].dropna()
-            if len(amounts) >= 2 and amounts.nunique() == 1:
-                subs.append((desc, float(amounts.iloc[0]), len(amounts)))
+    for desc, row in _aggregate(entry, "recurring").head(6).iterrows():
+        subs.append((desc, row["period"], abs(float(row["amount"])), int(row["count"]), float(row["annual_cost"])))
 
     suggestions = []
     # 1) Biggest categories to target
@@ -142,9 +369,9 @@ def _local_savings_suggestions(df: pd.DataFrame) -> str:
             )
 
     # 3) Subscriptions
-    for desc, amt, cnt in subs:
+    for desc, period, amt, cnt, annual in subs:
         suggestions.append(
-            f"Subscription-like: {desc} appears {cnt}× at Rs {amt:.0f}. Check for plan downgrades or duplicate charges."
+            f"Recurring {period} payment: {desc} ({cnt}× at about Rs {amt:.0f}, ~Rs {annual:.0f} a year). Check for plan downgrades or duplicate charges."
         )
 
     # Keep it concise
@@ -154,26 +381,259 @@ def _local_savings_suggestions(df: pd.DataFrame) -> str:
     return "Here are ways you can save based on your transactions:\n- " + "\n- ".join(suggestions[:6])
 
 
-def _summaries_for_llm(df: pd.DataFrame) -> str:
+def _summaries_for_llm(aggregates: dict) -> str:
     lines = []
-    if df is None or df.empty:
+    if not aggregates or not aggregates["rows"]:
         return ""
-    if "Category" in df.columns and "Amount" in df.columns:
-        cat_totals = df.groupby("Category")["Amount"].sum().sort_values(ascending=False)
+    if ("Category",) in aggregates["by"]:
+        cat_totals = aggregates["by"][("Category",)]["sum"].sort_values(ascending=False)
         top = ", ".join([f"{c}: Rs {v:.0f}" for c, v in cat_totals.head(5).items()])
         lines.append(f"Top categories by spend: {top}")
-    if "Description" in df.columns and "Amount" in df.columns:
-        desc_totals = df.groupby("Description")["Amount"].sum().sort_values(ascending=False)
+    if ("Description",) in aggregates["by"]:
+        desc_totals = aggregates["by"][("Description",)]["sum"].sort_values(ascending=False)
         topd = ", ".join([f"{d}: Rs {v:.0f}" for d, v in desc_totals.head(5).items()])
         lines.append(f"Top merchants/items: {topd}")
     return "\n".join(lines)
 
-# Globals for uploaded data
-transactions_df = None
-csv_text = ""
+# Uploaded data, one dataset per session (least recently used first). Each entry holds:
+#   df           - compacted transactions (see _compact_transactions)
+#   context      - LLM context texts rendered so far, by character budget (see _chat_context)
+#   payloads     - serialized endpoint responses and their ETags (see _cached_response)
+#   index, views - filter index and recently filtered views, built on demand (see _filtered_view)
+#   retrieval    - BM25 index of the chat context, built on demand (see _retrieval_index)
+#   aggregates   - grouped sums and statistics of df (see _build_aggregates)
+#   sketch       - quantile sketch and moments of |Amount| (ANALYTICS_STATS_MODE=sketch only)
+#   fingerprints - sorted, unique row fingerprints (used to deduplicate appends)
+#   profile      - columns, null counts and duplicates of the statements as uploaded
+#   version      - content hash of df
+#   snapshot     - name of the Arrow snapshot holding this entry (SNAPSHOT_DIR only)
+#   bytes        - estimated memory use of the entry, re-measured as the on-demand keys are added
+#   last_used    - time.monotonic() of the last request that read or replaced it
+# Entries are replaced, never mutated, so a request can keep using the one it fetched; handlers
+# read df in place (no per-request copies) and must derive any extra keys as separate Series.
+_SESSION_STORE = OrderedDict()
+_SESSION_LOCK = threading.Lock()
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def _session_id() -> str:
+    """Session of the current request, from the X-Session-Id header ("default" without one)."""
+    sid = request.headers.get("X-Session-Id", "").strip()
+    if not sid:
+        return "default"
+    if _SESSION_ID_PATTERN.match(sid):
+        return sid
+    # Keep arbitrary client values out of logs (and later file names)
+    return hashlib.sha1(sid.encode("utf-8")).hexdigest()
+
+def _nbytes(value) -> int:
+    """Rough memory use of the arrays, tables and texts in value and the dicts, lists and
+    tuples nested in it. Arrays viewing another's memory (df's category codes, say) count
+    only their header and pandas Index objects (df's categories) nothing, so df's data is
+    not counted twice."""
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value)
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_nbytes(key) + _nbytes(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+def _entry_bytes(entry: dict) -> int:
+    """Rough memory use of a session entry: DataFrame, fingerprints, aggregates, and the
+    context texts, payloads, indexes and views built on it so far."""
+    return (int(entry["df"].memory_usage(deep=True).sum()) + entry["fingerprints"].nbytes
+            + _nbytes([entry["aggregates"], entry.get("sketch"), entry["context"], entry["payloads"],
+                       entry.get("index"), entry.get("retrieval")])
+            + sum(view["bytes"] for view in entry.get("views", {}).values()))
+
+def _expire_sessions(now: float):
+    """Drop sessions idle for longer than SESSION_TTL_SECONDS (caller holds the lock)."""
+    while _SESSION_STORE:
+        sid, entry = next(iter(_SESSION_STORE.items()))
+        if now - entry["last_used"] <= SESSION_TTL_SECONDS:
+            break
+        del _SESSION_STORE[sid]
+        _drop_ingest_lock(sid)
+        print(f"Session {sid} expired")
+
+def _get_session(sid: str):
+    """Dataset entry of a session, or None if it never uploaded or has expired."""
+    now = time.monotonic()
+    with _SESSION_LOCK:
+        _expire_sessions(now)
+        entry = _SESSION_STORE.get(sid)
+        if entry is not None:
+            entry["last_used"] = now
+            _SESSION_STORE.move_to_end(sid)
+    if SNAPSHOT_DIR:
+        entry = _sync_snapshot(sid, entry)
+    return entry
+
+def _put_session(sid: str, entry: dict):
+    """Store a session's dataset, evicting least recently used sessions over the budget."""
+    if "version" not in entry:
+        entry["version"] = _dataset_version(entry["df"])
+    if ANALYTICS_STATS_MODE == "sketch" and "sketch" not in entry and "Amount" in entry["df"].columns:
+        entry["sketch"] = _amount_sketch(entry["df"]["Amount"])
+    if "aggregates" not in entry:
+        entry["aggregates"] = _build_aggregates(entry["df"], defer=True)
+    if SNAPSHOT_DIR and "snapshot" not in entry:
+        try:
+            entry["snapshot"] = _write_snapshot(sid, entry)
+            _sweep_snapshots()
+        except Exception as e:
+            # Never leave an older snapshot behind that other workers would serve
+            print(f"Snapshot write failed for session {sid}: {e}")
+            entry["snapshot"] = None
+            shutil.rmtree(_snapshot_dir(sid), ignore_errors=True)
+    entry["bytes"] = _entry_bytes(entry)
+    entry["last_used"] = time.monotonic()
+    with _SESSION_LOCK:
+        _SESSION_STORE[sid] = entry
+        _SESSION_STORE.move_to_end(sid)
+        _expire_sessions(entry["last_used"])
+        total = _evict_sessions(entry)
+    print(f"Session {sid} stored ({entry['bytes'] / 1e6:.1f} MB, {len(_SESSION_STORE)} sessions, {total / 1e6:.1f} MB total)")
+
+def _evict_sessions(keep: dict) -> int:
+    """Evict least recently used sessions while the store is over SESSION_STORE_MAX_MB and
+    return its total size (caller holds the lock). `keep` stays even if it alone exceeds
+    the budget."""
+    budget = SESSION_STORE_MAX_MB * 1024 * 1024
+    total = sum(e["bytes"] for e in _SESSION_STORE.values())
+    for sid in list(_SESSION_STORE):
+        if total <= budget:
+            break
+        evicted = _SESSION_STORE[sid]
+        if evicted is keep:
+            continue
+        del _SESSION_STORE[sid]
+        _drop_ingest_lock(sid)
+        total -= evicted["bytes"]
+        print(f"Session {sid} evicted ({evicted['bytes'] / 1e6:.1f} MB)")
+    return total
+
+def _grow_session(entry: dict, nbytes: int):
+    """Account for an index, view or context text added to an entry (nbytes of them, net
+    of anything dropped), evicting other sessions if the store is now over budget (caller
+    holds the lock)."""
+    entry["bytes"] += nbytes
+    if any(stored is entry for stored in _SESSION_STORE.values()):
+        _evict_sessions(entry)
+
+def _dataset_version(df: pd.DataFrame) -> str:
+    """Content hash identifying a dataset version."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:16]
+
+# Each snapshot of a session is a set of files named <SNAPSHOT_DIR>/<session>/<seq>-<version>
+# plus an extension: .arrow (the DataFrame as uncompressed Arrow IPC, profile in the schema
+# metadata) and .npy (fingerprints). Names sort by write time.
+def _snapshot_dir(sid: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, sid)
+
+def _latest_snapshot(sid: str):
+    """Name of the newest complete snapshot of a session, or None."""
+    try:
+        names = [name[:-len(".arrow")] for name in os.listdir(_snapshot_dir(sid)) if name.endswith(".arrow")]
+    except FileNotFoundError:
+        return None
+    return max(names) if names else None
+
+def _write_snapshot(sid: str, entry: dict) -> str:
+    """Write a session entry under a new versioned name and remove older snapshots.
+
+    Every file is written to a temporary name and renamed into place, the .arrow file
+    last, so a reader that finds <name>.arrow always finds the whole snapshot.
+    """
+    directory = _snapshot_dir(sid)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.time_ns():020d}-{entry['version']}"
+    base = os.path.join(directory, name)
+    tmp = f".tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(base + ".npy" + tmp, "wb") as f:
+        np.save(f, entry["fingerprints"])
+    table = pa.Table.from_pandas(entry["df"], preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b"profile": json.dumps(entry["profile"]).encode("utf-8")}
+    table = table.replace_schema_metadata(metadata)
+    with pa.OSFile(base + ".arrow" + tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    for ext in (".npy", ".arrow"):
+        os.replace(base + ext + tmp, base + ext)
+    # Workers that already mapped an older snapshot keep reading it after the unlink
+    for old in os.listdir(directory):
+        if old < name and ".tmp-" not in old:
+            try:
+                os.remove(os.path.join(directory, old))
+            except FileNotFoundError:
+                pass
+    print(f"Session {sid} snapshot {name} written")
+    return name
+
+def _load_snapshot(sid: str, name: str):
+    """Session entry from a snapshot, or None if it was replaced while loading."""
+    base = os.path.join(_snapshot_dir(sid), name)
+    try:
+        table = pa.ipc.open_file(pa.memory_map(base + ".arrow", "r")).read_all()
+        fingerprints = np.load(base + ".npy", mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    return {
+        # split_blocks keeps Date, Amount and the category codes as views of the mapped
+        # file, so workers share the page cache instead of each holding a heap copy
+        "df": table.to_pandas(split_blocks=True),
+        "context": {},
+        "payloads": {},
+        "fingerprints": fingerprints,
+        "profile": json.loads(table.schema.metadata[b"profile"]),
+        "version": name.split("-", 1)[1],
+        "snapshot": name,
+    }
+
+def _sync_snapshot(sid: str, entry):
+    """Switch to the newest snapshot if another worker (or an earlier process) wrote one."""
+    for _ in range(3):
+        latest = _latest_snapshot(sid)
+        if latest is None:
+            return entry
+        if entry is not None and entry.get("snapshot") == latest:
+            # Keep the snapshot's mtime fresh for _sweep_snapshots while the session is in use
+            if time.time() - entry.get("touched", 0) > 60:
+                try:
+                    os.utime(os.path.join(_snapshot_dir(sid), latest + ".arrow"))
+                except OSError:
+                    pass
+                entry["touched"] = time.time()
+            return entry
+        loaded = _load_snapshot(sid, latest)
+        if loaded is not None:
+            print(f"Session {sid} loaded from snapshot {latest}")
+            _put_session(sid, loaded)
+            return loaded
+    return entry
+
+def _sweep_snapshots():
+    """Delete the snapshots of sessions idle for longer than SESSION_TTL_SECONDS."""
+    cutoff = time.time() - SESSION_TTL_SECONDS
+    for sid in os.listdir(SNAPSHOT_DIR):
+        directory = _snapshot_dir(sid)
+        try:
+            newest = max((os.path.getmtime(os.path.join(directory, name)) for name in os.listdir(directory)), default=0)
+        except OSError:
+            continue
+        if newest < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            print(f"Session {sid} snapshot expired")
+
 
+def _ignore_progress(stage: str, fraction: float = 0.0):
+    """Default progress callback of the ingestion pipeline (see _job_progress)."""
 
-def _normalize_columns_bank_specific(df: pd.DataFrame, bank: str) -> pd.DataFrame:
+def _normalize_columns_bank_specific(df: pd.DataFrame, bank: str, progress=_ignore_progress) -> pd.DataFrame:
     """Bank-specific column normalization and data processing."""
     if df is None or df.empty:
         return df
@@ -181,16 +641,16 @@ def _normalize_columns_bank_specific(df: pd.DataFrame, bank: str) -> pd.DataFram
     print(f"Processing {bank} format. Original columns: {df.columns.tolist()}")
     
     if bank == 'sbi':
-        return _process_sbi_format(df)
+        return _process_sbi_format(df, progress)
     elif bank == 'kotak':
-        return _process_kotak_format(df)
+        return _process_kotak_format(df, progress)
     elif bank == 'axis':
-        return _process_axis_format(df)
+        return _process_axis_format(df, progress)
     else:
         # Fallback to generic normalization
         return _normalize_columns(df)
 
-def _process_sbi_format(df: pd.DataFrame) -> pd.DataFrame:
+def _process_sbi_format(df: pd.DataFrame, progress=_ignore_progress) -> pd.DataFrame:
     """Process SBI bank statement format."""
     # SBI columns: Txn Date, Value Date, Description, Ref No./Cheque No., Debit, Credit, Balance
     mapping = {}
@@ -220,8 +680,9 @@ def _process_sbi_format(df: pd.DataFrame) -> pd.DataFrame:
     
     # Clean and categorize SBI descriptions
     if "Description" in df.columns:
-        df["Category"] = df["Description"].apply(_categorize_sbi_transaction)
-        df["Description"] = df["Description"].apply(_clean_sbi_description)
+        progress("categorizing")
+        df["Category"] = _categorize_transactions(df["Description"])
+        df["Description"] = _clean_descriptions(df["Description"], _clean_sbi_descriptions, _clean_sbi_description)
     
     # Process dates - handle SBI date format like "1 Jan 2024"
     if "Date" in df.columns:
@@ -233,7 +694,7 @@ def _process_sbi_format(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-def _process_kotak_format(df: pd.DataFrame) -> pd.DataFrame:
+def _process_kotak_format(df: pd.DataFrame, progress=_ignore_progress) -> pd.DataFrame:
     """Process Kotak bank statement format."""
     # Kotak columns: Date, Particulars, Debit, Credit, Balance
     mapping = {}
@@ -262,14 +723,15 @@ def _process_kotak_format(df: pd.DataFrame) -> pd.DataFrame:
     # Clean and categorize Kotak descriptions
     if "Description" in df.columns:
         print(f"Categorizing {len(df)} Kotak transactions...")
-        df["Category"] = df["Description"].apply(_categorize_kotak_transaction)
+        progress("categorizing")
+        df["Category"] = _categorize_transactions(df["Description"])
         # Debug: print investment transactions
         investment_txns = df[df["Category"] == "Investment"]
         if not investment_txns.empty:
             print(f"Found {len(investment_txns)} Investment transactions:")
             for idx, row in investment_txns.iterrows():
                 print(f"  - {row['Description']} -> {row['Category']}")
-        df["Description"] = df["Description"].apply(_clean_kotak_description)
+        df["Description"] = _clean_descriptions(df["Description"], _clean_kotak_descriptions, _clean_kotak_description)
     
     # Process dates - handle Kotak date format like "01/01/2024"
     if "Date" in df.columns:
@@ -280,7 +742,7 @@ def _process_kotak_format(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-def _process_axis_format(df: pd.DataFrame) -> pd.DataFrame:
+def _process_axis_format(df: pd.DataFrame, progress=_ignore_progress) -> pd.DataFrame:
     """Process Axis bank statement format."""
     # Axis columns: Tran Date, Description, Chq/Ref Number, Value Dt, Withdrawal Amt, Deposit Amt, Closing Balance
     mapping = {}
@@ -308,8 +770,9 @@ def _process_axis_format(df: pd.DataFrame) -> pd.DataFrame:
     
     # Clean and categorize Axis descriptions
     if "Description" in df.columns:
-        df["Category"] = df["Description"].apply(_categorize_axis_transaction)
-        df["Description"] = df["Description"].apply(_clean_axis_description)
+        progress("categorizing")
+        df["Category"] = _categorize_transactions(df["Description"])
+        df["Description"] = _clean_descriptions(df["Description"], _clean_axis_descriptions, _clean_axis_description)
     
     # Process dates - handle Axis date format like "01/01/2024"
     if "Date" in df.columns:
@@ -320,60 +783,78 @@ def _process_axis_format(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-def _categorize_sbi_transaction(description: str) -> str:
-    """Categorize SBI transactions based on description patterns."""
-    if pd.isna(description):
-        return "Other"
-    
-    desc = str(description).upper()
-    
+# Keyword rules in priority order: a description gets the first category with a matching keyword.
+_CATEGORY_RULES = [
     # Investment - Stocks, Mutual Funds, Trading
-    if any(keyword in desc for keyword in ['UPSTOX', 'INDIAN CLEARING', 'ZERODHA', 'GROWW', 'MUTUAL FUND', 'STOCK', 'TRADING', 'INVESTMENT', 'DEMAT', 'CLEARING']):
-        return "Investment"
-    
+    ("Investment", ['UPSTOX', 'INDIAN CLEARING', 'ZERODHA', 'GROWW', 'MUTUAL FUND', 'STOCK', 'TRADING', 'INVESTMENT', 'DEMAT', 'CLEARING']),
     # Credit Card Payments
-    elif any(keyword in desc for keyword in ['CRED', 'CREDIT CARD', 'CC PAYMENT', 'CARD PAYMENT']):
-        return "Credit Card"
-    
+    ("Credit Card", ['CRED', 'CREDIT CARD', 'CC PAYMENT', 'CARD PAYMENT']),
     # UPI Food Services
-    elif any(keyword in desc for keyword in ['SWIGGY', 'ZOMATO', 'FOOD', 'RESTAURANT', 'CAFE', 'PIZZA', 'DOMINOS', 'KFC', 'MCDONALD', 'BURGER']):
-        return "Food & Dining"
-    
+    ("Food & Dining", ['SWIGGY', 'ZOMATO', 'FOOD', 'RESTAURANT', 'CAFE', 'PIZZA', 'DOMINOS', 'KFC', 'MCDONALD', 'BURGER']),
     # Transportation - includes Metro
-    elif any(keyword in desc for keyword in ['UBER', 'OLA', 'METRO', 'PETROL', 'FUEL', 'TRANSPORT', 'CAB', 'RAPIDO', 'BPCL', 'HP', 'IOCL', 'MUMBAI METRO']):
-        return "Transportation"
-    
+    ("Transportation", ['UBER', 'OLA', 'METRO', 'PETROL', 'FUEL', 'TRANSPORT', 'CAB', 'RAPIDO', 'BPCL', 'HP', 'IOCL', 'MUMBAI METRO']),
     # Shopping
-    elif any(keyword in desc for keyword in ['AMAZON', 'FLIPKART', 'SHOPPING', 'MYNTRA', 'AJIO', 'MEESHO', 'PAYTM MALL']):
-        return "Shopping"
-    
+    ("Shopping", ['AMAZON', 'FLIPKART', 'SHOPPING', 'MYNTRA', 'AJIO', 'MEESHO', 'PAYTM MALL']),
     # Entertainment & Subscriptions
-    elif any(keyword in desc for keyword in ['NETFLIX', 'SPOTIFY', 'MOVIE', 'BOOKMYSHOW', 'PRIME', 'HOTSTAR', 'YOUTUBE', 'DISNEY']):
-        return "Entertainment"
-    
+    ("Entertainment", ['NETFLIX', 'SPOTIFY', 'MOVIE', 'BOOKMYSHOW', 'PRIME', 'HOTSTAR', 'YOUTUBE', 'DISNEY']),
     # Utilities & Bills
-    elif any(keyword in desc for keyword in ['ELECTRICITY', 'MOBILE', 'RECHARGE', 'BILL', 'AIRTEL', 'JIO', 'VODAFONE', 'BSNL']):
-        return "Utilities"
-    
+    ("Utilities", ['ELECTRICITY', 'MOBILE', 'RECHARGE', 'BILL', 'AIRTEL', 'JIO', 'VODAFONE', 'BSNL']),
     # ATM/Cash Withdrawals
-    elif any(keyword in desc for keyword in ['ATM', 'CASH', 'WDL', 'WITHDRAWAL']):
-        return "Cash Withdrawal"
-    
+    ("Cash Withdrawal", ['ATM', 'CASH', 'WDL', 'WITHDRAWAL']),
     # Money Transfers
-    elif any(keyword in desc for keyword in ['TRANSFER', 'NEFT', 'IMPS', 'UPI/DR', 'UPI/CR']):
-        return "Money Transfer"
-    
+    ("Money Transfer", ['TRANSFER', 'NEFT', 'IMPS', 'UPI/DR', 'UPI/CR']),
     # Income & Credits
-    elif any(keyword in desc for keyword in ['SALARY', 'CREDIT INTEREST', 'DIVIDEND', 'NEFT INWARD', 'RTGS']):
-        return "Income"
-    
+    ("Income", ['SALARY', 'CREDIT INTEREST', 'DIVIDEND', 'NEFT INWARD', 'RTGS']),
     # Banking Charges
-    elif any(keyword in desc for keyword in ['AMC', 'CHARGES', 'FEE', 'PENALTY']):
-        return "Bank Charges"
+    ("Bank Charges", ['AMC', 'CHARGES', 'FEE', 'PENALTY']),
+]
+_DEFAULT_CATEGORY = "Other"
+
+# One precompiled alternation per category, evaluated in rule order by pyarrow's RE2 engine.
+_CATEGORY_PATTERNS = [
+    (category, "|".join(re.escape(keyword) for keyword in keywords))
+    for category, keywords in _CATEGORY_RULES
+]
+
+
+def _categorize_transactions(descriptions: pd.Series) -> pd.Series:
+    """Vectorized categorization of a whole Description column.
+
+    Same result as applying _categorize_sbi_transaction row by row: each category's
+    keywords are matched over all still-unassigned rows at once, in priority order,
+    so the first matching category wins.
+    """
+    labels = np.full(len(descriptions), _DEFAULT_CATEGORY, dtype=object)
+    present = descriptions.notna().to_numpy()
+    positions = np.flatnonzero(present)
+    if len(positions) == 0:
+        return pd.Series(labels, index=descriptions.index)
+
+    # Python's str.upper keeps the matching identical to the per-row function
+    upper = descriptions[present].astype(str).str.upper()
+    remaining = pa.array(upper.to_numpy(dtype=object), type=pa.large_string())
+    for category, pattern in _CATEGORY_PATTERNS:
+        matched = pc.match_substring_regex(remaining, pattern).to_numpy(zero_copy_only=False)
+        labels[positions[matched]] = category
+        unmatched = ~matched
+        positions = positions[unmatched]
+        if len(positions) == 0:
+            break
+        remaining = remaining.filter(pa.array(unmatched))
+    return pd.Series(labels, index=descriptions.index)
+
+def _categorize_sbi_transaction(description: str) -> str:
+    """Categorize SBI transactions based on description patterns."""
+    if pd.isna(description):
+        return _DEFAULT_CATEGORY
+    
+    desc = str(description).upper()
+    for category, keywords in _CATEGORY_RULES:
+        if any(keyword in desc for keyword in keywords):
+            return category
     
     # If no recognizable pattern found, categorize as Other
-    else:
-        return "Other"
+    return _DEFAULT_CATEGORY
 
 def _categorize_kotak_transaction(description: str) -> str:
     """Categorize Kotak transactions - similar logic to SBI."""
@@ -498,6 +979,140 @@ def _clean_axis_description(description: str) -> str:
     
     return desc[:40] + "..." if len(desc) > 40 else desc
 
+# Python's str.strip() whitespace, restricted to ASCII
+_ASCII_WHITESPACE = " \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+
+
+def _clean_descriptions(descriptions: pd.Series, columnar_cleaner, row_cleaner) -> pd.Series:
+    """Clean a whole Description column.
+
+    ASCII descriptions (all real bank exports so far) go through the columnar cleaner;
+    anything else uses the per-row cleaner so the output stays byte-identical to it.
+    """
+    cleaned = np.empty(len(descriptions), dtype=object)
+    arr = _arrow_strings(descriptions)
+    present = arr.is_valid().to_numpy(zero_copy_only=False)
+    if not present.all():
+        cleaned[~present] = "Unknown Transaction"
+        arr = arr.filter(pa.array(present))
+    positions = np.flatnonzero(present)
+    if len(positions) == 0:
+        return pd.Series(cleaned, index=descriptions.index)
+
+    # A non-ASCII character takes more than one UTF-8 byte
+    is_ascii = pc.equal(pc.binary_length(arr), pc.utf8_length(arr)).to_numpy(zero_copy_only=False)
+    if is_ascii.all():
+        cleaned[positions] = columnar_cleaner(pc.utf8_trim(arr, _ASCII_WHITESPACE))
+    else:
+        if is_ascii.any():
+            desc = pc.utf8_trim(arr.filter(pa.array(is_ascii)), _ASCII_WHITESPACE)
+            cleaned[positions[is_ascii]] = columnar_cleaner(desc)
+        cleaned[positions[~is_ascii]] = [row_cleaner(d) for d in arr.filter(pa.array(~is_ascii)).to_pylist()]
+    return pd.Series(cleaned, index=descriptions.index)
+
+
+def _arrow_strings(values: pd.Series) -> pa.Array:
+    """Arrow string array of a text column, null where the value is missing and str(value) elsewhere."""
+    try:
+        return pa.array(values.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(values.where(values.isna(), values.astype(str)).to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+
+
+def _has(text: str):
+    return lambda desc: pc.match_substring(desc, text)
+
+
+def _first_match(desc: pa.Array, rules, default) -> np.ndarray:
+    """Vectorized if/elif chain over an Arrow string array.
+
+    rules is an ordered list of (condition, value): condition(desc) gives a boolean mask and
+    value is either a fixed label or value(desc) gives the labels of the matched rows. Each
+    condition only sees the rows no earlier rule claimed; default(desc) labels the rest.
+    """
+    labels = np.empty(len(desc), dtype=object)
+    positions = np.arange(len(desc))
+    for condition, value in rules:
+        if len(desc) == 0:
+            return labels
+        hit = condition(desc).to_numpy(zero_copy_only=False)
+        if not hit.any():
+            continue
+        if callable(value):
+            labels[positions[hit]] = value(desc.filter(pa.array(hit))).to_numpy(zero_copy_only=False)
+        else:
+            labels[positions[hit]] = value
+        positions = positions[~hit]
+        desc = desc.filter(pa.array(~hit))
+    if len(desc):
+        labels[positions] = default(desc).to_numpy(zero_copy_only=False)
+    return labels
+
+
+def _truncate_descriptions(desc: pa.Array) -> pa.Array:
+    """Vectorized ``desc[:40] + "..." if len(desc) > 40 else desc``."""
+    shortened = pc.binary_join_element_wise(pc.utf8_slice_codeunits(desc, 0, 40), "...", "")
+    return pc.if_else(pc.greater(pc.utf8_length(desc), 40), shortened, desc)
+
+
+def _upi_labels(merchant: pa.Array, valid: pa.Array, prefix: str) -> pa.Array:
+    labelled = pc.binary_join_element_wise(prefix, pc.ascii_title(merchant), "")
+    return pc.if_else(valid, labelled, "UPI Payment")
+
+
+def _sbi_upi_labels(desc: pa.Array) -> pa.Array:
+    # Last "/" part is the merchant: "BY TRANSFER-UPI/DR/400252792161/MAHAB"
+    merchant = pc.list_element(pc.split_pattern(desc, "/", max_splits=1, reverse=True), 1)
+    valid = pc.and_(pc.greater_equal(pc.count_substring(desc, "/"), 3), pc.greater(pc.utf8_length(merchant), 2))
+    return _upi_labels(merchant, valid, "UPI Payment - ")
+
+
+def _kotak_upi_labels(desc: pa.Array) -> pa.Array:
+    # Second "/" part is the merchant: "UPI/SWIGGY/Food Order"
+    merchant = pc.list_element(pc.split_pattern(desc, "/", max_splits=2), 1)
+    return _upi_labels(merchant, pc.greater(pc.utf8_length(merchant), 0), "UPI - ")
+
+
+def _axis_upi_labels(desc: pa.Array) -> pa.Array:
+    # Second "-" part is the merchant: "UPI-SWIGGY-FOOD DELIVERY-123456789"
+    merchant = pc.list_element(pc.split_pattern(desc, "-", max_splits=2), 1)
+    return _upi_labels(merchant, pc.greater(pc.utf8_length(merchant), 0), "UPI - ")
+
+
+def _clean_sbi_descriptions(desc: pa.Array) -> np.ndarray:
+    """Columnar _clean_sbi_description over stripped ASCII descriptions."""
+    return _first_match(desc, [
+        (lambda d: pc.or_(pc.match_substring(d, "UPI/DR"), pc.match_substring(d, "UPI/CR")), _sbi_upi_labels),
+        (_has("BY TRANSFER"), lambda d: pc.if_else(pc.match_substring(d, "MAHAB"), "Money Transfer", "Bank Transfer")),
+        (_has("TO TRANSFER"), lambda d: pc.if_else(
+            pc.match_substring(d, "Hamara"), "Payment to Hamara",
+            pc.if_else(pc.match_substring(d, "SONU"), "Payment to Contact", "Money Transfer"))),
+        (_has("AMC"), "Annual Maintenance Charge"),
+        (_has("ECS/ACH RETURN"), "ECS Return Charges"),
+        (_has("NEFT"), lambda d: pc.if_else(pc.match_substring(d, "SALARY"), "Salary Credit", "NEFT Transfer")),
+        (lambda d: pc.and_(pc.match_substring(d, "ATM"), pc.match_substring(d, "WDL")), "ATM Cash Withdrawal"),
+    ], _truncate_descriptions)
+
+
+def _clean_kotak_descriptions(desc: pa.Array) -> np.ndarray:
+    """Columnar _clean_kotak_description over stripped ASCII descriptions."""
+    return _first_match(desc, [
+        (_has("UPI/"), _kotak_upi_labels),
+        (_has("IMPS/"), lambda d: pc.if_else(pc.match_substring(d, "AMAZON"), "IMPS - Amazon", "IMPS Transfer")),
+        (_has("ATM"), "ATM Cash Withdrawal"),
+        (lambda d: pc.and_(pc.match_substring(d, "SALARY"), pc.match_substring(d, "NEFT")), "Salary Credit"),
+        (_has("MOBILE RECHARGE"), "Mobile Recharge"),
+    ], _truncate_descriptions)
+
+
+def _clean_axis_descriptions(desc: pa.Array) -> np.ndarray:
+    """Columnar _clean_axis_description over stripped ASCII descriptions."""
+    return _first_match(desc, [
+        (_has("UPI-"), _axis_upi_labels),
+        (_has("NEFT-"), lambda d: pc.if_else(pc.match_substring(d, "SALARY"), "Salary Credit", "NEFT Transfer")),
+        (_has("ATM-"), "ATM Cash Withdrawal"),
+    ], _truncate_descriptions)
+
 def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Rename columns to standard names: Date, Description, Category, Amount (case-insensitive)."""
     if df is None or df.empty:
@@ -524,18 +1139,180 @@ def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
         df["Category"] = df["Category"].astype(str)
     return df
 
-def _extract_pdf_kotak(file_stream) -> pd.DataFrame:
-    """Extract table data from Kotak PDF statements."""
-    all_data = []
+# Odd 64-bit multiplier used to fold per-column hashes into one row fingerprint
+_FINGERPRINT_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+# Raw columns holding amounts, by name; their cells are compared as numbers
+_AMOUNT_COLUMN_WORDS = ("debit", "credit", "balance", "amount", "amt", "withdrawal", "deposit")
+
+def _fingerprint_text(values: pd.Series, amount: bool) -> pa.Array:
+    """Cells of a raw column as the text they are fingerprinted by: stripped, and for amount
+    columns without thousands separators or trailing decimal zeros ("1,200.00" -> "1200").
+    Numbers read as numbers give the text they were written as ("1200.5" -> 1200.5 -> "1200.5")."""
+    if pd.api.types.is_numeric_dtype(values):
+        number = values.astype(float).round(2)
+        integral = np.isnan(number) | (number == np.round(number))
+        arr = pa.array(number.astype("Int64") if integral.all() else number, from_pandas=True)
+        return pc.cast(arr, pa.string())
+    text = pc.utf8_trim_whitespace(_arrow_strings(values))
+    if amount:
+        text = pc.replace_substring(text, ",", "")
+        text = pc.replace_substring_regex(text, r"(?:\.0*|(\.\d*?)0+)$", r"\1")
+    return text
+
+def _row_fingerprints(raw: pd.DataFrame) -> np.ndarray:
+    """uint64 fingerprint of every raw statement row (date, description, ref no, amounts, balance).
+
+    Cells are compared as stripped text, amount columns (by name) without thousands
+    separators and trailing decimal zeros, so "1,200.00", "1200" and 1200.0 fingerprint the
+    same whether pandas read the column as text or numbers. Each cell's text is hashed once
+    with hash_array. Column names are not part of the fingerprint.
+    """
+    fingerprints = np.zeros(len(raw), dtype=np.uint64)
+    for col in raw.columns:
+        amount = any(word in str(col).lower() for word in _AMOUNT_COLUMN_WORDS)
+        text = pc.fill_null(_fingerprint_text(raw[col], amount), "")
+        cell_hash = pd.util.hash_array(text.to_numpy(zero_copy_only=False), categorize=False)
+        fingerprints = fingerprints * _FINGERPRINT_MULTIPLIER + cell_hash
+    return fingerprints
+
+def _in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """Membership of each value in a sorted array, in O(len(values) * log(len(sorted_values)))."""
+    if sorted_values is None or len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(sorted_values, values)
+    idx[idx == len(sorted_values)] = 0
+    return sorted_values[idx] == values
+
+def _tag_new_rows(raw: pd.DataFrame, known_fingerprints=None) -> pd.DataFrame:
+    """Add a Fingerprint column to a raw statement and drop rows already in known_fingerprints."""
+    if raw is None or raw.empty:
+        return raw
+    fingerprints = _row_fingerprints(raw)
+    raw["Fingerprint"] = fingerprints
+    if known_fingerprints is not None:
+        fresh = ~_in_sorted(fingerprints, known_fingerprints)
+        print(f"Skipping {int((~fresh).sum())} rows already in the dataset")
+        raw = raw[fresh]
+    return raw
+
+# Columns the endpoints read. Streaming mode keeps only these from each chunk, and every
+# upload is compacted down to them (raw bank columns and Debit/Credit are dropped)
+_COMPACT_COLUMNS = ["Date", "Description", "Category", "Amount"]
+
+def _read_csv_streaming(file, bank: str, chunk_rows: int, known_fingerprints=None,
+                        progress=_ignore_progress):
+    """Read and normalize a CSV upload chunk by chunk; returns (transactions_df, profile).
+
+    Every chunk runs through the bank-specific processor, loses its invalid rows, is
+    profiled and keeps only _COMPACT_COLUMNS before the next one is read. Peak memory is
+    therefore one raw chunk with its temporaries (about chunk_rows * 1.2 KB for a 7-column
+    statement) plus the compact result (about 160 bytes per kept row), instead of several
+    copies of the file. The chunk profiles add up to the whole-file one, with rows repeating
+    one of an earlier chunk found by row hash at the end.
+    """
+    parts, profile, firsts = [], None, []
+    size = file.seek(0, os.SEEK_END) or 1
+    file.seek(0)
+    with pd.read_csv(file, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            # Chunks are parsed, normalized and categorized together; report bytes read
+            progress("parsing", file.tell() / size)
+            chunk = _tag_new_rows(chunk, known_fingerprints)
+            if chunk.empty:
+                # Every row is already in the dataset; an empty chunk keeps its raw column
+                # names through normalization, which would leak into the profile
+                continue
+            chunk = _normalize_columns_bank_specific(chunk, bank)
+            if "Amount" in chunk.columns:
+                chunk = chunk.dropna(subset=["Amount"])
+            if "Date" in chunk.columns:
+                chunk = chunk.dropna(subset=["Date"])
+            rows = chunk.drop(columns="Fingerprint", errors="ignore")
+            chunk_profile = _profile_transactions(rows)
+            # Rows duplicated within the chunk are already in its profile
+            firsts.append(pd.unique(pd.util.hash_pandas_object(rows, index=False).to_numpy()))
+            profile = chunk_profile if profile is None else _merge_profiles(profile, chunk_profile)
+            parts.append(chunk[[col for col in _COMPACT_COLUMNS + ["Fingerprint"] if col in chunk.columns]])
+    if not parts:
+        return pd.DataFrame(), None
+    profile["duplicates"] += int(pd.Series(np.concatenate(firsts)).duplicated().sum())
+    return pd.concat(parts), profile
+
+def _extract_pdf_rows(file_stream, start: int, stop: int, on_page=None) -> list:
+    """Table rows (first 6 cells) from pages [start, stop) of a PDF, in page order.
+
+    on_page(done, total) is called after each page.
+    """
+    rows = []
     with pdfplumber.open(file_stream) as pdf:
-        for page in pdf.pages:
+        pages = pdf.pages[start:stop]
+        for done, page in enumerate(pages, 1):
             tables = page.extract_tables()
             for table in tables:
                 for row in table:
                     if len(row) >= 6:
                         # Clean up newlines in cells
                         cleaned_row = [str(cell).replace('\\n', ' ') if cell is not None else "" for cell in row]
-                        all_data.append(cleaned_row[:6])
+                        rows.append(cleaned_row[:6])
+            if on_page:
+                on_page(done, len(pages))
+    return rows
+
+# Extraction process pool shared by all uploads, started on first use (see _pdf_pool)
+_PDF_POOL = {"pool": None, "workers": 0}
+_PDF_POOL_LOCK = threading.Lock()
+
+def _pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool for PDF extraction, kept across uploads so its workers start (and import
+    this module) once. They come from a forkserver (spawn where there is none) rather than a
+    fork of this process, whose other threads may hold locks a forked child would inherit."""
+    with _PDF_POOL_LOCK:
+        if _PDF_POOL["pool"] is None or _PDF_POOL["workers"] != workers:
+            if _PDF_POOL["pool"] is not None:
+                _PDF_POOL["pool"].shutdown(wait=False)
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _PDF_POOL["pool"] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _PDF_POOL["workers"] = workers
+        return _PDF_POOL["pool"]
+
+def _extract_pdf_rows_worker(task) -> list:
+    pdf_bytes, start, stop = task
+    return _extract_pdf_rows(io.BytesIO(pdf_bytes), start, stop)
+
+def _extract_pdf_kotak(file_stream, workers: int = None, progress=_ignore_progress) -> pd.DataFrame:
+    """Extract table data from Kotak PDF statements.
+
+    With more than one worker, long statements are split into contiguous page ranges that
+    the shared process pool (_pdf_pool) extracts in parallel; the ranges are merged back
+    in page order.
+    """
+    workers = PDF_WORKERS if workers is None else workers
+    page_count = 0
+    if workers > 1:
+        with pdfplumber.open(file_stream) as pdf:
+            page_count = len(pdf.pages)
+        file_stream.seek(0)
+
+    if page_count >= PDF_PARALLEL_MIN_PAGES:
+        # Two ranges per worker so one slow page range does not leave the others idle
+        bounds = np.linspace(0, page_count, min(page_count, workers * 2) + 1).astype(int)
+        pdf_bytes = file_stream.getvalue()
+        tasks = [(pdf_bytes, int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+        pool = _pdf_pool(workers)
+        all_data = []
+        try:
+            for done, rows in enumerate(pool.map(_extract_pdf_rows_worker, tasks), 1):
+                all_data.extend(rows)
+                progress("parsing", done / len(tasks))
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); the next upload starts a new pool
+            with _PDF_POOL_LOCK:
+                if _PDF_POOL["pool"] is pool:
+                    _PDF_POOL["pool"] = None
+            raise
+    else:
+        all_data = _extract_pdf_rows(file_stream, 0, None,
+                                     on_page=lambda done, total: progress("parsing", done / total))
     
     if not all_data:
         return pd.DataFrame()
@@ -553,11 +1330,861 @@ def health():
     return jsonify({"status": "ok", "message": "Backend is running"})
 
 
+# Bump when parsing or description cleaning changes, so older parse cache entries stop matching
+_PARSE_PIPELINE_VERSION = 4
+
+def _parse_cache_key(stream, bank: str, variant: str) -> str:
+    """Content address of an upload: its raw bytes, the bank, the ingestion path and the
+    categorization rules, so editing _CATEGORY_RULES invalidates every cached parse."""
+    digest = hashlib.sha256(f"{_PARSE_PIPELINE_VERSION}|{bank}|{variant}|{_CATEGORY_RULES!r}|".encode("utf-8"))
+    for block in iter(lambda: stream.read(1 << 20), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+def _parse_cache_path(key: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, f"{key}.parquet")
+
+def _parse_cache_load(key: str):
+    """(transactions_df, fingerprints, profile) of a cached upload, or None on a miss.
+
+    profile is None for files written before profiles were cached.
+    """
+    frame_path = _parse_cache_path(key)
+    if not os.path.exists(frame_path):
+        return None
+    try:
+        table = pq.read_table(frame_path)
+        metadata = table.schema.metadata or {}
+        profile = json.loads(metadata[b"profile"]) if b"profile" in metadata else None
+        df = table.to_pandas()
+        fingerprints = df.pop("Fingerprint").to_numpy(dtype=np.uint64)
+        # Mark the entry as recently used for LRU eviction
+        os.utime(frame_path)
+    except Exception as e:
+        print(f"Parse cache read error: {e}")
+        return None
+    return df, fingerprints, profile
+
+def _parse_cache_store(key: str, df: pd.DataFrame, fingerprints: np.ndarray, profile: dict):
+    frame_path = _parse_cache_path(key)
+    tmp_path = f"{frame_path}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        # Write to a temp name and rename, so readers never see a half-written file
+        # The profile goes in the file metadata: streamed parses keep only compact columns
+        table = pa.Table.from_pandas(df.assign(Fingerprint=fingerprints))
+        table = table.replace_schema_metadata({**table.schema.metadata, b"profile": json.dumps(profile).encode()})
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, frame_path)
+    except Exception as e:
+        # e.g. raw bank columns mixing numbers and text, which Parquet cannot store
+        print(f"Parse cache write error: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    _evict_parse_cache()
+
+def _evict_parse_cache():
+    """Drop least recently used entries until the cache fits in PARSE_CACHE_MAX_MB."""
+    entries = []
+    for name in os.listdir(PARSE_CACHE_DIR):
+        # Also counts (and evicts) files left by older pipeline versions, e.g. .txt context
+        if ".tmp-" in name:
+            continue
+        path = os.path.join(PARSE_CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= PARSE_CACHE_MAX_MB * 1024 * 1024:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _upload_variant(filename: str, bank: str) -> str:
+    """Which ingestion path an upload takes: "pdf", "csv-stream" or "csv"."""
+    if filename.endswith('.pdf') and bank == 'kotak':
+        return "pdf"
+    if CSV_CHUNK_ROWS > 0 and not filename.endswith('.pdf'):
+        return "csv-stream"
+    return "csv"
+
+def _parse_upload(file, bank: str, filename: str, known_fingerprints=None, progress=_ignore_progress):
+    """Parse, normalize and categorize an uploaded statement.
+
+    Rows whose fingerprint is in known_fingerprints (sorted) are dropped before any
+    processing. Returns (transactions_df, fingerprints, profile) with one fingerprint per
+    kept row and the _profile_transactions of the kept rows. progress(stage, fraction) is
+    called as the pipeline advances.
+    """
+    variant = _upload_variant(filename, bank)
+    profile = None
+    progress("parsing")
+    if variant == "pdf":
+        file_stream = io.BytesIO(file.read())
+        transactions_df = _tag_new_rows(_extract_pdf_kotak(file_stream, progress=progress), known_fingerprints)
+        print(f"Extracted PDF shape: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
+    elif variant == "csv-stream":
+        print(f"Streaming CSV in chunks of {CSV_CHUNK_ROWS} rows as {bank.upper()} format")
+        transactions_df, profile = _read_csv_streaming(file, bank, CSV_CHUNK_ROWS, known_fingerprints, progress)
+    else:
+        transactions_df = _tag_new_rows(pd.read_csv(file), known_fingerprints)
+        print(f"Original CSV shape: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
+        
+    if variant != "csv-stream":
+        print(f"Processing as {bank.upper()} format")
+        
+        # Use bank-specific processing
+        progress("normalizing")
+        transactions_df = _normalize_columns_bank_specific(transactions_df, bank, progress)
+    print(f"After {bank} normalization: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
+    
+    # Filter out rows with invalid amounts or dates
+    if "Amount" in transactions_df.columns:
+        transactions_df = transactions_df.dropna(subset=["Amount"])
+        # Only remove zero amount transactions if they're clearly invalid
+        # (keep them if they might be valid like balance inquiries)
+    
+    if "Date" in transactions_df.columns:
+        transactions_df = transactions_df.dropna(subset=["Date"])
+    
+    print(f"After filtering: {transactions_df.shape} rows")
+    
+    if "Fingerprint" in transactions_df.columns:
+        fingerprints = transactions_df.pop("Fingerprint").to_numpy(dtype=np.uint64)
+    else:
+        fingerprints = np.empty(0, dtype=np.uint64)
+    if profile is None:
+        profile = _profile_transactions(transactions_df)
+    return transactions_df, fingerprints, profile
+
+def _context_column(df: pd.DataFrame, col: str, missing: str) -> pa.Array:
+    """str() of every value of a column as Arrow strings, with missing values as `missing`."""
+    if col not in df.columns:
+        return pa.array(np.full(len(df), missing, dtype=object), type=pa.string())
+    values = df[col]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Format each category once and gather by code
+        labels = pa.array([str(label) for label in values.cat.categories], type=pa.string())
+        codes = values.cat.codes.to_numpy()
+        text = labels.take(pa.array(codes, mask=codes < 0))
+    else:
+        text = pa.array(values.map(str, na_action="ignore"), type=pa.string(), from_pandas=True)
+    return pc.fill_null(text, missing)
+
+def _context_dates(df: pd.DataFrame) -> pa.Array:
+    """Dates formatted like str(Timestamp), "?" where missing."""
+    if "Date" not in df.columns or not pd.api.types.is_datetime64_any_dtype(df["Date"]) or df["Date"].dt.tz is not None:
+        return _context_column(df, "Date", "?")
+    dates = df["Date"]
+    if ((dates.dt.microsecond != 0) | (dates.dt.nanosecond != 0)).any():
+        return _context_column(df, "Date", "?")
+    text = pa.array(dates.dt.strftime("%Y-%m-%d %H:%M:%S"), type=pa.string(), from_pandas=True)
+    return pc.fill_null(text, "?")
+
+def _render_context_text(df: pd.DataFrame) -> str:
+    """One line of text per transaction for the LLM context, built column-wise:
+    "On <date> you spent ₹<abs amount, 2 decimals> on <category>: <description>".
+
+    Without a complete Amount column the raw CSV text is used instead.
+    """
+    if "Amount" not in df.columns or df["Amount"].isna().any():
+        return df.to_csv(index=False)
+    amounts = np.char.mod("%.2f", np.abs(df["Amount"].to_numpy()))
+    lines = pc.binary_join_element_wise(
+        "On ", _context_dates(df), " you spent ₹", pa.array(amounts, type=pa.string()),
+        " on ", _context_column(df, "Category", "?"), ": ", _context_column(df, "Description", ""), "")
+    return "\n".join(lines.to_pylist())
+
+def _chat_context(entry: dict, max_chars: int = None):
+    """(text, truncated): the session's LLM context, limited to its last max_chars characters.
+
+    Rendered on first use and cached on the entry (one entry per dataset version). Only the
+    trailing rows that fill max_chars are rendered: the last k lines are a suffix of the
+    full text, so k doubles until they reach max_chars characters.
+    """
+    cached = entry["context"].get(max_chars)
+    if cached is not None:
+        return cached
+    df = entry["df"]
+    n = len(df)
+    if max_chars is None or "Amount" not in df.columns or df["Amount"].isna().any():
+        text = _render_context_text(df)
+    else:
+        k = min(n, max_chars // 64 + 1)
+        text = _render_context_text(df.iloc[n - k:])
+        while len(text) < max_chars and k < n:
+            k = min(n, k * 2)
+            text = _render_context_text(df.iloc[n - k:])
+    truncated = max_chars is not None and len(text) > max_chars
+    if truncated:
+        text = text[-max_chars:]
+    print(f"CSV text length: {len(text)} chars{' (truncated)' if truncated else ''}")
+    with _SESSION_LOCK:
+        if max_chars not in entry["context"]:
+            entry["context"][max_chars] = (text, truncated)
+            _grow_session(entry, len(text))
+    return text, truncated
+
+def _profile_transactions(df: pd.DataFrame) -> dict:
+    """Column list, per-column null counts and duplicate-row count of a parsed upload.
+
+    Taken before _compact_transactions drops the raw bank columns, so the data quality
+    section of /advanced-analytics still describes the full statement.
+    """
+    return {
+        "columns": list(df.columns),
+        "rows": len(df),
+        "nulls": {col: int(count) for col, count in df.isnull().sum().items()},
+        "duplicates": int(df.duplicated().sum()),
+    }
+
+def _merge_profiles(old: dict, new: dict) -> dict:
+    """Profile of old and new rows concatenated (columns missing from one side count as nulls).
+
+    Rows repeated across the two sides are not counted as duplicates: appends already drop
+    every row whose fingerprint is in the dataset.
+    """
+    columns = old["columns"] + [col for col in new["columns"] if col not in old["columns"]]
+    return {
+        "columns": columns,
+        "rows": old["rows"] + new["rows"],
+        "nulls": {
+            col: old["nulls"].get(col, old["rows"]) + new["nulls"].get(col, new["rows"])
+            for col in columns
+        },
+        "duplicates": old["duplicates"] + new["duplicates"],
+    }
+
+def _bytes_per_row(df: pd.DataFrame) -> float:
+    return float(df.memory_usage(deep=True).sum() / len(df)) if len(df) else 0.0
+
+def _compact_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """Keep only the columns the endpoints read, with categorical text and float64 amounts."""
+    df = df[[col for col in _COMPACT_COLUMNS if col in df.columns]]
+    compact = {}
+    for col in ("Category", "Description"):
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            compact[col] = df[col].astype("category")
+    if "Amount" in df.columns and df["Amount"].dtype != np.float64:
+        compact["Amount"] = df["Amount"].astype(np.float64)
+    return df.assign(**compact) if compact else df
+
+def _concat_transactions(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Compacted transactions old followed by new (see _compact_transactions). Categoricals
+    are joined by merging their sorted categories rather than re-encoding the text."""
+    if list(old.columns) != list(new.columns):
+        # Categoricals with different categories concatenate to object; re-compact
+        return _compact_transactions(pd.concat([old, new], ignore_index=True))
+    columns = {}
+    for col in old.columns:
+        if isinstance(old[col].dtype, pd.CategoricalDtype) and isinstance(new[col].dtype, pd.CategoricalDtype):
+            columns[col] = pd.api.types.union_categoricals([old[col], new[col]], sort_categories=True)
+        else:
+            columns[col] = pd.concat([old[col], new[col]], ignore_index=True)
+    return pd.DataFrame(columns)
+
+# Groupings of the transactions kept ready for the endpoints; each is built when its
+# source columns are present (Month and Weekday come from Date)
+_ROLLUPS = [("Category",), ("Month",), ("Weekday",), ("Description",), ("Description", "Category")]
+
+def _rollup(frame: pd.DataFrame, keys) -> pd.DataFrame:
+    """sum, count and abs_sum of Amount per combination of `keys`, sorted by key.
+
+    frame has the key columns plus "sum" (Amount) and "abs_sum" (its absolute value) per
+    transaction.
+    """
+    grouped = frame.groupby(list(keys), observed=True)
+    return grouped.agg(sum=("sum", "sum"), count=("sum", "count"), abs_sum=("abs_sum", "sum"))
+
+def _amount_sketch(amounts: pd.Series) -> dict:
+    """Mergeable summary of |Amount|: DDSketch-style log buckets plus exact moments.
+
+    Bucket k counts the values in (gamma^(k-1), gamma^k], gamma = (1 + a) / (1 - a) for
+    a = ANALYTICS_SKETCH_ACCURACY, and stands for them as 2 * gamma^k / (gamma + 1), which
+    is within relative error a of each. Buckets are stored densely from "offset" (amounts
+    from 0.01 to 10^8 span about 1,150 buckets at a = 0.01). count, mean, m2 (sum of
+    squared deviations), min and max are exact.
+    """
+    values = amounts.abs().dropna().to_numpy(dtype=np.float64)
+    gamma = (1 + ANALYTICS_SKETCH_ACCURACY) / (1 - ANALYTICS_SKETCH_ACCURACY)
+    positive = values[values > 0]
+    keys = np.ceil(np.log(positive) / np.log(gamma)).astype(np.int64)
+    offset = int(keys.min()) if len(keys) else 0
+    mean = float(values.mean()) if len(values) else float("nan")
+    return {
+        "accuracy": ANALYTICS_SKETCH_ACCURACY,
+        "offset": offset,
+        "counts": np.bincount(keys - offset) if len(keys) else np.zeros(0, dtype=np.int64),
+        "zeros": len(values) - len(positive),
+        "count": len(values),
+        "mean": mean,
+        "m2": float(((values - mean) ** 2).sum()),
+        "min": float(values.min()) if len(values) else float("nan"),
+        "max": float(values.max()) if len(values) else float("nan"),
+    }
+
+def _merge_sketches(a: dict, b: dict) -> dict:
+    """Sketch of the amounts of both a and b (same accuracy); moments merge with Chan's formula."""
+    if b["count"] == 0:
+        return a
+    if a["count"] == 0:
+        return b
+    lo = min(a["offset"], b["offset"])
+    hi = max(a["offset"] + len(a["counts"]), b["offset"] + len(b["counts"]))
+    counts = np.zeros(hi - lo, dtype=np.int64)
+    for sketch in (a, b):
+        counts[sketch["offset"] - lo:sketch["offset"] - lo + len(sketch["counts"])] += sketch["counts"]
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "accuracy": a["accuracy"],
+        "offset": lo,
+        "counts": counts,
+        "zeros": a["zeros"] + b["zeros"],
+        "count": count,
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / count,
+        "min": min(a["min"], b["min"]),
+        "max": max(a["max"], b["max"]),
+    }
+
+def _sketch_quantile(sketch: dict, q: float) -> float:
+    """Estimate of Series.quantile(q) of the sketched amounts.
+
+    Interpolates, like pandas, between the values at ranks floor and ceil of q * (count - 1);
+    each is within the sketch's relative accuracy of the exact order statistic, and so is
+    their interpolation.
+    """
+    gamma = (1 + sketch["accuracy"]) / (1 - sketch["accuracy"])
+    cumulative = np.cumsum(sketch["counts"])
+
+    def value_at(rank):
+        if rank < sketch["zeros"]:
+            return 0.0
+        bucket = int(np.searchsorted(cumulative, rank - sketch["zeros"], side="right"))
+        estimate = 2 * gamma ** (sketch["offset"] + bucket) / (gamma + 1)
+        # Every amount lies in [min, max], so clamping only brings the estimate closer
+        return min(max(estimate, sketch["min"]), sketch["max"])
+
+    position = q * (sketch["count"] - 1)
+    below = int(position)
+    lower = value_at(below)
+    upper = value_at(min(below + 1, sketch["count"] - 1))
+    return lower + (upper - lower) * (position - below)
+
+def _sketch_statistics(sketch: dict) -> dict:
+    """The "statistics" aggregate from a sketch (quantiles approximate, the rest exact)."""
+    count = sketch["count"]
+    if count == 0:
+        nan = float("nan")
+        return {"mean": nan, "median": nan, "std": nan, "min": nan, "max": nan, "count": 0, "q25": nan, "q75": nan}
+    return {
+        "mean": sketch["mean"],
+        "median": _sketch_quantile(sketch, 0.5),
+        "std": float(np.sqrt(sketch["m2"] / (count - 1))) if count > 1 else float("nan"),
+        "min": sketch["min"],
+        "max": sketch["max"],
+        "count": count,
+        "q25": _sketch_quantile(sketch, 0.25),
+        "q75": _sketch_quantile(sketch, 0.75),
+    }
+
+# Billing periods of the recurring-payment detector: name -> (days, tolerance in days)
+_RECURRING_PERIODS = {"weekly": (7.0, 2.0), "monthly": (30.44, 4.0), "yearly": (365.25, 20.0)}
+# A merchant needs this many payments (two intervals) before it can count as recurring
+_RECURRING_MIN_COUNT = 3
+# Share of intervals that must match the period, and the amount variation allowed
+# (median absolute deviation over the median), so price changes still match
+_RECURRING_MIN_REGULARITY = 2 / 3
+_RECURRING_MAX_AMOUNT_DEVIATION = 0.15
+
+def _grouped_median(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Median of values per group id (ids 0..n-1, each present at least once)."""
+    return pd.Series(values).groupby(groups).median().to_numpy()
+
+def _recurring_payments(df: pd.DataFrame) -> pd.DataFrame:
+    """Merchants (descriptions) paid about the same amount on a weekly, monthly or yearly rhythm.
+
+    One pass over the rows sorted by (merchant, date): the interval between consecutive
+    payments, its median per merchant and the nearest period in _RECURRING_PERIODS, the
+    share of intervals within that period's tolerance, and the median and median absolute
+    deviation of the amounts, all as vectorized grouped reductions. Sorted by annual cost.
+    """
+    columns = ["period", "interval_days", "amount", "count", "regularity", "last_date", "next_date", "annual_cost"]
+    empty = pd.DataFrame(columns=columns)
+    if not {"Date", "Description", "Amount"} <= set(df.columns) or not isinstance(df["Description"].dtype, pd.CategoricalDtype):
+        return empty
+    dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+    amounts = df["Amount"].to_numpy(dtype=np.float64)
+    codes = df["Description"].cat.codes.to_numpy()
+    valid = ~np.isnat(dates) & ~np.isnan(amounts) & (codes >= 0)
+    dates, amounts, codes = dates[valid], amounts[valid], codes[valid]
+    if not len(codes):
+        return empty
+    # Sort by (merchant, date) through one int64 key: code, then seconds since the first date
+    seconds = dates.astype("datetime64[s]").astype(np.int64)
+    seconds -= seconds.min()
+    order = np.argsort(codes.astype(np.int64) * (int(seconds.max()) + 1) + seconds)
+    dates, amounts, codes = dates[order], amounts[order], codes[order]
+
+    def runs(codes):
+        first = np.empty(len(codes), dtype=bool)
+        first[:1] = True
+        np.not_equal(codes[1:], codes[:-1], out=first[1:])
+        starts = np.flatnonzero(first)
+        return first, starts, np.diff(np.append(starts, len(codes)))
+
+    first, starts, sizes = runs(codes)
+    keep = np.repeat(sizes >= _RECURRING_MIN_COUNT, sizes)
+    dates, amounts, codes = dates[keep], amounts[keep], codes[keep]
+    if not len(codes):
+        return empty
+    first, starts, sizes = runs(codes)
+    group = np.cumsum(first) - 1
+
+    # Interval (days) from every payment to the merchant's previous one
+    days = dates.astype(np.int64) / 86_400e9
+    gaps = np.diff(days)[~first[1:]]
+    gap_group = group[1:][~first[1:]]
+    gap_starts, gap_sizes = starts - np.arange(len(starts)), sizes - 1
+    interval = _grouped_median(gaps, gap_group)
+
+    period_days = np.array([length for length, _ in _RECURRING_PERIODS.values()])
+    tolerance = np.array([allowed for _, allowed in _RECURRING_PERIODS.values()])
+    nearest = np.abs(interval[:, None] - period_days).argmin(axis=1)
+    on_period = np.abs(gaps - period_days[nearest][gap_group]) <= tolerance[nearest][gap_group]
+    regularity = np.add.reduceat(on_period.astype(np.int64), gap_starts) / gap_sizes
+
+    magnitude = np.abs(amounts)
+    typical = _grouped_median(magnitude, group)
+    deviation = _grouped_median(np.abs(magnitude - typical[group]), group)
+
+    recurring = ((np.abs(interval - period_days[nearest]) <= tolerance[nearest])
+                 & (regularity >= _RECURRING_MIN_REGULARITY)
+                 & (typical > 0) & (deviation <= _RECURRING_MAX_AMOUNT_DEVIATION * typical))
+    if not recurring.any():
+        return empty
+    last = dates[starts + sizes - 1][recurring]
+    result = pd.DataFrame({
+        "period": np.array(list(_RECURRING_PERIODS))[nearest][recurring],
+        "interval_days": interval[recurring],
+        "amount": _grouped_median(amounts, group)[recurring],
+        "count": sizes[recurring],
+        "regularity": regularity[recurring],
+        "last_date": last,
+        "next_date": last + (interval[recurring] * 86_400e9).astype("timedelta64[ns]"),
+        "annual_cost": (typical * 365.25 / period_days[nearest])[recurring],
+    }, index=df["Description"].cat.categories[codes[starts][recurring]])
+    return result.sort_values("annual_cost", ascending=False, kind="stable")
+
+def _build_aggregates(df: pd.DataFrame, sketch=None, defer: bool = False) -> dict:
+    """Everything /dashboard, /advanced-analytics and the chat summaries need from a dataset.
+
+    Built once per dataset version so requests never group the transactions. "by" holds
+    the sum, count and absolute sum of Amount per Category, Month (yyyymm), Weekday,
+    Description and Description x Category (_ROLLUPS, for the keys present), summed from
+    the transactions so totals match a direct groupby; with spending per hour and the
+    totals, these roll up, so appends merge them (see _merge_aggregates). The figures that
+    do not roll up (see _deferred_aggregates) are computed here too unless defer is set,
+    in which case _aggregate computes them on first use.
+    """
+    aggregates = {"rows": len(df), "columns": list(df.columns), "by": {},
+                  "category_count": df["Category"].nunique() if "Category" in df.columns else 0}
+    if not defer:
+        for group in ("statistics", "recurring"):
+            aggregates.update(_deferred_aggregates(df, sketch, group))
+    if "Amount" not in df.columns:
+        return aggregates
+    amounts = df["Amount"]
+    abs_amounts = amounts.abs()  # Use absolute values for stats
+    
+    keys = {}
+    if "Category" in df.columns:
+        keys["Category"] = df["Category"]
+    if "Date" in df.columns:
+        dates = pd.to_datetime(df["Date"])
+        keys["Month"] = dates.dt.year * 100 + dates.dt.month
+        keys["Weekday"] = dates.dt.dayofweek
+        aggregates["hourly"] = abs_amounts.groupby(dates.dt.hour).sum()
+    if "Description" in df.columns:
+        keys["Description"] = df["Description"]
+    frame = pd.DataFrame({**keys, "sum": amounts, "abs_sum": abs_amounts})
+    for rollup in _ROLLUPS:
+        if all(key in keys for key in rollup):
+            aggregates["by"][rollup] = _rollup(frame, rollup)
+    aggregates["total"] = {"sum": float(amounts.sum()), "mean": float(amounts.mean()),
+                           "abs_sum": float(abs_amounts.sum()), "count": int(amounts.count())}
+    return aggregates
+
+def _deferred_aggregates(df: pd.DataFrame, sketch, group: str) -> dict:
+    """The aggregates that do not roll up, by group.
+
+    "statistics": the abs-amount statistics (from the dataset's amount sketch if given),
+    the first 10 IQR outliers in dataset order and the medians per category, None (no
+    outliers) without the columns they need. "recurring": recurring payments.
+    """
+    if group == "recurring":
+        return {"recurring": _recurring_payments(df)}
+    figures = {"statistics": None, "outliers": [], "category_medians": None, "category_abs_medians": None}
+    if "Amount" not in df.columns:
+        return figures
+    amounts = df["Amount"]
+    abs_amounts = amounts.abs()
+    if sketch is not None:
+        figures["statistics"] = _sketch_statistics(sketch)
+    else:
+        figures["statistics"] = {
+            "mean": float(abs_amounts.mean()),
+            "median": float(abs_amounts.median()),
+            "std": float(abs_amounts.std()),
+            "min": float(abs_amounts.min()),
+            "max": float(abs_amounts.max()),
+            "count": int(abs_amounts.count()),
+            "q25": float(abs_amounts.quantile(0.25)),
+            "q75": float(abs_amounts.quantile(0.75))
+        }
+    
+    # Outlier Detection using IQR method (first 10 in dataset order, scanning only as far as needed)
+    Q1 = figures["statistics"]["q25"]
+    Q3 = figures["statistics"]["q75"]
+    IQR = Q3 - Q1
+    values = abs_amounts.to_numpy()
+    outlier_rows = []
+    for start in range(0, len(values), 1 << 16):
+        chunk = values[start:start + (1 << 16)]
+        hits = np.flatnonzero((chunk < Q1 - 1.5 * IQR) | (chunk > Q3 + 1.5 * IQR))
+        outlier_rows.extend(start + hits[:10 - len(outlier_rows)])
+        if len(outlier_rows) == 10:
+            break
+    figures["outliers"] = [
+        {
+            "amount": float(row.get("Amount", 0)),
+            "description": str(row.get("Description", "Unknown")),
+            "category": str(row.get("Category", "Unknown")),
+            "date": str(row.get("Date", "Unknown"))
+        }
+        for _, row in df.iloc[outlier_rows].iterrows()
+    ]
+    
+    if "Category" in df.columns:
+        figures["category_medians"] = amounts.groupby(df["Category"], observed=True).median()
+        figures["category_abs_medians"] = abs_amounts.groupby(df["Category"], observed=True).median()
+    return figures
+
+def _aggregate(entry: dict, name: str):
+    """One of the aggregates that do not roll up (see _deferred_aggregates) of a session
+    entry or view, computed with the rest of its group on first use and charged to the
+    entry. Concurrent first requests wait for one computation instead of each running it."""
+    aggregates = entry["aggregates"]
+    if name not in aggregates:
+        with _SESSION_LOCK:
+            lock = entry.setdefault("aggregates_lock", threading.Lock())
+        with lock:
+            if name not in aggregates:
+                group = "recurring" if name == "recurring" else "statistics"
+                figures = _deferred_aggregates(entry["df"], entry.get("sketch"), group)
+                with _SESSION_LOCK:
+                    aggregates.update(figures)
+                    _grow_session(entry, _nbytes(figures))
+    return aggregates[name]
+
+def _merge_rollups(old: pd.DataFrame, new: pd.DataFrame, df: pd.DataFrame, recode: dict) -> pd.DataFrame:
+    """Sum two _rollup tables into the one of the dataset df that holds both their rows.
+
+    Each key becomes an integer, a category code of df's column for categorical keys (so
+    no text is compared) and the value itself for Month and Weekday, and the keys of a
+    row one int64 in key order; both tables are sorted by it, so their union is too.
+    recode caches the code maps from the tables' categories to df's across the rollups.
+    """
+    keys = list(old.index.names)
+    columns, bases = [], []
+    for key in keys:
+        levels = [table.index.get_level_values(key) for table in (old, new)]
+        if key in df.columns and isinstance(df[key].dtype, pd.CategoricalDtype):
+            categories = df[key].cat.categories
+            codes = []
+            for level in levels:
+                cache_key = (key, id(level.categories))
+                if cache_key not in recode:
+                    recode[cache_key] = (level.categories, categories.get_indexer(level.categories))
+                codes.append(recode[cache_key][1][level.codes])
+            columns.append((codes, categories))
+            bases.append(len(categories))
+        else:
+            codes = [level.to_numpy(dtype=np.int64) for level in levels]
+            columns.append((codes, levels[0].dtype))
+            bases.append(int(max(code.max(initial=0) for code in codes)) + 1)
+    packed = [np.zeros(len(table), dtype=np.int64) for table in (old, new)]
+    for (codes, _), base in zip(columns, bases):
+        packed = [key * base + code for key, code in zip(packed, codes)]
+    union = np.union1d(*packed)
+    rows = [np.searchsorted(union, key) for key in packed]
+    merged = {}
+    for name in old.columns:
+        values = np.zeros(len(union), dtype=old[name].dtype)
+        for table, positions in zip((old, new), rows):
+            values[positions] += table[name].to_numpy()
+        merged[name] = values
+    levels, rest = [], union
+    for (codes, categories), base in reversed(list(zip(columns, bases))):
+        rest, code = np.divmod(rest, base)
+        # categories is the key's dtype for the integer keys
+        levels.insert(0, code.astype(categories) if isinstance(categories, np.dtype)
+                      else pd.Categorical.from_codes(code, categories=categories))
+    index = pd.MultiIndex.from_arrays(levels, names=keys) if len(keys) > 1 else pd.Index(levels[0], name=keys[0])
+    return pd.DataFrame(merged, index=index)
+
+def _merge_aggregates(old: dict, new: dict, df: pd.DataFrame) -> dict:
+    """Deferred aggregates (see _build_aggregates) of df from those of its first rows (old)
+    and of the rest (new), summing the rollups, hourly spending and totals instead of
+    grouping df again."""
+    if old["columns"] != new["columns"] or old["by"].keys() != new["by"].keys():
+        return _build_aggregates(df, defer=True)
+    recode = {}  # Keeps the categories it is keyed by (their id) alive
+    aggregates = {"rows": len(df), "columns": list(df.columns),
+                  "by": {rollup: _merge_rollups(old["by"][rollup], new["by"][rollup], df, recode) for rollup in old["by"]},
+                  "category_count": df["Category"].nunique() if "Category" in df.columns else 0}
+    if "hourly" in old:
+        aggregates["hourly"] = old["hourly"].add(new["hourly"], fill_value=0)
+    if "total" in old:
+        count = old["total"]["count"] + new["total"]["count"]
+        total = {key: old["total"][key] + new["total"][key] for key in ("sum", "abs_sum")}
+        aggregates["total"] = {"sum": total["sum"], "mean": total["sum"] / count if count else float("nan"),
+                               "abs_sum": total["abs_sum"], "count": count}
+    return aggregates
+
+def _month_label(month: int) -> str:
+    """yyyymm Month key as "YYYY-MM"."""
+    return f"{month // 100:04d}-{month % 100:02d}"
+
+def _ingest_upload(sid: str, stream, bank: str, filename: str, mode: str, progress=_ignore_progress) -> dict:
+    """Parse an uploaded statement into the session's dataset; returns the /upload response."""
+    # "append" merges the statement into the session's data instead of replacing it
+    current = _get_session(sid)
+    append = mode == "append" and current is not None
+    known_fingerprints = current["fingerprints"] if append else None
+    # Re-uploads of the same statement are served from the parse cache
+    cache_key = _parse_cache_key(stream, bank, _upload_variant(filename, bank)) if PARSE_CACHE_DIR else None
+    cached = _parse_cache_load(cache_key) if cache_key else None
+    if cached is not None:
+        new_df, new_fingerprints, new_profile = cached
+        print(f"Parse cache hit {cache_key[:12]}: {new_df.shape}")
+        if append:
+            fresh = ~_in_sorted(new_fingerprints, known_fingerprints)
+            if not fresh.all():
+                # Profiles only the columns the cache kept (all of them unless streamed)
+                new_profile = None
+            new_df, new_fingerprints = new_df[fresh], new_fingerprints[fresh]
+        if new_profile is None:
+            new_profile = _profile_transactions(new_df)
+    else:
+        new_df, new_fingerprints, new_profile = _parse_upload(stream, bank, filename, known_fingerprints, progress)
+        # Append parses skip known rows, so only full parses are reusable
+        if cache_key and not append:
+            _parse_cache_store(cache_key, new_df, new_fingerprints, new_profile)
+    
+    bytes_before = _bytes_per_row(new_df)
+    new_df = _compact_transactions(new_df)
+    bytes_after = _bytes_per_row(new_df)
+    print(f"Compacted transactions: {bytes_before:.0f} -> {bytes_after:.0f} bytes/row")
+    
+    if append:
+        entry = current
+        if not new_df.empty:
+            entry = {
+                "df": _concat_transactions(current["df"], new_df),
+                "context": {},
+                "payloads": {},
+                "fingerprints": np.union1d(current["fingerprints"], new_fingerprints),
+                "profile": _merge_profiles(current["profile"], new_profile),
+            }
+            if "sketch" in current and "Amount" in new_df.columns:
+                # Only the new rows are sketched; the dataset's sketch absorbs them
+                entry["sketch"] = _merge_sketches(current["sketch"], _amount_sketch(new_df["Amount"]))
+            # Only the new rows are grouped and hashed; the history's rollups and version absorb them
+            entry["aggregates"] = _merge_aggregates(current["aggregates"], _build_aggregates(new_df, defer=True), entry["df"])
+            entry["version"] = hashlib.sha1(f"{current['version']}-{_dataset_version(new_df)}".encode()).hexdigest()[:16]
+            _put_session(sid, entry)
+        print(f"Appended {len(new_df)} new transactions, dataset now has {len(entry['df'])}")
+    else:
+        entry = {
+            "df": new_df,
+            "context": {},
+            "payloads": {},
+            "fingerprints": np.unique(new_fingerprints),
+            "profile": new_profile,
+        }
+        _put_session(sid, entry)
+    
+    transactions_df = entry["df"]
+    print(f"CSV upload successful! Processed {len(transactions_df)} transactions from {bank.upper()} format")
+    return {
+        "message": f"CSV uploaded successfully! Processed {len(transactions_df)} {bank.upper()} transactions", 
+        "columns": list(entry["profile"]["columns"]),
+        "bank": bank.upper(),
+        "transaction_count": len(transactions_df),
+        "added_count": len(new_df),
+        "bytes_per_row": {"before": round(bytes_before, 1), "after": round(bytes_after, 1)},
+    }
+
+# Background ingestion jobs (ASYNC_UPLOADS): job id -> status dict with job_id, session,
+# status ("queued", "running", "done" or "error"), stage, percent, updated and, once
+# finished, result (the /upload response) or error. With SNAPSHOT_DIR each status is also
+# written to <SNAPSHOT_DIR>/<session>/job-<id>.json so any worker can report it.
+_JOBS = {}
+_INGEST_POOL = ThreadPoolExecutor(max_workers=INGEST_WORKERS)
+# One ingestion at a time per session, so concurrent appends do not drop each other's rows:
+# session -> [lock, number of threads holding or waiting for it]. Entries go with their
+# session once no thread uses them (see _drop_ingest_lock).
+_INGEST_LOCKS = {}
+# Where each pipeline stage starts, in percent of the whole job
+_JOB_STAGES = {"parsing": 0, "normalizing": 45, "categorizing": 80}
+# A job file not updated for this long belongs to a worker that died mid-job
+_JOB_STALE_SECONDS = 600
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+@contextlib.contextmanager
+def _ingest_lock(sid: str):
+    """Hold a session's ingestion lock. With SNAPSHOT_DIR it is also an flock on
+    <SNAPSHOT_DIR>/<session>/ingest.lock, so ingestions in different workers take turns too;
+    _ingest_upload then starts from the snapshot the previous one wrote (see _get_session)."""
+    with _SESSION_LOCK:
+        lock = _INGEST_LOCKS.setdefault(sid, [threading.Lock(), 0])
+        lock[1] += 1
+    try:
+        with lock[0]:
+            if SNAPSHOT_DIR and fcntl is not None:
+                os.makedirs(_snapshot_dir(sid), exist_ok=True)
+                with open(os.path.join(_snapshot_dir(sid), "ingest.lock"), "a") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX)  # Released when f is closed
+                    yield
+            else:
+                yield
+    finally:
+        with _SESSION_LOCK:
+            lock[1] -= 1
+            if sid not in _SESSION_STORE:
+                _drop_ingest_lock(sid)
+
+def _drop_ingest_lock(sid: str):
+    """Forget a session's ingestion lock unless a thread holds or waits for it (caller holds
+    _SESSION_LOCK)."""
+    lock = _INGEST_LOCKS.get(sid)
+    if lock is not None and not lock[1]:
+        del _INGEST_LOCKS[sid]
+
+def _job_path(sid: str, job_id: str) -> str:
+    return os.path.join(_snapshot_dir(sid), f"job-{job_id}.json")
+
+def _set_job(job: dict, **changes):
+    """Update a job's status (and its file under SNAPSHOT_DIR)."""
+    job.update(changes, updated=time.time())
+    if SNAPSHOT_DIR:
+        path = _job_path(job["session"], job["job_id"])
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(job, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Could not write status of job {job['job_id']}: {e}")
+
+def _job_progress(job: dict):
+    """Progress callback for _ingest_upload that maps stage fractions onto job percent."""
+    starts = sorted(_JOB_STAGES.values()) + [100]
+    def progress(stage: str, fraction: float = 0.0):
+        start = _JOB_STAGES[stage]
+        end = starts[starts.index(start) + 1]
+        percent = int(start + (end - start) * min(max(fraction, 0.0), 1.0))
+        if stage != job["stage"] or percent != job["percent"]:
+            _set_job(job, stage=stage, percent=percent)
+    return progress
+
+def _run_ingest_job(job: dict, stream, bank: str, filename: str, mode: str):
+    _set_job(job, status="running")
+    try:
+        with _ingest_lock(job["session"]):
+            result = _ingest_upload(job["session"], stream, bank, filename, mode, _job_progress(job))
+        _set_job(job, status="done", stage="done", percent=100, result=result)
+    except Exception as e:
+        print(f"Ingestion job {job['job_id']} failed: {e}")
+        _set_job(job, status="error", error=f"Error processing CSV: {str(e)}")
+
+def _start_ingest_job(sid: str, stream, bank: str, filename: str, mode: str) -> dict:
+    """Queue an upload for the ingestion pool; returns a copy of the new job's status."""
+    job = {"job_id": uuid.uuid4().hex, "session": sid, "status": "queued", "stage": "queued", "percent": 0}
+    cutoff = time.time() - SESSION_TTL_SECONDS
+    with _SESSION_LOCK:
+        for job_id, old in list(_JOBS.items()):
+            if old["status"] in ("done", "error") and old["updated"] < cutoff:
+                del _JOBS[job_id]
+        _JOBS[job["job_id"]] = job
+    if SNAPSHOT_DIR:
+        # Only the latest finished job of a session is still being polled
+        for name in os.listdir(_snapshot_dir(sid)) if os.path.isdir(_snapshot_dir(sid)) else []:
+            if name.startswith("job-") and name.endswith(".json"):
+                old = _get_job(sid, name[len("job-"):-len(".json")])
+                if old and old["status"] in ("done", "error") and old["updated"] < time.time() - 60:
+                    try:
+                        os.remove(os.path.join(_snapshot_dir(sid), name))
+                    except FileNotFoundError:
+                        pass
+    _set_job(job)
+    print(f"Queued ingestion job {job['job_id']} for session {sid}")
+    _INGEST_POOL.submit(_run_ingest_job, job, stream, bank, filename, mode)
+    return dict(job)
+
+def _get_job(sid: str, job_id: str):
+    """Status of one of the session's jobs, from this worker or SNAPSHOT_DIR; None if unknown."""
+    job = _JOBS.get(job_id)
+    if job is not None:
+        return dict(job) if job["session"] == sid else None
+    if SNAPSHOT_DIR and _JOB_ID_PATTERN.match(job_id):
+        try:
+            with open(_job_path(sid, job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return None
+
+def _pending_job(sid: str):
+    """Status of a queued or running ingestion job of the session, or None."""
+    with _SESSION_LOCK:
+        for job in _JOBS.values():
+            if job["session"] == sid and job["status"] in ("queued", "running"):
+                return dict(job)
+    if SNAPSHOT_DIR:
+        try:
+            names = [name for name in os.listdir(_snapshot_dir(sid)) if name.startswith("job-") and name.endswith(".json")]
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            job = _get_job(sid, name[len("job-"):-len(".json")])
+            if (job and job["status"] in ("queued", "running")
+                    and time.time() - job["updated"] < _JOB_STALE_SECONDS):
+                return job
+    return None
+
+def _processing_message(job: dict) -> str:
+    return (f"Your statement is still processing ({job['stage']}, {job['percent']}% done). "
+            "Please try again in a moment.")
+
 @app.route("/upload", methods=["POST"])
 def upload_csv():
-    global transactions_df, csv_text
+    sid = _session_id()
     file = request.files.get("file")
     bank = request.form.get("bank", "").lower()
+    mode = request.form.get("mode", "replace").lower()
     
     if file is None:
         return jsonify({"message": "No file provided"}), 400
@@ -565,146 +2192,741 @@ def upload_csv():
     if not bank:
         return jsonify({"message": "Bank selection required"}), 400
     
+    if ASYNC_UPLOADS:
+        # The request's file is gone once it returns, so the job gets its own copy
+        job = _start_ingest_job(sid, io.BytesIO(file.read()), bank, (file.filename or "").lower(), mode)
+        return jsonify({"message": "Upload queued for processing", "job_id": job["job_id"], "job": job}), 202
+    
     try:
-        filename = file.filename.lower()
-        if filename.endswith('.pdf') and bank == 'kotak':
-            file_stream = io.BytesIO(file.read())
-            transactions_df = _extract_pdf_kotak(file_stream)
-            print(f"Extracted PDF shape: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
-        else:
-            transactions_df = pd.read_csv(file)
-            print(f"Original CSV shape: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
-            
-        print(f"Processing as {bank.upper()} format")
-        
-        # Use bank-specific processing
-        transactions_df = _normalize_columns_bank_specific(transactions_df, bank)
-        print(f"After {bank} normalization: {transactions_df.shape}, columns: {transactions_df.columns.tolist()}")
-        
-        # Filter out rows with invalid amounts or dates
-        if "Amount" in transactions_df.columns:
-            transactions_df = transactions_df.dropna(subset=["Amount"])
-            # Only remove zero amount transactions if they're clearly invalid
-            # (keep them if they might be valid like balance inquiries)
-        
-        if "Date" in transactions_df.columns:
-            transactions_df = transactions_df.dropna(subset=["Date"])
-        
-        print(f"After filtering: {transactions_df.shape} rows")
-        
-        # Convert each row to text for LLM context (best-effort if columns present)
-        def row_to_text(row):
-            date = row["Date"] if "Date" in row and pd.notna(row["Date"]) else "?"
-            amount = row["Amount"] if "Amount" in row and pd.notna(row["Amount"]) else "?"
-            category = row["Category"] if "Category" in row and pd.notna(row["Category"]) else "?"
-            desc = row["Description"] if "Description" in row and pd.notna(row["Description"]) else ""
-            return f"On {date} you spent ₹{abs(amount):.2f} on {category}: {desc}"
-        
-        try:
-            csv_text = "\n".join(transactions_df.apply(row_to_text, axis=1))
-            print(f"CSV text length: {len(csv_text)} chars")
-        except Exception as e:
-            print(f"Error creating CSV text: {e}")
-            # Fallback to raw CSV text
-            csv_text = transactions_df.to_csv(index=False)
-        
-        print(f"CSV upload successful! Processed {len(transactions_df)} transactions from {bank.upper()} format")
-        return jsonify({
-            "message": f"CSV uploaded successfully! Processed {len(transactions_df)} {bank.upper()} transactions", 
-            "columns": list(transactions_df.columns),
-            "bank": bank.upper(),
-            "transaction_count": len(transactions_df)
-        })
+        with _ingest_lock(sid):
+            return jsonify(_ingest_upload(sid, file.stream, bank, (file.filename or "").lower(), mode))
     except Exception as e:
         print(f"CSV upload error: {e}")
         return jsonify({"message": f"Error processing CSV: {str(e)}"}), 400
 
-@app.route("/dashboard", methods=["POST"])
-def dashboard():
-    global transactions_df
-    print(f"Dashboard called. transactions_df is None: {transactions_df is None}")
-    if transactions_df is None:
-        print("No transactions_df found")
-        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
-    
-    if transactions_df.empty:
-        print("transactions_df is empty")
-        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
-    
-    df = transactions_df.copy()
-    print(f"DataFrame shape: {df.shape}, columns: {df.columns.tolist()}")
+@app.route("/upload/status/<job_id>", methods=["GET"])
+def upload_status(job_id):
+    """Stage and percent of an asynchronous upload (see ASYNC_UPLOADS)."""
+    job = _get_job(_session_id(), job_id)
+    if job is None:
+        return jsonify({"message": "Unknown upload job"}), 404
+    return jsonify(job)
+
+# Filtered views (aggregates of a slice of the dataset) kept per session entry
+_FILTER_VIEWS_MAX = 8
+# Serialized responses kept per view (the entry and each filtered view): /dashboard,
+# /recurring and /advanced-analytics, per combination of sections
+_PAYLOADS_MAX = 8
+
+def _request_filters():
+    """from/to/category/merchant query parameters as a hashable key, or None when unfiltered.
+
+    Dates are inclusive days (or exact timestamps when a time is given); category and
+    merchant may repeat to select several. Raises ValueError for unparseable dates.
+    """
+    def bound(name, inclusive_day):
+        value = request.args.get(name, "").strip()
+        if not value:
+            return None
+        try:
+            stamp = pd.Timestamp(value)
+        except ValueError:
+            raise ValueError(f"Invalid '{name}' date: {value}")
+        # A bare date in "to" covers that whole day
+        return stamp + pd.Timedelta(days=1) if inclusive_day and len(value) <= 10 else stamp
+
+    start, end = bound("from", False), bound("to", True)
+    categories = tuple(sorted({v for v in request.args.getlist("category") if v}))
+    merchants = tuple(sorted({v for v in request.args.getlist("merchant") if v}))
+    if start is None and end is None and not categories and not merchants:
+        return None
+    return (start, end, categories, merchants)
+
+def _filter_index(entry: dict) -> dict:
+    """Date-sorted row order and per-code row lists of the entry's df, built on first use.
+
+    "Date" holds (order, sorted dates, dates); "Category" and "Description" hold
+    (categories, rows grouped by code, start of each code's rows, codes), with every
+    code's rows in dataset order.
+    """
+    index = entry.get("index")
+    if index is None:
+        df = entry["df"]
+        index = {}
+        if "Date" in df.columns:
+            dates = df["Date"].to_numpy(dtype="datetime64[ns]")
+            order = np.argsort(dates, kind="stable")  # NaT sorts last
+            index["Date"] = (order, dates[order], dates)
+        for col in ("Category", "Description"):
+            if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype):
+                categories = df[col].cat.categories
+                codes = df[col].cat.codes.to_numpy()
+                order = np.argsort(codes, kind="stable")
+                starts = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+                index[col] = (categories, order, starts, codes)
+        nbytes = _nbytes(index)
+        with _SESSION_LOCK:
+            if "index" not in entry:
+                entry["index"] = index
+                _grow_session(entry, nbytes)
+    return index
+
+def _filtered_rows(entry: dict, filters) -> np.ndarray:
+    """Positions (in dataset order) of the df rows matching filters.
+
+    Each filter yields its candidate rows from the index (a searchsorted slice of the
+    date order, or the row lists of the selected codes); only the smallest candidate set
+    is checked against the other filters, so the cost follows the rows selected.
+    """
+    start, end, categories, merchants = filters
+    index = _filter_index(entry)
+    candidates = []  # (rows, keep(rows) -> mask)
+    if start is not None or end is not None:
+        if "Date" not in index:
+            raise ValueError("Date filters need a Date column")
+        order, sorted_dates, dates = index["Date"]
+        start = np.datetime64(start.value, "ns") if start is not None else None
+        end = np.datetime64(end.value, "ns") if end is not None else None
+        lo = np.searchsorted(sorted_dates, start, "left") if start is not None else 0
+        # NaT sorts last and never matches a date range
+        hi = np.searchsorted(sorted_dates, end if end is not None else np.datetime64("NaT"), "left")
+
+        def in_range(rows):
+            selected = dates[rows]
+            keep = ~np.isnat(selected)
+            if start is not None:
+                keep &= selected >= start
+            if end is not None:
+                keep &= selected < end
+            return keep
+        candidates.append((order[lo:hi], in_range))
+    for col, values in (("Category", categories), ("Description", merchants)):
+        if not values:
+            continue
+        if col not in index:
+            return np.empty(0, dtype=np.intp)
+        cats, order, starts, codes = index[col]
+        wanted = cats.get_indexer(list(values))
+        wanted = wanted[wanted >= 0]
+        rows = np.concatenate([order[starts[c]:starts[c + 1]] for c in wanted]) if len(wanted) else order[:0]
+        candidates.append((rows, lambda rows, codes=codes, wanted=wanted: np.isin(codes[rows], wanted)))
+    candidates.sort(key=lambda candidate: len(candidate[0]))
+    rows = candidates[0][0]
+    for _, keep in candidates[1:]:
+        rows = rows[keep(rows)]
+    # Dataset order keeps sums and "first 10" lists identical to the unfiltered path
+    return np.sort(rows)
+
+def _take_rows(df: pd.DataFrame, rows: np.ndarray) -> pd.DataFrame:
+    """df rows at the given positions, with categoricals narrowed to the categories in use.
+
+    Grouping cost grows with the number of categories, so a slice keeping every merchant
+    of the dataset would not be cheaper to aggregate than the dataset itself.
+    """
+    sub = df.take(rows)
+    narrowed = {}
+    for col in ("Category", "Description"):
+        if col in sub.columns and isinstance(sub[col].dtype, pd.CategoricalDtype):
+            codes = sub[col].cat.codes.to_numpy()
+            used = np.unique(codes[codes >= 0])
+            new_codes = np.where(codes >= 0, np.searchsorted(used, codes), -1)
+            narrowed[col] = pd.Categorical.from_codes(new_codes, categories=sub[col].cat.categories[used])
+    return sub.assign(**narrowed) if narrowed else sub
+
+def _filtered_view(entry: dict, filters):
+    """Entry-like view (aggregates, profile, payloads) of the rows matching filters, or None
+    if none match. The most recent views are kept on the entry (see _FILTER_VIEWS_MAX)."""
+    with _SESSION_LOCK:
+        views = entry.setdefault("views", {})
+        view = views.get(filters)
+    if view is None:
+        rows = _filtered_rows(entry, filters)
+        if len(rows) == 0:
+            return None
+        aggregates = _build_aggregates(_take_rows(entry["df"], rows))
+        view = {
+            "aggregates": aggregates,
+            "profile": entry["profile"],
+            "payloads": {},
+            "bytes": _nbytes(filters) + _nbytes(aggregates),
+        }
+        with _SESSION_LOCK:
+            dropped = [views.pop(filters)] if filters in views else []
+            while len(views) >= _FILTER_VIEWS_MAX:
+                dropped.append(views.pop(next(iter(views))))
+            views[filters] = view
+            _grow_session(entry, view["bytes"] - sum(old["bytes"] for old in dropped))
+    return view
+
+# LLM context retrieval for /chat (CHAT_CONTEXT_MODE=retrieval): BM25 over the words of each
+# transaction's description, category and month, within the ranges the question mentions
+_MONTH_NAMES = ["january", "february", "march", "april", "may", "june", "july", "august",
+                "september", "october", "november", "december"]
+_RETRIEVAL_WORD = re.compile(r"[a-z0-9]+")
+_RETRIEVAL_STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "at", "be", "by", "can", "did", "do",
+    "does", "for", "from", "give", "have", "how", "in", "is", "it", "list", "many", "me", "much",
+    "my", "of", "on", "or", "show", "spend", "spending", "spent", "tell", "than", "that", "the",
+    "this", "to", "total", "was", "were", "what", "when", "where", "which", "with", "you", "your",
+}
+# "may" is only a month after a preposition or before a year ("how much may i spend" is not)
+_QUERY_MAY = ("(?:" + "|".join(rf"(?<=\b{word} )" for word in ("in", "of", "for", "during", "since", "from", "to",
+                                                                 "until", "till", "through", "between", "and"))
+              + r")may|may(?=\s*,?\s*(?:19|20)\d{2}\b)")
+_QUERY_MONTH_NAME = "|".join([m for m in _MONTH_NAMES if m != "may"] + [_QUERY_MAY, "sept"]
+                             + [m[:3] for m in _MONTH_NAMES if m != "may"])
+_QUERY_MONTH = re.compile(r"\b(" + _QUERY_MONTH_NAME + r")\b(?:\s*,?\s*((?:19|20)\d{2})\b)?")
+_QUERY_MONTH_RANGE = re.compile(r"\b(?:from|between)\s+(" + _QUERY_MONTH_NAME + r")\b(?:\s*,?\s*((?:19|20)\d{2})\b)?"
+                                r"\s+(?:to|and|until|till|through)\s+(" + _QUERY_MONTH_NAME
+                                + r")\b(?:\s*,?\s*((?:19|20)\d{2})\b)?")
+_QUERY_DATE = re.compile(r"\b(?:(from|since|after|between|to|until|till|before|and|on)\s+)?(\d{4}-\d{2}-\d{2})\b")
+_QUERY_YEAR = re.compile(r"\b((?:19|20)\d{2})\b")
+_QUERY_AMOUNT = re.compile(r"\b(over|above|more than|greater than|at least|under|below|less than|at most|up to)"
+                           r"\s*(?:rs\.?|inr|₹)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k\b)?")
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+def _retrieval_words(text: str) -> list:
+    """Lower-case words of text (two characters or more)."""
+    return [word for word in _RETRIEVAL_WORD.findall(text.lower()) if len(word) > 1]
+
+def _retrieval_index(entry: dict) -> dict:
+    """BM25 postings of the entry's transactions, built on first use.
+
+    A transaction's document is the words of its description, category and month ("september
+    sep 2025"). Each field is tokenized once per distinct value, so "fields" holds, by column
+    ("Month" for the month words), (value code of every row, {word: (value codes, counts)},
+    values), and a row's count of a word is gathered through its code (-1, missing, reads an
+    empty last slot). "length" is every
+    row's document length, "recency" orders rows by date, "month"/"year" are the date parts
+    (0 without a date) and "amount" the absolute amount, for the query ranges.
+    """
+    index = entry.get("retrieval")
+    if index is not None:
+        return index
+    df = entry["df"]
+    n = len(df)
+    index = {"fields": {}, "length": np.zeros(n), "recency": np.arange(n),
+             "month": np.zeros(n, dtype=np.int64), "year": np.zeros(n, dtype=np.int64),
+             "amount": df["Amount"].abs().to_numpy(dtype=float) if "Amount" in df.columns else None}
+
+    def add_field(name, codes, values):
+        postings = {}
+        lengths = np.zeros(len(values) + 1)
+        for code, value in enumerate(values):
+            words = _retrieval_words(str(value))
+            lengths[code] = len(words)
+            for word in set(words):
+                value_codes, counts = postings.setdefault(word, ([], []))
+                value_codes.append(code)
+                counts.append(words.count(word))
+        postings = {word: (np.array(value_codes), np.array(counts, dtype=float))
+                    for word, (value_codes, counts) in postings.items()}
+        index["fields"][name] = (codes, postings, values)
+        index["length"] += lengths[codes]
+
+    for col in ("Description", "Category"):
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            codes, values = df[col].cat.codes.to_numpy(), df[col].cat.categories
+        else:
+            codes, values = pd.factorize(df[col])
+        add_field(col, codes, values)
+    if "Date" in df.columns:
+        dates = pd.to_datetime(df["Date"])
+        valid = dates.notna().to_numpy()
+        index["year"] = dates.dt.year.fillna(0).to_numpy(dtype=np.int64)
+        index["month"] = dates.dt.month.fillna(0).to_numpy(dtype=np.int64)
+        # NaT is the smallest int64, so undated rows count as the oldest
+        index["recency"] = dates.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        keys, codes = np.unique(index["year"] * 12 + index["month"] - 1, return_inverse=True)
+        codes = np.where(valid, codes.reshape(-1), -1)
+        add_field("Month", codes, [f"{_MONTH_NAMES[key % 12]} {_MONTH_NAMES[key % 12][:3]} {key // 12}"
+                          if key >= 0 else "" for key in keys])
+    nbytes = _nbytes(index)
+    with _SESSION_LOCK:
+        if "retrieval" not in entry:
+            entry["retrieval"] = index
+            _grow_session(entry, nbytes)
+    return index
+
+def _month_number(name: str) -> int:
+    """1-12 for a month name or abbreviation."""
+    return next(i for i, full in enumerate(_MONTH_NAMES, 1) if full.startswith(name[:3]))
+
+def _parse_ranges(query: str):
+    """(ranges, rest): the months, years, dates and amount bounds a question mentions, and
+    the lower-cased question without them.
+
+    ranges holds "months" [(1-12, year or None)], "years", "start"/"end" (Timestamps, end
+    exclusive, or None), "amounts" [(comparison, value)], "empty" (a month span that ends
+    before it starts, which no row is in) and "labels", a phrase for each.
+    """
+    text = query.lower()
+    ranges = {"months": [], "years": [], "start": None, "end": None, "amounts": [], "empty": False, "labels": []}
+    day = pd.Timedelta(days=1)
+    for keyword, value in _QUERY_DATE.findall(text):
+        try:
+            stamp = pd.Timestamp(value)
+        except ValueError:
+            continue
+        if keyword in ("from", "since", "between", "after"):
+            ranges["start"] = stamp + day if keyword == "after" else stamp
+        elif keyword:
+            ranges["end"] = stamp if keyword == "before" else stamp + day
+        else:
+            ranges["start"], ranges["end"] = stamp, stamp + day
+    text = _QUERY_DATE.sub(" ", text)
+    start, end = ranges["start"], ranges["end"]
+    if start is not None and end is not None:
+        last = end - day
+        ranges["labels"].append(f"on {start:%Y-%m-%d}" if last == start else f"from {start:%Y-%m-%d} to {last:%Y-%m-%d}")
+    elif start is not None:
+        ranges["labels"].append(f"since {start:%Y-%m-%d}")
+    elif end is not None:
+        ranges["labels"].append(f"before {end:%Y-%m-%d}")
+
+    spans = [m.groups() for m in _QUERY_MONTH_RANGE.finditer(text)]
+    text = _QUERY_MONTH_RANGE.sub(" ", text)
+    months = [(m.group(1), m.group(2)) for m in _QUERY_MONTH.finditer(text)]
+    text = _QUERY_MONTH.sub(" ", text)
+    years = [int(y) for y in _QUERY_YEAR.findall(text)]
+    text = _QUERY_YEAR.sub(" ", text)
+    # "september and october 2025": a lone year applies to every month mentioned
+    named = {int(y) for y in [y for _, y in months] + [y for span in spans for y in span[1::2]] if y} | set(years)
+    sole = next(iter(named)) if len(named) == 1 else None
+    for first, first_year, last, last_year in spans:
+        first, last = _month_number(first), _month_number(last)
+        first_year = int(first_year or last_year or 0) or sole
+        last_year = int(last_year or 0) or first_year
+        if first_year:
+            keys = range(first_year * 12 + first - 1, last_year * 12 + last)
+            ranges["months"] += [(key % 12 + 1, key // 12) for key in keys][:1200]
+            ranges["empty"] |= not keys
+            ranges["labels"].append(f"from {_MONTH_NAMES[first - 1].capitalize()} {first_year} "
+                                    f"to {_MONTH_NAMES[last - 1].capitalize()} {last_year}")
+        else:
+            ranges["months"] += [((first - 1 + i) % 12 + 1, None) for i in range((last - first) % 12 + 1)]
+            ranges["labels"].append(f"from {_MONTH_NAMES[first - 1].capitalize()} to {_MONTH_NAMES[last - 1].capitalize()}")
+    if months:
+        months = [(_month_number(name), int(year) if year else sole) for name, year in months]
+        ranges["months"] += months
+        ranges["labels"].append("in " + ", ".join(
+            f"{_MONTH_NAMES[month - 1].capitalize()}{f' {year}' if year else ''}" for month, year in months))
+    if not ranges["months"] and years:
+        ranges["years"] = years
+        ranges["labels"].append("in " + ", ".join(str(year) for year in years))
+
+    for bound, value, thousands in _QUERY_AMOUNT.findall(text):
+        value = float(value.replace(",", "")) * (1000 if thousands else 1)
+        ranges["amounts"].append((bound, value))
+        ranges["labels"].append(f"{bound} Rs {value:g}")
+    text = _QUERY_AMOUNT.sub(" ", text)
+    return ranges, text
+
+def _range_mask(index: dict, ranges: dict):
+    """Mask of the rows inside every range of _parse_ranges, or None when there are none."""
+    keep = None
+
+    def restrict(mask):
+        nonlocal keep
+        keep = mask if keep is None else keep & mask
+
+    if ranges["empty"]:
+        restrict(np.zeros(len(index["month"]), dtype=bool))
+    if ranges["months"]:
+        mask = np.zeros(len(index["month"]), dtype=bool)
+        for month, year in ranges["months"]:
+            hit = index["month"] == month
+            if year:
+                hit &= index["year"] == year
+            mask |= hit
+        restrict(mask)
+    elif ranges["years"]:
+        restrict(np.isin(index["year"], ranges["years"]))
+    if ranges["start"] is not None or ranges["end"] is not None:
+        mask = index["month"] > 0  # dated rows only
+        if ranges["start"] is not None:
+            mask &= index["recency"] >= ranges["start"].value
+        if ranges["end"] is not None:
+            mask &= index["recency"] < ranges["end"].value
+        restrict(mask)
+    for bound, value in ranges["amounts"]:
+        amounts = index["amount"]
+        if amounts is None:
+            restrict(np.zeros(len(index["month"]), dtype=bool))
+        elif bound in ("over", "above", "more than", "greater than"):
+            restrict(amounts > value)
+        elif bound == "at least":
+            restrict(amounts >= value)
+        elif bound == "at most" or bound == "up to":
+            restrict(amounts <= value)
+        else:
+            restrict(amounts < value)
+    return keep
+
+def _retrieve_rows(entry: dict, query: str, k: int) -> np.ndarray:
+    """Positions (in dataset order) of the k transactions most relevant to query.
+
+    Rows outside the ranges the query mentions are dropped and the rest ranked by BM25 of
+    its remaining words, ties (such as every payment to one merchant) going to the most
+    recent. Without any matching word, the most recent rows in range are returned.
+    """
+    index = _retrieval_index(entry)
+    ranges, text = _parse_ranges(query)
+    keep = _range_mask(index, ranges)
+    words = [word for word in _retrieval_words(text) if word not in _RETRIEVAL_STOPWORDS]
+    n = len(index["length"])
+    scores = np.zeros(n)
+    norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * index["length"] / max(index["length"].mean(), 1.0))
+    for word in set(words):
+        counts = np.zeros(n)
+        for codes, postings, values in index["fields"].values():
+            if word in postings:
+                value_codes, value_counts = postings[word]
+                dense = np.zeros(len(values) + 1)
+                dense[value_codes] = value_counts
+                counts += dense[codes]
+        matches = np.count_nonzero(counts)
+        if matches:
+            idf = np.log(1 + (n - matches + 0.5) / (matches + 0.5))
+            scores += idf * counts * (_BM25_K1 + 1) / (counts + norm)
+    if keep is not None:
+        scores[~keep] = 0
+    rows = np.flatnonzero(scores > 0)
+    recency = index["recency"]
+    if len(rows) == 0:
+        rows = np.flatnonzero(keep) if keep is not None else np.arange(n)
+        rows = rows[np.argsort(recency[rows], kind="stable")[max(len(rows) - k, 0):]]
+    elif len(rows) > k:
+        row_scores = scores[rows]
+        kth = np.partition(row_scores, len(rows) - k)[len(rows) - k]
+        above, tied = rows[row_scores > kth], rows[row_scores == kth]
+        tied = tied[np.argsort(recency[tied], kind="stable")[len(tied) - (k - len(above)):]]
+        rows = np.concatenate([above, tied])
+    return np.sort(rows)
+
+def _overview_for_llm(aggregates: dict) -> str:
+    """Totals and spending per month of the whole dataset, for prompts that see only some rows."""
+    if not aggregates or not aggregates["rows"] or "total" not in aggregates:
+        return ""
+    total = aggregates["total"]
+    lines = [f"All {aggregates['rows']} transactions: net Rs {total['sum']:.0f}, "
+             f"total spent Rs {total['abs_sum']:.0f}"]
+    if ("Month",) in aggregates["by"]:
+        monthly = aggregates["by"][("Month",)]["sum"]
+        lines.append("Net spending by month: " + ", ".join(
+            f"{_month_label(month)}: Rs {value:.0f}" for month, value in monthly.items()))
+    return "\n".join(lines)
+
+def _retrieved_context(entry: dict, query: str):
+    """(text, note, summary): the CHAT_CONTEXT_ROWS transactions most relevant to query, a
+    note saying how many of the dataset they are, and the dataset-wide summaries."""
+    rows = _retrieve_rows(entry, query, CHAT_CONTEXT_ROWS)
+    df = entry["df"]
+    text = _render_context_text(df.take(rows)) if len(rows) else ""
+    note = f" [the {len(rows)} most relevant of {len(df)} transactions]" if len(rows) < len(df) else ""
+    summary = "\n".join(part for part in (_overview_for_llm(entry["aggregates"]),
+                                          _summaries_for_llm(entry["aggregates"])) if part)
+    print(f"Retrieved {len(rows)} of {len(df)} transactions ({len(text)} chars)")
+    return text, note, summary
+
+# Questions /chat answers without the LLM (hybrid mode): one aggregate of the amounts of the
+# transactions matching category, merchant, month, year, date and amount filters
+_QUERY_AGGREGATES = [
+    ("max", re.compile(r"\b(?:highest|largest|biggest|max|maximum|most expensive)\b")),
+    ("min", re.compile(r"\b(?:lowest|smallest|min|minimum|cheapest)\b")),
+    ("count", re.compile(r"\b(?:how many|count|number of)\b")),
+    ("mean", re.compile(r"\b(?:average|avg|mean)\b")),
+    ("sum", re.compile(r"\b(?:total|sum|how much)\b")),
+]
+_QUERY_FILLER = _RETRIEVAL_STOPWORDS | {
+    "amount", "bought", "category", "ever", "expense", "expenses", "expenditure", "has", "had",
+    "made", "merchant", "money", "overall", "paid", "pay", "payment", "payments", "purchase",
+    "purchases", "rs", "inr", "rupees", "so", "far", "there", "times", "transaction",
+    "transactions", "value", "via", "using", "during",
+}
+# Words the plan cannot express (relative dates, rankings, comparisons): left to the LLM
+_QUERY_UNSUPPORTED = {
+    "ago", "compare", "daily", "each", "last", "least", "less", "monthly", "more", "most", "next",
+    "per", "previous", "recent", "recently", "save", "saving", "savings", "today", "top", "week",
+    "weekly", "which", "who", "why", "where", "yesterday", "vs", "versus",
+}
+
+def _query_plan(entry: dict, question: str):
+    """Compile a question into {"aggregate", "categories", "merchants", "merchant", "ranges"},
+    or None when the LLM should answer it.
+
+    The aggregate comes from its wording (sum without one, if it names a category or range).
+    Categories match by full name or by a word of only one category name. The other words,
+    in groups split by "and"/"or", name merchants: those whose description contains every
+    word of a group. Any unsupported or unknown word, or a group no merchant matches, gives
+    None.
+    """
+    df = entry["df"]
+    if "Amount" not in df.columns:
+        return None
+    ranges, text = _parse_ranges(question)
+    aggregate = None
+    for name, pattern in _QUERY_AGGREGATES:
+        if pattern.search(text):
+            aggregate = name
+            text = pattern.sub(" ", text)
+            break
+    padded = f" {' '.join(_retrieval_words(text))} "
+    if any(word in _QUERY_UNSUPPORTED for word in padded.split()):
+        return None
+    index = _retrieval_index(entry)
+    categories = []
+    if "Category" in index["fields"]:
+        labels = index["fields"]["Category"][2]
+        for label in sorted(labels, key=lambda label: len(str(label)), reverse=True):
+            name = " ".join(_retrieval_words(str(label)))
+            if name and f" {name} " in padded:
+                categories.append(label)
+                padded = padded.replace(f" {name} ", " ")
+    # "swiggy and zomato": each group of words between "and"/"or" names merchants
+    groups = [[]]
+    for word in padded.split():
+        if word in ("and", "or"):
+            groups.append([])
+        elif word not in _QUERY_FILLER:
+            groups[-1].append(word)
+    if "Category" in index["fields"]:
+        # "food" for "Food & Dining": a word of exactly one category name selects it
+        _, postings, labels = index["fields"]["Category"]
+        for words in groups:
+            for word in [word for word in words if word in postings and len(postings[word][0]) == 1]:
+                label = labels[postings[word][0][0]]
+                if label not in categories:
+                    categories.append(label)
+                words.remove(word)
+    groups = [words for words in groups if words]
+    merchants = ()
+    if groups:
+        field = index["fields"].get("Description")
+        if field is None or any(word not in field[1] for words in groups for word in words):
+            return None
+        matched = []
+        for words in groups:
+            codes = field[1][words[0]][0]
+            for word in words[1:]:
+                codes = np.intersect1d(codes, field[1][word][0])
+            if not len(codes):
+                return None
+            matched.append(codes)
+        merchants = tuple(field[2][np.unique(np.concatenate(matched))])
+    if aggregate is None:
+        if not categories and not ranges["labels"]:
+            return None
+        aggregate = "sum"
+    return {"aggregate": aggregate, "categories": tuple(categories), "merchants": merchants,
+            "merchant": " and ".join(" ".join(words) for words in groups) or None, "ranges": ranges}
+
+def _answer_query_plan(entry: dict, plan: dict) -> dict:
+    """/chat response for a compiled question, computed from the filter and retrieval indexes."""
+    df = entry["df"]
+    amounts = df["Amount"].to_numpy(dtype=float)
+    rows = None
+    if plan["merchant"] and not plan["merchants"]:
+        rows = np.empty(0, dtype=np.intp)
+    elif plan["categories"] or plan["merchants"]:
+        rows = _filtered_rows(entry, (None, None, plan["categories"], plan["merchants"]))
+    keep = _range_mask(_retrieval_index(entry), plan["ranges"])
+    if keep is not None:
+        rows = np.flatnonzero(keep) if rows is None else rows[keep[rows]]
+    if rows is not None:
+        amounts = amounts[rows]
+    valid = ~np.isnan(amounts)
+    count = int(valid.sum())
+
+    parts = []
+    if plan["categories"]:
+        parts.append("on " + " and ".join(str(category) for category in plan["categories"]))
+    if plan["merchant"]:
+        parts.append(f"at {plan['merchant']}")
+    scope = " ".join(parts + plan["ranges"]["labels"])
+    scope = f" {scope}" if scope else ""
+
+    aggregate = plan["aggregate"]
+    meta = {"rule": "query", "aggregate": aggregate, "categories": [str(c) for c in plan["categories"]],
+            "merchant": plan["merchant"], "filters": plan["ranges"]["labels"], "rows": count}
+    if aggregate == "sum":
+        if rows is None:
+            response = f"Your total spending is {entry['aggregates']['total']['sum']:.2f}."
+        else:
+            response = f"You spent {amounts[valid].sum():.2f}{scope}."
+    elif aggregate == "count":
+        response = f"You have {count} transaction{'' if count == 1 else 's'}{scope}."
+    elif count == 0:
+        response = f"There are no transactions{scope}."
+    elif aggregate == "mean":
+        response = f"Your average transaction{scope} is {amounts[valid].mean():.2f}."
+    else:
+        # Within a scope, expenses (negative) and credits rank by size, not sign
+        ranked = amounts if rows is None else np.abs(amounts)
+        pick = np.nanargmax(ranked) if aggregate == "max" else np.nanargmin(ranked)
+        row = df.iloc[rows[pick] if rows is not None else pick]
+        response = (f"{'Highest' if aggregate == 'max' else 'Lowest'} transaction{scope} is {row['Amount']:.2f} "
+                    f"on {row.get('Date', '')} for {row.get('Category', '')}: {row.get('Description', '')}")
+    return {"response": response, "meta": meta}
+
+def _cached_response(entry: dict, view: dict, name: str, build):
+    """JSON response `name` for a view of a session entry (the entry itself or one of its
+    filtered views), built once per dataset version.
+
+    The serialized payload is cached on the view, so repeat views only look it up; each
+    view keeps its _PAYLOADS_MAX most recent ones, charged to the entry. Its strong ETag
+    is a hash of those bytes (they also depend on the upload profile, not just df), and
+    clients revalidating with If-None-Match get a 304 when it still matches.
+    """
+    cached = view["payloads"].get(name)
+    if cached is None:
+        body = jsonify(build(view)).get_data()
+        cached = (body, hashlib.sha1(body).hexdigest()[:16])
+        with _SESSION_LOCK:
+            payloads = view["payloads"]
+            if name not in payloads:
+                dropped = 0
+                while len(payloads) >= _PAYLOADS_MAX:
+                    oldest = next(iter(payloads))
+                    dropped += _nbytes({oldest: payloads.pop(oldest)})
+                payloads[name] = cached
+                grown = _nbytes({name: cached}) - dropped
+                if view is not entry:
+                    view["bytes"] += grown
+                # A view dropped meanwhile no longer counts towards the entry
+                if view is entry or any(kept is view for kept in entry.get("views", {}).values()):
+                    _grow_session(entry, grown)
+            cached = payloads[name]
+    body, etag = cached
+    response = app.response_class(body, mimetype=app.json.mimetype)
+    response.set_etag(etag)
+    # Browsers revalidate every time; the payload differs per X-Session-Id
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "X-Session-Id"
+    return response.make_conditional(request)
+
+def _dashboard_payload(entry: dict) -> dict:
+    """/dashboard response for a session entry."""
+    aggregates = entry["aggregates"]
+    columns = aggregates["columns"]
+    print(f"Dataset rows: {aggregates['rows']}, columns: {columns}")
     
     # Calculate dashboard statistics
     dashboard_data = {
-        "totalSpending": float(abs(df["Amount"].sum())) if "Amount" in df.columns else 0,
-        "totalTransactions": len(df),
-        "totalCategories": df["Category"].nunique() if "Category" in df.columns else 0,
-        "avgTransaction": float(abs(df["Amount"].mean())) if "Amount" in df.columns else 0,
+        "totalSpending": float(abs(aggregates["total"]["sum"])) if "Amount" in columns else 0,
+        "totalTransactions": aggregates["rows"],
+        "totalCategories": aggregates["category_count"],
+        "avgTransaction": float(abs(aggregates["total"]["mean"])) if "Amount" in columns else 0,
     }
     
     # Category breakdown
-    if "Category" in df.columns and "Amount" in df.columns:
-        category_totals = df.groupby("Category")["Amount"].sum().sort_values(ascending=False)
+    if ("Category",) in aggregates["by"]:
+        category_totals = aggregates["by"][("Category",)]["sum"].sort_values(ascending=False)
         dashboard_data["categories"] = [
             {"category": cat, "total": float(total)} 
             for cat, total in category_totals.head(10).items()
         ]
     
     # Monthly spending (if Date column exists)
-    if "Date" in df.columns and "Amount" in df.columns:
-        df["Month"] = df["Date"].dt.strftime("%Y-%m")
-        monthly_totals = df.groupby("Month")["Amount"].sum().sort_index()
+    if ("Month",) in aggregates["by"]:
+        monthly_totals = aggregates["by"][("Month",)]["sum"]
         dashboard_data["monthly"] = [
-            {"month": month, "total": float(total)} 
+            {"month": _month_label(month), "total": float(total)} 
             for month, total in monthly_totals.items()
         ]
     
     # Top merchants
-    if "Description" in df.columns and "Amount" in df.columns:
-        merchant_totals = df.groupby("Description")["Amount"].sum().sort_values(ascending=False)
+    if ("Description",) in aggregates["by"]:
+        merchant_totals = aggregates["by"][("Description",)]["sum"].sort_values(ascending=False)
         dashboard_data["topMerchants"] = [
             {"merchant": merchant, "total": float(total)} 
             for merchant, total in merchant_totals.head(8).items()
         ]
     
-    return jsonify(dashboard_data)
-
-@app.route("/chat", methods=["POST"])
-def chat():
-    global csv_text, transactions_df
-    if not csv_text or transactions_df is None:
-        return jsonify({"response": "Please upload a CSV first."})
-
-    user_query = (request.json or {}).get("query", "")
-    # Ensure normalized and typed
-    df = transactions_df.copy()
-
-    q = user_query.lower()
+    return dashboard_data
 
-    # If AI-only mode, always call Gemini with the CSV context
-    if ANSWER_MODE == "ai-only":
-        if not GEMINI_API_KEY:
-            return jsonify({
-                "response": (
-                    "AI is not configured yet. Add GEMINI_API_KEY in backend/.env to enable AI answers.\n"
-                    "Meanwhile, try: 'What is my total spending?', 'How much on Food?', 'Show my highest transaction', or 'How much in September 2025?'."
-                ),
-                "needs_key": True,
-                "meta": {"mode": "ai-only", "rule": "no-llm"},
-            })
-
-        # Optionally trim context to avoid overlong prompts
-        context_text = csv_text
-        truncated = False
-        if len(context_text) > CSV_CONTEXT_MAX_CHARS:
-            context_text = context_text[-CSV_CONTEXT_MAX_CHARS:]
-            truncated = True
-
-        helper = _summaries_for_llm(df) if _savings_intent(user_query) else ""
-        helper_text = f"Helper summaries:\n{helper}" if helper else ""
+@app.route("/dashboard", methods=["GET", "POST"])
+def dashboard():
+    sid = _session_id()
+    job = _pending_job(sid)
+    if job is not None:
+        return jsonify({"processing": True, "message": _processing_message(job), "job": job}), 202
+    entry = _get_session(sid)
+    print(f"Dashboard called. Session has data: {entry is not None}")
+    if entry is None:
+        print("No transactions_df found")
+        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
+    
+    if entry["df"].empty:
+        print("transactions_df is empty")
+        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
+    
+    # Optional from/to/category/merchant filters select a view of the dataset
+    try:
+        filters = _request_filters()
+        view = _filtered_view(entry, filters) if filters is not None else entry
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if view is None:
+        return jsonify({"error": "No transactions match the selected filters."}), 400
+    
+    return _cached_response(entry, view, "dashboard", _dashboard_payload)
+
+def _recurring_payload(entry: dict) -> dict:
+    """/recurring response for a session entry."""
+    payments = []
+    for merchant, row in _aggregate(entry, "recurring").iterrows():
+        payments.append({
+            "merchant": str(merchant),
+            "period": row["period"],
+            "amount": float(row["amount"]),
+            "count": int(row["count"]),
+            "intervalDays": round(float(row["interval_days"]), 1),
+            "regularity": round(float(row["regularity"]), 2),
+            "lastDate": str(row["last_date"].date()),
+            "nextExpected": str(row["next_date"].date()),
+            "annualCost": float(row["annual_cost"]),
+        })
+    return {"recurring": payments, "annualTotal": sum(payment["annualCost"] for payment in payments)}
+
+@app.route("/recurring", methods=["GET", "POST"])
+def recurring_payments():
+    """Subscriptions and other recurring payments (see _recurring_payments)."""
+    sid = _session_id()
+    job = _pending_job(sid)
+    if job is not None:
+        return jsonify({"processing": True, "message": _processing_message(job), "job": job}), 202
+    entry = _get_session(sid)
+    
+    if entry is None or entry["df"].empty:
+        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
+    
+    # Optional from/to/category/merchant filters select a view of the dataset
+    try:
+        filters = _request_filters()
+        view = _filtered_view(entry, filters) if filters is not None else entry
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if view is None:
+        return jsonify({"error": "No transactions match the selected filters."}), 400
+    
+    return _cached_response(entry, view, "recurring", _recurring_payload)
+
+def _ai_only_prompt(entry: dict, user_query: str) -> str:
+    """Gemini prompt for a question in ai-only mode: instructions, transactions and summaries."""
+    if CHAT_CONTEXT_MODE == "full":
+        # Trim context to avoid overlong prompts
+        context_text, truncated = _chat_context(entry, CSV_CONTEXT_MAX_CHARS)
+        helper = _summaries_for_llm(entry["aggregates"]) if _savings_intent(user_query) else ""
         truncation_note = " [TRUNCATED]" if truncated else ""
-        
-        prompt = f"""
+    else:
+        context_text, truncation_note, helper = _retrieved_context(entry, user_query)
+    helper_text = f"Helper summaries:\n{helper}" if helper else ""
+    
+    prompt = f"""
 You are a personal finance chat agent. Always reply in 2-3 short, plain sentences, spaced like a real chat. Never use Markdown, never use bullet points, never use headings, never use lists, never use bold or italics. Do not summarize categories or give long explanations.
 
 IMPORTANT: All amounts are in Indian Rupees (INR). Always mention amounts with "Rs" or "₹" symbol, never use dollars ($).
@@ -724,115 +2946,66 @@ Question:
 {user_query}
 """
 
+    # Add a system message to enforce style
+    system_prompt = (
+        "You are a helpful, concise personal finance chat agent. Reply in 2-3 short, plain sentences, spaced like a real chat. Never use Markdown, never use bullet points, never use headings, never use lists, never use bold or italics. No long answers. IMPORTANT: All amounts are in Indian Rupees (INR) - always use Rs or ₹ symbol, never dollars ($)."
+    )
+    return system_prompt + "\n\n" + prompt
+
+def _ai_only_fallback(entry: dict, user_query: str, error: Exception):
+    """(answer, meta) when the LLM fails in ai-only mode."""
+    # Fallback to local suggestions for savings intent
+    if _savings_intent(user_query):
+        return _local_savings_suggestions(entry), {"error": True, "fallback": "local-savings"}
+    return f"LLM error: {error}.", {"error": True}
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    sid = _session_id()
+    job = _pending_job(sid)
+    if job is not None:
+        return jsonify({"response": _processing_message(job), "processing": True, "meta": {"rule": "processing", "job_id": job["job_id"]}})
+    entry = _get_session(sid)
+    if entry is None or entry["df"].empty:
+        return jsonify({"response": "Please upload a CSV first."})
+
+    user_query = (request.json or {}).get("query", "")
+
+    # If AI-only mode, always call Gemini with the CSV context
+    if ANSWER_MODE == "ai-only":
+        if not GEMINI_API_KEY:
+            return jsonify({
+                "response": (
+                    "AI is not configured yet. Add GEMINI_API_KEY in backend/.env to enable AI answers.\n"
+                    "Meanwhile, try: 'What is my total spending?', 'How much on Food?', 'Show my highest transaction', or 'How much in September 2025?'."
+                ),
+                "needs_key": True,
+                "meta": {"mode": "ai-only", "rule": "no-llm"},
+            })
+
+        # Repeated questions about the same data are answered from the cache
+        cache_key = _answer_cache_key(entry, user_query)
+        cached = _cached_answer(cache_key)
+        if cached is not None:
+            answer, meta = cached
+            return jsonify({"response": answer, "meta": {"mode": "ai-only", "rule": "llm", **meta, "cached": True}})
+
+        full_prompt = _ai_only_prompt(entry, user_query)
         try:
-            # Add a system message to enforce style
-            system_prompt = (
-                "You are a helpful, concise personal finance chat agent. Reply in 2-3 short, plain sentences, spaced like a real chat. Never use Markdown, never use bullet points, never use headings, never use lists, never use bold or italics. No long answers. IMPORTANT: All amounts are in Indian Rupees (INR) - always use Rs or ₹ symbol, never dollars ($)."
-            )
-            full_prompt = system_prompt + "\n\n" + prompt
             answer, meta = _llm_chat(full_prompt)
             # Post-process: remove Markdown, lists, and enforce chat-style spacing
-            import re
-            def clean_answer(text):
-                # Remove Markdown bold/italic, bullets, and numbers
-                text = re.sub(r"\*\*([^*]+)\*\*", r"\1", text)
-                text = re.sub(r"\*([^*]+)\*", r"\1", text)
-                text = re.sub(r"^\s*[-*]\s+", "", text, flags=re.MULTILINE)
-                text = re.sub(r"^\s*\d+\.\s+", "", text, flags=re.MULTILINE)
-                # Remove extra newlines, keep max 2 in a row
-                text = re.sub(r"\n{3,}", "\n\n", text)
-                # Add a space after every sentence for chat feel
-                text = re.sub(r"([.!?])([^ \n])", r"\1 \2", text)
-                # Remove leading/trailing whitespace
-                return text.strip()
-            answer = clean_answer(answer)
+            answer = _clean_answer(answer)
+            _cache_answer(cache_key, answer, meta)
         except Exception as e:
-            # Fallback to local suggestions for savings intent
-            if _savings_intent(user_query):
-                answer = _local_savings_suggestions(df)
-                meta = {"error": True, "fallback": "local-savings"}
-            else:
-                answer = f"LLM error: {e}."
-                meta = {"error": True}
+            answer, meta = _ai_only_fallback(entry, user_query, e)
 
         return jsonify({"response": answer, "meta": {"mode": "ai-only", "rule": "llm", **meta}})
 
-    # HYBRID mode below: rule-based shortcuts first, then LLM
-    # 1) Total spending
-    if "total" in q and "Amount" in df.columns:
-        total = df["Amount"].dropna().sum()
-        return jsonify({"response": f"Your total spending is {total:.2f}.", "meta": {"rule": "total"}})
-
-    # 2) Highest / Lowest transaction
-    if "highest" in q or "largest" in q or "max" in q:
-        if "Amount" in df.columns and not df["Amount"].dropna().empty:
-            idx = df["Amount"].idxmax()
-            row = df.loc[idx]
-            return jsonify({"response": f"Highest transaction is {row['Amount']:.2f} on {row.get('Date', '')} for {row.get('Category', '')}: {row.get('Description', '')}", "meta": {"rule": "highest"}})
-    if "lowest" in q or "smallest" in q or "min" in q:
-        if "Amount" in df.columns and not df["Amount"].dropna().empty:
-            idx = df["Amount"].idxmin()
-            row = df.loc[idx]
-            return jsonify({"response": f"Lowest transaction is {row['Amount']:.2f} on {row.get('Date', '')} for {row.get('Category', '')}: {row.get('Description', '')}", "meta": {"rule": "lowest"}})
-
-    # 3) Spending by category, e.g., "on Food" or "category Food"
-    import re
-    cat_match = re.search(r"(?:on|category)\s+([\w &-]+)", q)
-    if cat_match and "Category" in df.columns and "Amount" in df.columns:
-        cat = cat_match.group(1).strip().lower()
-        mask = df["Category"].str.lower() == cat
-        amount = df.loc[mask, "Amount"].dropna().sum()
-    return jsonify({"response": f"You spent {amount:.2f} on {cat}.", "meta": {"rule": "category", "category": cat}})
-
-    # 4) Monthly spending: detect month name and optional year
-    months = ["january","february","march","april","may","june","july","august","september","october","november","december"]
-    month_idx = next((i+1 for i,m in enumerate(months) if m in q), None)
-    year_match = re.search(r"(20\d{2})", q)
-    if month_idx and "Date" in df.columns and "Amount" in df.columns:
-        mask = df["Date"].dt.month == month_idx
-        year = None
-        if year_match:
-            year = int(year_match.group(1))
-            mask = mask & (df["Date"].dt.year == year)
-        amount = df.loc[mask, "Amount"].dropna().sum()
-        month_name = months[month_idx-1].capitalize()
-        suffix = f" {year}" if year else ""
-    return jsonify({"response": f"You spent {amount:.2f} in {month_name}{suffix}.", "meta": {"rule": "month", "month": month_name, "year": year}})
-
-    # 5) Category in a given month (e.g., "Food in September 2025")
-    if "Category" in df.columns and "Amount" in df.columns and "Date" in df.columns:
-        cat_match2 = re.search(r"(?:on|category)\s+([\w &-]+)", q)
-        if cat_match2 or any(m in q for m in months):
-            cat = cat_match2.group(1).strip().lower() if cat_match2 else None
-            m_idx = next((i+1 for i,m in enumerate(months) if m in q), None)
-            yr_match = re.search(r"(20\d{2})", q)
-            mask = df["Amount"].notna()
-            if cat:
-                mask = mask & (df["Category"].str.lower() == cat)
-            if m_idx:
-                mask = mask & (df["Date"].dt.month == m_idx)
-            if yr_match:
-                mask = mask & (df["Date"].dt.year == int(yr_match.group(1)))
-            amount = df.loc[mask, "Amount"].dropna().sum()
-            parts = []
-            if cat:
-                parts.append(f"on {cat}")
-            if m_idx:
-                parts.append(months[m_idx-1].capitalize())
-            if yr_match:
-                parts.append(yr_match.group(1))
-            scope = " in " + " ".join(parts) if parts else ""
-            return jsonify({"response": f"You spent {amount:.2f}{scope}.", "meta": {"rule": "category+month", "category": cat, "month": months[m_idx-1].capitalize() if m_idx else None, "year": yr_match.group(1) if yr_match else None}})
-
-    prompt = f"""
-You are an AI personal finance assistant.
-Here is the user's bank data (one per line):
-
-{csv_text}
-
-Answer the following question based on this data:
-{user_query}
-"""
+    # HYBRID mode below: totals, counts, averages and extremes are computed locally
+    # (see _query_plan); other questions go to the LLM
+    plan = _query_plan(entry, user_query)
+    if plan is not None:
+        return jsonify(_answer_query_plan(entry, plan))
 
     if not GEMINI_API_KEY:
         # Friendly 200 response so the frontend can show it in chat without error handling
@@ -845,8 +3018,31 @@ Answer the following question based on this data:
             "meta": {"rule": "no-llm"},
         })
 
+    cache_key = _answer_cache_key(entry, user_query)
+    cached = _cached_answer(cache_key)
+    if cached is not None:
+        answer, meta = cached
+        return jsonify({"response": answer, "meta": {"mode": "hybrid", "rule": "llm", **meta, "cached": True}})
+
+    if CHAT_CONTEXT_MODE == "full":
+        context_text, summary = _chat_context(entry)[0], ""
+    else:
+        context_text, _, summary = _retrieved_context(entry, user_query)
+        summary = f"Summary of all transactions:\n{summary}\n" if summary else ""
+    prompt = f"""
+You are an AI personal finance assistant.
+Here is the user's bank data (one per line):
+
+{context_text}
+{summary}
+
+Answer the following question based on this data:
+{user_query}
+"""
+
     try:
         answer, meta = _llm_chat(prompt)
+        _cache_answer(cache_key, answer, meta)
     except Exception as e:
         answer = f"LLM error: {e}. Try asking for 'total' to use a local calculation."
         meta = {"error": True}
@@ -854,65 +3050,80 @@ Answer the following question based on this data:
     return jsonify({"response": answer, "meta": {"mode": "hybrid", "rule": "llm", **meta}})
 
 
-@app.route("/advanced-analytics", methods=["POST"])
-def advanced_analytics():
-    """Advanced data science analytics endpoint with statistical analysis."""
-    global transactions_df
-    
-    if transactions_df is None or transactions_df.empty:
-        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
-    
-    df = transactions_df.copy()
-    
-    # Initialize analytics data
-    analytics_data = {}
-    
-    # 1. Statistical Summary
-    if "Amount" in df.columns:
-        amounts = df["Amount"].abs()  # Use absolute values for stats
-        analytics_data["statistics"] = {
-            "mean": float(amounts.mean()),
-            "median": float(amounts.median()),
-            "std": float(amounts.std()),
-            "min": float(amounts.min()),
-            "max": float(amounts.max()),
-            "count": int(amounts.count()),
-            "q25": float(amounts.quantile(0.25)),
-            "q75": float(amounts.quantile(0.75))
-        }
-    
-    # 2. Outlier Detection using IQR method
-    outliers = []
-    if "Amount" in df.columns:
-        amounts = df["Amount"].abs()
-        Q1 = amounts.quantile(0.25)
-        Q3 = amounts.quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-        
-        outlier_mask = (amounts < lower_bound) | (amounts > upper_bound)
-        outlier_df = df[outlier_mask].copy()
-        
-        for _, row in outlier_df.head(10).iterrows():
-            outliers.append({
-                "amount": float(row.get("Amount", 0)),
-                "description": str(row.get("Description", "Unknown")),
-                "category": str(row.get("Category", "Unknown")),
-                "date": str(row.get("Date", "Unknown"))
-            })
-    
-    analytics_data["outliers"] = outliers
-    
-    # 3. Category Trends - Average and Median by Category
+def _sse_event(payload: dict) -> str:
+    """One Server-Sent Events message carrying payload as JSON."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """/chat as Server-Sent Events: {"delta": text} messages with the cleaned answer as
+    Gemini writes it, then {"done": true, "response": ..., "meta": ...} like /chat returns.
+
+    Only ai-only answers that need an LLM call are streamed; every other reply (processing,
+    no data or key, cached answers, hybrid mode) is /chat's, sent as a single delta.
+    """
+    sid = _session_id()
+    entry = _get_session(sid)
+    user_query = (request.json or {}).get("query", "")
+    cache_key = _answer_cache_key(entry, user_query) if entry is not None else None
+    if (ANSWER_MODE != "ai-only" or not GEMINI_API_KEY or _pending_job(sid) is not None
+            or entry is None or entry["df"].empty or _cached_answer(cache_key) is not None):
+        payload = chat().get_json()
+        events = [_sse_event({"delta": payload["response"]}), _sse_event({"done": True, **payload})]
+        return app.response_class(events, mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    full_prompt = _ai_only_prompt(entry, user_query)
+
+    def generate():
+        raw, sent, meta = [], False, {}
+
+        def chunks():
+            for text in _llm_stream(full_prompt, meta):
+                raw.append(text)
+                yield text
+
+        try:
+            for piece in _clean_answer_stream(chunks()):
+                sent = True
+                yield _sse_event({"delta": piece})
+            answer = _clean_answer("".join(raw))
+            _cache_answer(cache_key, answer, meta)
+        except Exception as e:
+            if sent:
+                # Part of the answer is already on screen: end it there
+                answer, meta = _clean_answer("".join(raw)), {**meta, "error": True}
+            else:
+                answer, meta = _ai_only_fallback(entry, user_query, e)
+                yield _sse_event({"delta": answer})
+        yield _sse_event({"done": True, "response": answer, "meta": {"mode": "ai-only", "rule": "llm", **meta}})
+
+    # No buffering by proxies, so each delta reaches the browser as it is generated
+    return app.response_class(stream_with_context(generate()), mimetype="text/event-stream",
+                              headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# /advanced-analytics is assembled from these sections, each built by a function of
+# (entry, analytics_data) from the aggregates and the sections computed before it
+def _analytics_statistics(entry: dict, analytics_data: dict):
+    """1. Statistical Summary (absolute amounts); omitted without an Amount column."""
+    return _aggregate(entry, "statistics")
+
+def _analytics_outliers(entry: dict, analytics_data: dict):
+    """2. Outlier Detection using IQR method."""
+    return _aggregate(entry, "outliers")
+
+def _analytics_category_trends(entry: dict, analytics_data: dict):
+    """3. Category Trends - Average and Median by Category."""
+    aggregates = entry["aggregates"]
     category_trends = []
-    if "Category" in df.columns and "Amount" in df.columns:
-        cat_stats = df.groupby("Category")["Amount"].agg([
-            ('avg', lambda x: abs(x).mean()),
-            ('median', lambda x: abs(x).median()),
-            ('total', lambda x: abs(x).sum()),
-            ('count', 'count')
-        ]).sort_values('total', ascending=False)
+    if ("Category",) in aggregates["by"]:
+        cat_stats = aggregates["by"][("Category",)]
+        cat_stats = pd.DataFrame({
+            "avg": cat_stats["abs_sum"] / cat_stats["count"],
+            "median": _aggregate(entry, "category_abs_medians"),
+            "total": cat_stats["abs_sum"],
+            "count": cat_stats["count"],
+        }).sort_values('total', ascending=False)
         
         for cat, row in cat_stats.head(8).iterrows():
             category_trends.append({
@@ -922,48 +3133,40 @@ def advanced_analytics():
                 "total": float(row['total']),
                 "count": int(row['count'])
             })
-    
-    analytics_data["categoryTrends"] = category_trends
-    
-    # 4. Spending by Day of Week
+    return category_trends
+
+def _analytics_weekday_spending(entry: dict, analytics_data: dict):
+    """4. Spending by Day of Week."""
+    aggregates = entry["aggregates"]
     weekday_spending = [0] * 7
-    if "Date" in df.columns and "Amount" in df.columns:
-        df["DayOfWeek"] = pd.to_datetime(df["Date"]).dt.dayofweek
-        weekday_totals = df.groupby("DayOfWeek")["Amount"].apply(lambda x: abs(x).sum())
+    if ("Weekday",) in aggregates["by"]:
+        weekday_totals = aggregates["by"][("Weekday",)]["abs_sum"]
         for day, total in weekday_totals.items():
             if 0 <= day < 7:
                 weekday_spending[day] = float(total)
-    
-    analytics_data["weekdaySpending"] = weekday_spending
-    
-    # 5. Spending by Hour of Day (if time information is available)
+    return weekday_spending
+
+def _analytics_hourly_spending(entry: dict, analytics_data: dict):
+    """5. Spending by Hour of Day (if time information is available)."""
+    aggregates = entry["aggregates"]
     hourly_spending = [0] * 24
-    if "Date" in df.columns and "Amount" in df.columns:
-        try:
-            df["Hour"] = pd.to_datetime(df["Date"]).dt.hour
-            hourly_totals = df.groupby("Hour")["Amount"].apply(lambda x: abs(x).sum())
-            for hour, total in hourly_totals.items():
-                if 0 <= hour < 24:
-                    hourly_spending[hour] = float(total)
-        except:
-            # If no time information, distribute spending across business hours (9-21)
-            if "Amount" in df.columns:
-                avg_per_hour = abs(df["Amount"]).sum() / 13  # 13 business hours
-                for hour in range(9, 22):
-                    hourly_spending[hour] = float(avg_per_hour)
-    
-    analytics_data["hourlySpending"] = hourly_spending
-    
-    # 6. Frequent Merchants
+    if "hourly" in aggregates:
+        for hour, total in aggregates["hourly"].items():
+            if 0 <= hour < 24:
+                hourly_spending[hour] = float(total)
+    return hourly_spending
+
+def _analytics_frequent_merchants(entry: dict, analytics_data: dict):
+    """6. Frequent Merchants."""
+    aggregates = entry["aggregates"]
     frequent_merchants = []
-    if "Description" in df.columns and "Amount" in df.columns:
-        merchant_stats = df.groupby("Description").agg({
-            "Amount": [('total', lambda x: abs(x).sum()), 
-                       ('avg', lambda x: abs(x).mean()), 
-                       ('count', 'count')]
-        })
-        merchant_stats.columns = ['total', 'avg', 'count']
-        merchant_stats = merchant_stats.sort_values('count', ascending=False)
+    if ("Description",) in aggregates["by"]:
+        merchant_stats = aggregates["by"][("Description",)]
+        merchant_stats = pd.DataFrame({
+            "total": merchant_stats["abs_sum"],
+            "avg": merchant_stats["abs_sum"] / merchant_stats["count"],
+            "count": merchant_stats["count"],
+        }).sort_values('count', ascending=False)
         
         for merchant, row in merchant_stats.head(8).iterrows():
             frequent_merchants.append({
@@ -972,27 +3175,38 @@ def advanced_analytics():
                 "avg": float(row['avg']),
                 "count": int(row['count'])
             })
-    
-    analytics_data["frequentMerchants"] = frequent_merchants
-    
-    # 7. Data Quality Metrics
-    total_records = len(df)
-    missing_values = df.isnull().sum().sum()
-    duplicates = df.duplicated().sum()
-    completeness = ((total_records * len(df.columns) - missing_values) / 
-                    (total_records * len(df.columns)) * 100) if total_records > 0 else 100
-    
-    analytics_data["dataQuality"] = {
+    return frequent_merchants
+
+def _analytics_data_quality(entry: dict, analytics_data: dict):
+    """7. Data Quality Metrics, from the upload profile (raw bank columns are not kept in memory).
+
+    They describe the statements as uploaded, also for filtered views.
+    """
+    columns = entry["aggregates"]["columns"]
+    profile = entry["profile"]
+    total_records = profile["rows"]
+    missing_values = sum(profile["nulls"].values())
+    duplicates = profile["duplicates"]
+    # The derived DayOfWeek and Hour columns count as (complete) columns too
+    column_count = len(profile["columns"]) + (2 if "Date" in columns and "Amount" in columns else 0)
+    completeness = ((total_records * column_count - missing_values) / 
+                    (total_records * column_count) * 100) if total_records > 0 else 100
+    
+    return {
         "total": total_records,
         "missing": int(missing_values),
         "duplicates": int(duplicates),
         "completeness": round(float(completeness), 2)
     }
-    
-    # 8. Generate Insights
+
+def _analytics_insights(entry: dict, analytics_data: dict):
+    """8. Generate Insights."""
+    aggregates = entry["aggregates"]
+    columns = aggregates["columns"]
     insights = []
     
     # Insight 1: Highest spending category
+    category_trends = analytics_data["categoryTrends"]
     if category_trends:
         top_cat = category_trends[0]
         insights.append({
@@ -1002,8 +3216,8 @@ def advanced_analytics():
         })
     
     # Insight 2: Most expensive transaction
-    if "Amount" in df.columns:
-        max_transaction = abs(df["Amount"]).max()
+    if "Amount" in columns:
+        max_transaction = _aggregate(entry, "statistics")["max"]
         insights.append({
             "icon": "💰",
             "title": "Largest Transaction",
@@ -1011,6 +3225,7 @@ def advanced_analytics():
         })
     
     # Insight 3: Spending pattern by day
+    weekday_spending = analytics_data["weekdaySpending"]
     if weekday_spending:
         max_day_idx = weekday_spending.index(max(weekday_spending))
         days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -1021,6 +3236,7 @@ def advanced_analytics():
         })
     
     # Insight 4: Frequent merchant
+    frequent_merchants = analytics_data["frequentMerchants"]
     if frequent_merchants:
         top_merchant = frequent_merchants[0]
         insights.append({
@@ -1030,7 +3246,7 @@ def advanced_analytics():
         })
     
     # Insight 5: Spending consistency
-    if "Amount" in df.columns:
+    if "Amount" in columns:
         cv = (analytics_data["statistics"]["std"] / analytics_data["statistics"]["mean"]) * 100
         consistency = "very consistent" if cv < 50 else "moderately consistent" if cv < 100 else "highly variable"
         insights.append({
@@ -1052,10 +3268,69 @@ def advanced_analytics():
             "title": "Data Quality Warning",
             "text": f"Your data has {analytics_data['dataQuality']['missing']} missing values ({analytics_data['dataQuality']['completeness']:.1f}% complete). Consider data cleanup for better insights."
         })
+    return insights
+
+# Response key -> (sections it reads, builder)
+_ANALYTICS_SECTIONS = {
+    "statistics": ((), _analytics_statistics),
+    "outliers": ((), _analytics_outliers),
+    "categoryTrends": ((), _analytics_category_trends),
+    "weekdaySpending": ((), _analytics_weekday_spending),
+    "hourlySpending": ((), _analytics_hourly_spending),
+    "frequentMerchants": ((), _analytics_frequent_merchants),
+    "dataQuality": ((), _analytics_data_quality),
+    "insights": (("statistics", "categoryTrends", "weekdaySpending", "frequentMerchants", "dataQuality"),
+                 _analytics_insights),
+}
+
+def _analytics_payload(entry: dict, sections=None) -> dict:
+    """/advanced-analytics response for a session entry with the requested sections (all by
+    default). Prerequisites are computed once and shared, but only requested ones are returned."""
+    analytics_data = {}
     
-    analytics_data["insights"] = insights
+    def compute(name):
+        if name not in analytics_data:
+            requires, build = _ANALYTICS_SECTIONS[name]
+            for dependency in requires:
+                compute(dependency)
+            analytics_data[name] = build(entry, analytics_data)
     
-    return jsonify(analytics_data)
+    sections = sections or list(_ANALYTICS_SECTIONS)
+    for name in sections:
+        compute(name)
+    return {name: analytics_data[name] for name in sections if analytics_data[name] is not None}
+
+@app.route("/advanced-analytics", methods=["GET", "POST"])
+def advanced_analytics():
+    """Advanced data science analytics endpoint with statistical analysis."""
+    sid = _session_id()
+    job = _pending_job(sid)
+    if job is not None:
+        return jsonify({"processing": True, "message": _processing_message(job), "job": job}), 202
+    entry = _get_session(sid)
+    
+    if entry is None or entry["df"].empty:
+        return jsonify({"error": "No data found. Please upload a CSV first."}), 400
+    
+    # Optional from/to/category/merchant filters select a view of the dataset
+    try:
+        filters = _request_filters()
+        view = _filtered_view(entry, filters) if filters is not None else entry
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if view is None:
+        return jsonify({"error": "No transactions match the selected filters."}), 400
+    
+    # sections=a,b limits the response to those sections (see _ANALYTICS_SECTIONS)
+    sections = list(dict.fromkeys(name.strip() for name in request.args.get("sections", "").split(",") if name.strip()))
+    unknown = [name for name in sections if name not in _ANALYTICS_SECTIONS]
+    if unknown:
+        return jsonify({"error": f"Unknown analytics sections: {', '.join(unknown)}",
+                        "sections": list(_ANALYTICS_SECTIONS)}), 400
+    if not sections:
+        return _cached_response(entry, view, "analytics", _analytics_payload)
+    return _cached_response(entry, view, "analytics:" + ",".join(sections),
+                            lambda view: _analytics_payload(view, sections))
 
 @app.route("/test-categorization", methods=["GET"])
 def test_categorization():
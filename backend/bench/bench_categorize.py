@@ -0,0 +1,50 @@
+"""Rows per second of _categorize_transactions against the per-row _categorize_sbi_transaction.
+
+Descriptions are drawn from the sample statements with a random reference appended, about
+1% missing. Run from backend/:
+
+    python bench/bench_categorize.py [rows ...]    (default 10000 100000 1000000)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+SAMPLES = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def descriptions(count: int, rng) -> pd.Series:
+    base = pd.concat([pd.read_csv(os.path.join(SAMPLES, "kotak_sample.csv"))["Particulars"],
+                      pd.read_csv(os.path.join(SAMPLES, "sbi_sample.csv"))["Description"],
+                      pd.read_csv(os.path.join(SAMPLES, "axis_sample.csv"))["Description"]]).to_numpy()
+    text = pd.Series(base[rng.integers(0, len(base), count)]) + "/" + \
+        pd.Series(rng.integers(10 ** 8, 10 ** 9, count)).astype(str)
+    text[rng.random(count) < 0.01] = np.nan
+    return text
+
+
+def main(sizes):
+    rng = np.random.default_rng(0)
+    for count in sizes:
+        text = descriptions(count, rng)
+        start = time.perf_counter()
+        expected = text.apply(backend._categorize_sbi_transaction)
+        per_row = time.perf_counter() - start
+        start = time.perf_counter()
+        categories = backend._categorize_transactions(text)
+        vectorized = time.perf_counter() - start
+        same = bool((expected == categories).all())
+        print(f"{count:>9,} rows  per-row {count / per_row:>12,.0f} rows/s  "
+              f"vectorized {count / vectorized:>12,.0f} rows/s  ({per_row / vectorized:.1f}x, same: {same})")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
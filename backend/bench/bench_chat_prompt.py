@@ -0,0 +1,90 @@
+"""/chat prompt size and latency in "full" and "retrieval" context modes against a stub LLM.
+
+The stub takes 200 ms plus the prompt's tokens (about 4 characters each) at 10k tokens/s,
+a rough stand-in for Gemini's prefill. For each question, this prints the prompt size,
+the first and warm latency, and how many of the transactions the question is about made it into
+the prompt. The dataset is synthetic, with DMART and Zerodha rows planted. Run from backend/:
+
+    python bench/bench_chat_prompt.py [rows]    (default 200000)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+QUESTIONS = {
+    "How much did I spend at DMART in March 2025?":
+        lambda df: (df["Description"] == "POS DMART Thane") & (df["Date"].dt.strftime("%Y-%m") == "2025-03"),
+    "Zerodha investments over 4000?":
+        lambda df: (df["Description"] == "Zerodha Broking") & (df["Amount"].abs() > 4000),
+    "Where can I save money?": None,
+    "How much on food in September 2024?":
+        lambda df: (df["Category"] == "Food & Dining") & (df["Date"].dt.strftime("%Y-%m") == "2024-09"),
+}
+
+
+def transactions(count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(22)
+    df = pd.DataFrame({
+        "Date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, count), unit="D"),
+        "Description": [f"UPI Payment - Shop {i}" for i in rng.integers(0, max(count // 50, 1), count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation", "Bills & Utilities"], count),
+        "Amount": -rng.gamma(2.0, 400.0, count).round(2),
+    })
+    planted = rng.choice(count, 120, replace=False)
+    df.loc[planted[:60], ["Description", "Category"]] = ["POS DMART Thane", "Groceries"]
+    df.loc[planted[60:], ["Description", "Category"]] = ["Zerodha Broking", "Investments"]
+    df.loc[planted[60:], "Amount"] = -rng.uniform(1000, 10000, 60).round(2)
+    df.loc[planted[:30], "Date"] = pd.Timestamp("2025-03-01") + pd.to_timedelta(np.arange(30) % 28, unit="D")
+    return df
+
+
+def main(rows: int):
+    sid = uuid.uuid4().hex
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = backend._compact_transactions(transactions(rows))
+        backend._put_session(sid, {"df": df, "context": {}, "payloads": {},
+                                   "fingerprints": np.empty(0, dtype=np.uint64),
+                                   "profile": backend._profile_transactions(df)})
+    prompts = []
+
+    def stub(prompt):
+        prompts.append(prompt)
+        time.sleep(0.2 + len(prompt) / 4 / 10_000)
+        return "ok", {"model": "stub"}
+
+    backend.ANSWER_MODE = "ai-only"
+    backend.GEMINI_API_KEY = "stub-key"
+    backend.CHAT_CACHE_MAX_MB = 0
+    backend._llm_chat = stub
+    client = backend.app.test_client()
+    print(f"{rows:,} rows, CHAT_CONTEXT_ROWS={backend.CHAT_CONTEXT_ROWS}, CSV_CONTEXT_MAX_CHARS={backend.CSV_CONTEXT_MAX_CHARS}")
+    for mode in ("full", "retrieval"):
+        backend.CHAT_CONTEXT_MODE = mode
+        for question, relevant in QUESTIONS.items():
+            latencies = []
+            for _ in range(3):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    assert client.post("/chat", json={"query": question}, headers={"X-Session-Id": sid}).status_code == 200
+                latencies.append(time.perf_counter() - start)
+            found = ""
+            if relevant is not None:
+                wanted = df[relevant(df)]
+                lines = set(backend._render_context_text(wanted).splitlines())
+                found = f"{len(lines & set(prompts[-1].splitlines()))}/{len(lines)}"
+            print(f"{mode:<9} {question[:44]:<44} prompt {len(prompts[-1]):>7,} chars  first {latencies[0] * 1e3:>5.0f} ms  "
+                  f"warm {min(latencies[1:]) * 1e3:>5.0f} ms  relevant {found}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,93 @@
+"""Peak RSS while 20 requests read one session's dataset at once.
+
+A synthetic dataset is stored as a session; then 20 threads request each endpoint
+together, all with cold response caches, while another thread samples the resident set
+size (from /proc, so Linux only). Run from backend/:
+
+    python bench/bench_dashboard_rss.py [rows] [endpoint ...]
+    (default 1000000 /dashboard /advanced-analytics /recurring)
+
+Run it at an older commit for the before figures.
+"""
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+REQUESTS = 20
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def transactions(count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365 * 86400, count), unit="s"),
+        "Description": [f"UPI Payment - Merchant {i}" for i in rng.integers(0, max(count // 20, 1), count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation", "Bills & Utilities", "Income"], count),
+        "Amount": -rng.gamma(2.0, 400.0, count).round(2),
+    })
+
+
+def measure(sid: str, endpoint: str):
+    entry = backend._get_session(sid)
+    entry["payloads"].clear()
+    samples, done = [rss_mb()], threading.Event()
+
+    def sample():
+        while not done.is_set():
+            samples.append(rss_mb())
+            time.sleep(0.002)
+
+    barrier = threading.Barrier(REQUESTS)
+
+    def request():
+        client = backend.app.test_client()
+        barrier.wait()
+        assert client.get(endpoint, headers={"X-Session-Id": sid}).status_code == 200
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    threads = [threading.Thread(target=request) for _ in range(REQUESTS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    return samples[0], max(samples), elapsed
+
+
+def main(rows: int, endpoints):
+    sid = uuid.uuid4().hex
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = backend._compact_transactions(transactions(rows))
+        backend._put_session(sid, {"df": df, "context": {}, "payloads": {},
+                                   "fingerprints": np.empty(0, dtype=np.uint64),
+                                   "profile": backend._profile_transactions(df)})
+    dataset = df.memory_usage(deep=True).sum() / 1e6
+    print(f"{rows:,} rows, dataset {dataset:.0f} MB, {REQUESTS} concurrent requests")
+    for endpoint in endpoints:
+        with contextlib.redirect_stdout(io.StringIO()):
+            before, peak, elapsed = measure(sid, endpoint)
+        print(f"{endpoint:<22} RSS {before:>6.0f} MB -> peak {peak:>6.0f} MB (+{peak - before:.0f} MB) in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+         sys.argv[2:] or ["/dashboard", "/advanced-analytics", "/recurring"])
@@ -0,0 +1,92 @@
+"""Filter-index lookups against boolean masks on high-cardinality datasets.
+
+Each dataset has one merchant per 10 rows. For a one-month date range, a category, five
+merchants and all three together, this times _filtered_rows (after a one-off
+_filter_index build) against the boolean mask over the whole frame, and a cold and a
+warm filtered /dashboard. Run from backend/:
+
+    python bench/bench_filters.py [rows ...]    (default 10000 100000 1000000)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+
+def transactions(count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(count)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365 * 86400, count), unit="s"),
+        "Description": [f"UPI Payment - Merchant {i}" for i in rng.integers(0, max(count // 10, 1), count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation", "Bills & Utilities", "Income"], count),
+        "Amount": -rng.gamma(2.0, 400.0, count).round(2),
+    })
+
+
+def best(run, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(sizes):
+    client = backend.app.test_client()
+    for count in sizes:
+        sid = uuid.uuid4().hex
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = backend._compact_transactions(transactions(count))
+            backend._put_session(sid, {"df": df, "context": {}, "payloads": {},
+                                       "fingerprints": np.empty(0, dtype=np.uint64),
+                                       "profile": backend._profile_transactions(df)})
+        entry = backend._get_session(sid)
+        build = best(lambda: (entry.pop("index", None), backend._filter_index(entry)), repeat=1)
+        print(f"{count:,} rows, {df['Description'].nunique():,} merchants, index built in {build * 1e3:.1f} ms")
+        month = (pd.Timestamp("2023-06-01"), pd.Timestamp("2023-07-01"))
+        # Merchants paid for Shopping that month, so the combined filter selects rows too
+        paid = df[(df["Date"] >= month[0]) & (df["Date"] < month[1]) & (df["Category"] == "Shopping")]
+        merchants = tuple(sorted(paid["Description"].astype(str).unique()[:5]))
+        cases = {
+            "month": (*month, (), ()),
+            "category": (None, None, ("Shopping",), ()),
+            "5 merchants": (None, None, (), merchants),
+            "all three": (*month, ("Shopping",), merchants),
+        }
+        for name, filters in cases.items():
+            start, end, categories, wanted = filters
+            indexed = best(lambda: backend._filtered_rows(entry, filters))
+
+            def masked():
+                mask = np.ones(len(df), dtype=bool)
+                if start is not None:
+                    mask &= (df["Date"] >= start).to_numpy() & (df["Date"] < end).to_numpy()
+                if categories:
+                    mask &= df["Category"].isin(categories).to_numpy()
+                if wanted:
+                    mask &= df["Description"].isin(wanted).to_numpy()
+                return np.flatnonzero(mask)
+            assert np.array_equal(backend._filtered_rows(entry, filters), masked())
+            query = {"from": str(start.date()) if start is not None else "",
+                     "to": str((end - pd.Timedelta(days=1)).date()) if end is not None else "",
+                     "category": list(categories), "merchant": list(wanted)}
+            entry.pop("views", None)
+            with contextlib.redirect_stdout(io.StringIO()):
+                cold = best(lambda: client.get("/dashboard", query_string=query, headers={"X-Session-Id": sid}), repeat=1)
+                warm = best(lambda: client.get("/dashboard", query_string=query, headers={"X-Session-Id": sid}))
+            print(f"  {name:<12} {len(masked()):>7,} rows  index {indexed * 1e3:>8.3f} ms  mask {best(masked) * 1e3:>8.3f} ms  "
+                  f"/dashboard cold {cold * 1e3:>7.1f} ms  warm {warm * 1e3:>5.1f} ms")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
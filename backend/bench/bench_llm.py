@@ -0,0 +1,93 @@
+"""/chat LLM latency against a stub Gemini whose preferred models are missing.
+
+The stub answers in 300 ms and rejects missing models with a 404 after 120 ms, like
+the API does for retired model names; the first three of _LLM_MODELS are missing.
+Compares _llm_chat (resolved model, breakers, shared clients) with probing the models
+in order through a new client on every request, over 10 sequential questions, then
+shows a resolved model going down and every model being down. Run from backend/:
+
+    python bench/bench_llm.py [requests]    (default 10)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+ANSWER_SECONDS = 0.30
+MISSING_SECONDS = 0.12
+missing = set(backend._LLM_MODELS[:3])
+calls, built = [], []
+
+
+class StubModel:
+    def __init__(self, name):
+        built.append(name)
+        self.name = name
+
+    def generate_content(self, prompt):
+        calls.append(self.name)
+        if self.name in missing:
+            time.sleep(MISSING_SECONDS)
+            raise RuntimeError(f"404 {self.name} is not found for API version v1beta")
+        time.sleep(ANSWER_SECONDS)
+        return type("Response", (), {"text": "ok"})()
+
+
+def probe_every_request(prompt: str):
+    """The old path: a new client per model and request, tried in order until one answers."""
+    for name in backend._LLM_MODELS:
+        try:
+            return StubModel(name).generate_content(prompt).text, {"model": name}
+        except Exception:
+            continue
+    raise RuntimeError("All LLM models are unavailable")
+
+
+def run(label: str, chat, requests: int):
+    calls.clear()
+    built.clear()
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(requests):
+            start = time.perf_counter()
+            chat("How can I save money?")
+            latencies.append(time.perf_counter() - start)
+    rest = latencies[1:] or latencies
+    print(f"{label:<20} first {latencies[0] * 1e3:>5.0f} ms  then {sum(rest) / len(rest) * 1e3:>5.0f} ms  "
+          f"round trips {len(calls):>3}  clients built {len(built)}")
+
+
+def main(requests: int):
+    backend.GEMINI_API_KEY = "stub-key"
+    backend.genai.GenerativeModel = StubModel
+    print(f"{requests} questions, {len(missing)} of {len(backend._LLM_MODELS)} models missing")
+    run("probe every request", probe_every_request, requests)
+    run("_llm_chat", backend._llm_chat, requests)
+
+    # The resolved model goes down: the next one answers and the breaker keeps it skipped
+    resolved = backend._LLM_STATE["resolved"][0]
+    missing.add(resolved)
+    run(f"{resolved.split('/')[-1]} down", backend._llm_chat, requests)
+
+    # Every model down: once all breakers are open, requests fail without a round trip
+    missing.update(backend._LLM_MODELS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            backend._llm_chat("q")
+        except RuntimeError:
+            pass
+    calls.clear()
+    start = time.perf_counter()
+    try:
+        backend._llm_chat("q")
+    except RuntimeError as e:
+        print(f"{'all down':<20} fails in {(time.perf_counter() - start) * 1e3:.3f} ms with {len(calls)} round trips: {e}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,65 @@
+"""Kotak PDF extraction time on the sample statements, scaled up to longer statements.
+
+Each statement in MykotakSatementsampless/ is repeated page by page (with pypdfium2, which
+pdfplumber already depends on) to the requested page counts; then _extract_pdf_kotak runs
+single-process and through the shared process pool with each worker count, checking that
+every run extracts the same rows. Each worker count's pool is started by an untimed run
+first. Run from backend/ (the speed-up needs as many cores as workers):
+
+    python bench/bench_pdf.py [pages ...]    (default 10 50 200; workers from PDF_BENCH_WORKERS, default 2 4)
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+import pypdfium2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+with contextlib.redirect_stdout(io.StringIO()):
+    import app as backend  # noqa: E402
+
+STATEMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          "MykotakSatementsampless")
+
+
+def scaled(data: bytes, pages: int) -> bytes:
+    """The PDF's pages repeated in order until it has `pages` of them."""
+    source = pypdfium2.PdfDocument(data)
+    scaled = pypdfium2.PdfDocument.new()
+    while len(scaled) < pages:
+        scaled.import_pages(source, list(range(min(len(source), pages - len(scaled)))))
+    out = io.BytesIO()
+    scaled.save(out)
+    return out.getvalue()
+
+
+def timed(data: bytes, workers: int):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = backend._extract_pdf_kotak(io.BytesIO(data), workers=workers)
+    return df.reset_index(drop=True), time.perf_counter() - start
+
+
+def main(page_counts, worker_counts):
+    backend.PDF_PARALLEL_MIN_PAGES = 1
+    print(f"{os.cpu_count()} CPUs")
+    for name in sorted(os.listdir(STATEMENTS)):
+        with open(os.path.join(STATEMENTS, name), "rb") as f:
+            original = f.read()
+        for pages in page_counts:
+            data = scaled(original, pages)
+            sequential, seconds = timed(data, 1)
+            line = f"{name} {pages:>4} pages: {len(sequential):>6,} rows  1 worker {seconds:>6.2f}s"
+            for workers in worker_counts:
+                timed(data, workers)  # Starts the pool for this worker count
+                parallel, parallel_seconds = timed(data, workers)
+                assert parallel.equals(sequential)
+                line += f"  {workers} workers {parallel_seconds:>6.2f}s ({seconds / parallel_seconds:.1f}x)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 50, 200],
+         [int(n) for n in os.getenv("PDF_BENCH_WORKERS", "2 4").split()])
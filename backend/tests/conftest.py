@@ -0,0 +1,59 @@
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as backend  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Flask test client with no Gemini key and no snapshots, so nothing leaves the process."""
+    monkeypatch.setattr(backend, "GEMINI_API_KEY", None)
+    monkeypatch.setattr(backend, "SNAPSHOT_DIR", "")
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def session():
+    """Store a DataFrame of Date/Description/Category/Amount rows as a new session's
+    dataset and return the request headers that select it."""
+    sids = []
+
+    def store(df: pd.DataFrame) -> dict:
+        sid = uuid.uuid4().hex
+        df = backend._compact_transactions(df)
+        backend._put_session(sid, {
+            "df": df, "context": {}, "payloads": {},
+            "fingerprints": np.empty(0, dtype=np.uint64),
+            "profile": backend._profile_transactions(df),
+        })
+        sids.append(sid)
+        return {"X-Session-Id": sid}
+
+    yield store
+    with backend._SESSION_LOCK:
+        for sid in sids:
+            backend._SESSION_STORE.pop(sid, None)
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runslow", action="store_true", help="also run the tests marked slow")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: million-row cases, run with --runslow")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runslow"):
+        return
+    skip = pytest.mark.skip(reason="slow, run with --runslow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,57 @@
+"""ANALYTICS_STATS_MODE=sketch statistics against the exact ones."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as backend
+
+
+def amounts(count: int, seed: int) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    values = np.round(rng.lognormal(6, 2, count), 2) * rng.choice([-1, 1], count)
+    values[rng.random(count) < 0.02] = 0.0
+    values[rng.random(count) < 0.01] = np.nan
+    return pd.Series(values)
+
+
+def exact(values: pd.Series) -> dict:
+    a = values.abs()
+    return {"mean": a.mean(), "median": a.median(), "std": a.std(), "min": a.min(), "max": a.max(),
+            "count": int(a.count()), "q25": a.quantile(0.25), "q75": a.quantile(0.75)}
+
+
+def assert_within_accuracy(sketched: dict, expected: dict, accuracy: float):
+    for key in ("median", "q25", "q75"):
+        assert abs(sketched[key] - expected[key]) <= accuracy * expected[key] + 1e-12, key
+    for key in ("mean", "std", "min", "max"):
+        assert sketched[key] == pytest.approx(expected[key], rel=1e-9, nan_ok=True), key
+    assert sketched["count"] == expected["count"]
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+@pytest.mark.parametrize("count", [1, 2, 7, 1000, 50000])
+def test_sketch_statistics_within_accuracy(monkeypatch, accuracy, count):
+    monkeypatch.setattr(backend, "ANALYTICS_SKETCH_ACCURACY", accuracy)
+    values = amounts(count, seed=count)
+    sketched = backend._sketch_statistics(backend._amount_sketch(values))
+    assert_within_accuracy(sketched, exact(values), accuracy)
+
+
+def test_merged_sketch_matches_whole(monkeypatch):
+    monkeypatch.setattr(backend, "ANALYTICS_SKETCH_ACCURACY", 0.01)
+    values = amounts(20000, seed=1)
+    parts = [values[:1], values[1:7000], values[7000:7000], values[7000:]]
+    merged = backend._amount_sketch(parts[0])
+    for part in parts[1:]:
+        merged = backend._merge_sketches(merged, backend._amount_sketch(part))
+    whole = backend._amount_sketch(values)
+    assert merged["offset"] == whole["offset"]
+    assert np.array_equal(merged["counts"], whole["counts"])
+    assert merged["zeros"] == whole["zeros"]
+    assert_within_accuracy(backend._sketch_statistics(merged), exact(values), 0.01)
+
+
+def test_empty_sketch():
+    statistics = backend._sketch_statistics(backend._amount_sketch(pd.Series([], dtype=float)))
+    assert statistics["count"] == 0
+    assert np.isnan(statistics["median"])
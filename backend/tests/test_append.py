@@ -0,0 +1,100 @@
+"""Append uploads: fingerprint-based deduplication against the session's dataset."""
+import io
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as backend
+
+SAMPLES = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def upload(client, monkeypatch):
+    monkeypatch.setattr(backend, "PARSE_CACHE_DIR", "")
+    monkeypatch.setattr(backend, "ASYNC_UPLOADS", False)
+
+    def post(sid: str, data: bytes, bank: str, mode: str):
+        response = client.post("/upload", headers={"X-Session-Id": sid}, data={
+            "bank": bank, "mode": mode, "file": (io.BytesIO(data), "statement.csv")})
+        assert response.status_code == 200, response.get_json()
+        return backend._get_session(sid)
+    return post
+
+
+def test_fingerprints_compare_amounts_by_value():
+    text = pd.DataFrame({"Date": [" 01/09/2025", "02/09/2025 "], "Ref": ["A1", None],
+                         "Debit": ["1,200.00", "35.50"], "Balance": ["90,000", ""]})
+    numbers = pd.DataFrame({"Date": ["01/09/2025", "02/09/2025"], "Ref": ["A1", np.nan],
+                            "Debit": [1200.0, 35.5], "Balance": [90000, np.nan]})
+    assert np.array_equal(backend._row_fingerprints(text), backend._row_fingerprints(numbers))
+    numbers.loc[1, "Debit"] = 35.05
+    assert not np.array_equal(backend._row_fingerprints(text), backend._row_fingerprints(numbers))
+
+
+@pytest.mark.parametrize("bank, name, amount", [("kotak", "kotak_sample.csv", "Debit"),
+                                                ("axis", "axis_sample.csv", "Withdrawal Amt")])
+def test_overlapping_append_matches_whole_upload(upload, bank, name, amount):
+    full = pd.read_csv(os.path.join(SAMPLES, name))
+    whole = upload(f"whole-{bank}", full.to_csv(index=False).encode(), bank, "replace")
+    # The second statement overlaps the first and writes its amounts with thousands separators
+    second = full.iloc[len(full) // 2 - 5:].copy()
+    second[amount] = second[amount].map(lambda v: f"{v:,.2f}" if pd.notna(v) else "")
+    first = upload(f"parts-{bank}", full.iloc[:len(full) // 2].to_csv(index=False).encode(), bank, "replace")
+    parts = upload(f"parts-{bank}", second.to_csv(index=False).encode(), bank, "append")
+    assert parts["df"].reset_index(drop=True).equals(whole["df"].reset_index(drop=True))
+    assert np.array_equal(parts["fingerprints"], whole["fingerprints"])
+    assert parts["version"] != first["version"]
+    # The history's rollups absorb the new rows' instead of being rebuilt
+    merged, built = parts["aggregates"], whole["aggregates"]
+    assert merged.keys() == built.keys()
+    assert {key: merged[key] for key in ("rows", "columns", "category_count")} == \
+        {key: built[key] for key in ("rows", "columns", "category_count")}
+    assert merged["total"] == pytest.approx(built["total"])
+    pd.testing.assert_series_equal(merged["hourly"], built["hourly"], check_dtype=False)
+    assert merged["by"].keys() == built["by"].keys()
+    for rollup in built["by"]:
+        pd.testing.assert_frame_equal(merged["by"][rollup], built["by"][rollup])
+    for name in ("statistics", "outliers", "recurring"):
+        assert str(backend._aggregate(parts, name)) == str(backend._aggregate(whole, name))
+
+
+@pytest.mark.skipif(backend.fcntl is None, reason="needs flock")
+def test_appends_wait_for_other_workers(upload, monkeypatch, tmp_path):
+    monkeypatch.setattr(backend, "SNAPSHOT_DIR", str(tmp_path))
+    full = pd.read_csv(os.path.join(SAMPLES, "kotak_sample.csv"))
+    half = len(full) // 2
+    upload("workers", full.iloc[:half].to_csv(index=False).encode(), "kotak", "replace")
+    stale = backend._get_session("workers")
+    # Another worker holds the session's ingestion lock while it appends the second half
+    lock_path = os.path.join(backend._snapshot_dir("workers"), "ingest.lock")
+    with open(lock_path, "a") as other:
+        backend.fcntl.flock(other, backend.fcntl.LOCK_EX)
+        appended = {}
+        thread = threading.Thread(target=lambda: appended.update(
+            upload("workers", full.iloc[half:half + 3].to_csv(index=False).encode(), "kotak", "append")))
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+        backend._ingest_upload("workers", io.BytesIO(full.iloc[half + 3:].to_csv(index=False).encode()),
+                               "kotak", "statement.csv", "append")
+        # This worker still has the dataset from before the other worker's append
+        with backend._SESSION_LOCK:
+            backend._SESSION_STORE["workers"] = stale
+    thread.join(10)
+    assert len(appended["df"]) == len(full)
+
+
+def test_ingest_locks_go_with_their_session(client, session):
+    sid = session(pd.DataFrame({"Date": pd.to_datetime(["2025-01-01"]), "Description": ["Rent"],
+                                "Category": ["Bills"], "Amount": [-100.0]}))["X-Session-Id"]
+    with backend._ingest_lock(sid):
+        assert sid in backend._INGEST_LOCKS
+    assert sid in backend._INGEST_LOCKS
+    last_used = backend._get_session(sid)["last_used"]
+    with backend._SESSION_LOCK:
+        backend._expire_sessions(last_used + backend.SESSION_TTL_SECONDS + 1)
+    assert sid not in backend._INGEST_LOCKS
@@ -0,0 +1,114 @@
+"""/chat/stream with a fake streaming Gemini, and the incremental answer cleaner."""
+import json
+import random
+
+import pandas as pd
+import pytest
+
+import app as backend
+
+ANSWER = ("**Great question!** Here is what I found:\n\n1. You spent *Rs 4,465.76* at DMART.\n"
+          "2. That's 40% above your median.\n\n\n- Try buying in bulk.\n- Skip impulse buys.Thanks")
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Streams ANSWER word by word; fails before the first chunk or after fail_after of them."""
+
+    def __init__(self, error=None, fail_after=None):
+        self.error, self.fail_after = error, fail_after
+
+    def generate_content(self, prompt, stream=False):
+        words = [word + " " for word in ANSWER.split(" ")]
+
+        def chunks():
+            if self.error:
+                raise RuntimeError(self.error)
+            for i, word in enumerate(words):
+                if i == self.fail_after:
+                    raise RuntimeError("503 UNAVAILABLE")
+                yield Chunk(word)
+        return chunks() if stream else Chunk("".join(words))
+
+
+@pytest.fixture
+def models(client, monkeypatch):
+    """Model name -> FakeModel (a working one for names not set) behind _llm_client."""
+    models = {}
+    monkeypatch.setattr(backend, "_llm_client", lambda name: models.get(name) or FakeModel())
+    monkeypatch.setattr(backend, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(backend, "ANSWER_MODE", "ai-only")
+    monkeypatch.setattr(backend, "CHAT_CACHE_MAX_MB", 0)
+    monkeypatch.setitem(backend._LLM_STATE, "resolved", None)
+    monkeypatch.setitem(backend._LLM_STATE, "breakers", {})
+    return models
+
+
+@pytest.fixture
+def headers(session):
+    return session(pd.DataFrame({
+        "Date": pd.to_datetime(["2025-01-03", "2025-01-09", "2025-02-11"]),
+        "Description": ["DMART", "Salary Credit", "DMART"],
+        "Category": ["Groceries", "Income", "Groceries"],
+        "Amount": [-4465.76, 50000.0, -1200.0],
+    }))
+
+
+def stream(client, headers, question):
+    response = client.post("/chat/stream", json={"query": question}, headers=headers)
+    assert response.mimetype == "text/event-stream"
+    return [json.loads(message[6:]) for message in response.get_data(as_text=True).split("\n\n")
+            if message.startswith("data: ")]
+
+
+def test_incremental_cleaning_matches_whole_answer():
+    parts = ["**Food**", "*Swiggy*", "Rs 3.5k", "e.g.x", "You spent Rs 350.", "It is 40% higher!", "Cut it?Yes",
+             "\n", "\n\n", "\n\n\n\n", "\n- ", "\n* ", "\n1. ", "\n12. ", "  ", " ", "**Tip:** save", "1.5", "- ", "_x_"]
+    rng = random.Random(0)
+    for _ in range(3000):
+        text = "".join(rng.choice(parts) for _ in range(rng.randint(1, 14)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 8)))) if len(text) > 1 else []
+        chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+        assert "".join(backend._clean_answer_stream(chunks)) == backend._clean_answer(text), chunks
+
+
+def test_stream_matches_chat(client, models, headers):
+    events = stream(client, headers, "what did I spend at dmart?")
+    deltas = [event["delta"] for event in events if "delta" in event]
+    done = events[-1]
+    assert len(deltas) > 1 and done["done"]
+    assert "".join(deltas) == done["response"] == backend._clean_answer(ANSWER)
+    assert done["meta"]["model"] == backend._LLM_MODELS[0]
+    assert client.post("/chat", json={"query": "what did I spend at dmart?"}, headers=headers).get_json()["response"] == done["response"]
+
+
+def test_next_model_after_not_found(client, models, headers):
+    models[backend._LLM_MODELS[0]] = FakeModel(error="404 NOT_FOUND models/x")
+    assert stream(client, headers, "hello")[-1]["meta"]["model"] == backend._LLM_MODELS[1]
+
+
+def test_error_before_first_chunk_falls_back(client, models, headers):
+    models.update({name: FakeModel(error="400 API key not valid") for name in backend._LLM_MODELS})
+    events = stream(client, headers, "hello")
+    assert events[-1]["meta"]["error"]
+    assert events[0]["delta"] == events[-1]["response"]
+
+
+def test_error_mid_stream_keeps_partial_answer(client, models, headers):
+    models[backend._LLM_MODELS[0]] = FakeModel(fail_after=6)
+    events = stream(client, headers, "hello")
+    done = events[-1]
+    assert done["meta"]["error"]
+    assert "".join(event.get("delta", "") for event in events) == done["response"]
+    assert done["response"] == backend._clean_answer("".join(word + " " for word in ANSWER.split(" ")[:6]))
+
+
+def test_hybrid_answers_are_sent_whole(client, models, headers, monkeypatch):
+    monkeypatch.setattr(backend, "ANSWER_MODE", "hybrid")
+    events = stream(client, headers, "what is my total spending")
+    assert len(events) == 2
+    assert events[0]["delta"] == events[1]["response"] == "Your total spending is 44334.24."
@@ -0,0 +1,69 @@
+"""The columnar description cleaners must match the per-row ones exactly."""
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as backend
+
+# The sample statements live at the repository root
+SAMPLES = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CLEANERS = {
+    "sbi": (backend._clean_sbi_descriptions, backend._clean_sbi_description, "sbi_sample.csv", "Description"),
+    "kotak": (backend._clean_kotak_descriptions, backend._clean_kotak_description, "kotak_sample.csv", "Particulars"),
+    "axis": (backend._clean_axis_descriptions, backend._clean_axis_description, "axis_sample.csv", "Description"),
+}
+
+EDGE_CASES = [
+    None, np.nan, 123, 45.6, "", "   ", "\t\x0bUPI/DR/1/AB\x1f ", "UPI/CR/1/ABC", "UPI/DR//", "UPI/",
+    "UPI-", "UPI--X", "BY TRANSFER-UPI/DR/400252792161/MAHAB", "TO TRANSFER Hamara SONU", "TO TRANSFER SONU",
+    "ECS/ACH RETURN CHARGES", "NEFT SALARY", "NEFT-SALARY-ACME", "ATM WDL 1234", "ATM-CASH", "IMPS/AMAZON/1",
+    "IMPS/X", "MOBILE RECHARGE JIO", "SALARY NEFT", "x" * 40, "x" * 41, "UPI/dr/1/mahab", "UPI/é/café",
+    "Café au lait at the corner shop on the main road", "UPI-ñandú-x", " NEFT ", "upi/swiggy/o'brien-2x",
+]
+
+TOKENS = ["UPI", "DR", "CR", "BY TRANSFER", "TO TRANSFER", "MAHAB", "Hamara", "SONU", "AMC", "ECS", "ACH RETURN",
+          "NEFT", "SALARY", "ATM", "WDL", "IMPS", "AMAZON", "MOBILE RECHARGE", "swiggy", "zomato", "o'neil",
+          "123456", "ab", "x1y2", " ", "/", "/", "-", "-"]
+
+
+def synthetic(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return ["".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("bank", sorted(CLEANERS))
+def test_columnar_cleaner_matches_row_cleaner(bank):
+    columnar, row, sample, column = CLEANERS[bank]
+    values = (pd.read_csv(os.path.join(SAMPLES, sample))[column].tolist() + EDGE_CASES
+              + synthetic(5000, seed=len(bank)))
+    descriptions = pd.Series(values, dtype=object)
+    cleaned = backend._clean_descriptions(descriptions, columnar, row)
+    assert cleaned.tolist() == [row(value) for value in values]
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("bank", sorted(CLEANERS))
+def test_columnar_cleaner_matches_row_cleaner_at_scale(bank):
+    columnar, row, sample, column = CLEANERS[bank]
+    pool = np.array(pd.read_csv(os.path.join(SAMPLES, sample))[column].tolist() + EDGE_CASES
+                    + synthetic(5000, seed=len(bank)), dtype=object)
+    rng = np.random.default_rng(len(bank))
+    count = 1_000_000
+    values = pool[rng.integers(0, len(pool), count)]
+    # Unique references, as real statements have, on half of the text rows
+    suffixed = np.flatnonzero(np.array([isinstance(value, str) for value in values]) & (rng.random(count) < 0.5))
+    values[suffixed] = values[suffixed] + "/" + rng.integers(0, 10 ** 9, len(suffixed)).astype(str).astype(object)
+    descriptions = pd.Series(values, dtype=object)
+    cleaned = backend._clean_descriptions(descriptions, columnar, row)
+    assert cleaned.tolist() == [row(value) for value in values]
+
+
+@pytest.mark.parametrize("bank", sorted(CLEANERS))
+def test_all_missing_descriptions(bank):
+    columnar, row, _, _ = CLEANERS[bank]
+    cleaned = backend._clean_descriptions(pd.Series([None, np.nan], dtype=object), columnar, row)
+    assert cleaned.tolist() == ["Unknown Transaction"] * 2
@@ -0,0 +1,75 @@
+"""Filtered views: index lookups must select exactly the rows a boolean mask does."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(14)
+    count = 20_000
+    df = pd.DataFrame({
+        "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730 * 86400, count), unit="s"),
+        "Description": [f"UPI Payment - Merchant {i}" for i in rng.integers(0, 5000, count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation", "Bills & Utilities"], count),
+        "Amount": -rng.gamma(2.0, 400.0, count).round(2),
+    })
+    df.loc[rng.random(count) < 0.01, "Date"] = pd.NaT
+    df.loc[rng.random(count) < 0.01, "Category"] = None
+    return df
+
+
+def random_filters(df: pd.DataFrame, rng):
+    start = end = None
+    if rng.random() < 0.6:
+        start = pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(rng.integers(0, 730)))
+    if rng.random() < 0.6:
+        end = pd.Timestamp("2024-01-01") + pd.Timedelta(days=int(rng.integers(0, 730)))
+    categories = tuple(sorted(set(rng.choice(df["Category"].dropna().unique(), rng.integers(0, 3)))))
+    merchants = tuple(sorted(set(rng.choice(df["Description"].unique(), rng.integers(0, 40)))))
+    if start is None and end is None and not categories and not merchants:
+        merchants = (df["Description"].iloc[0],)
+    return start, end, categories, merchants
+
+
+def mask_filter(df: pd.DataFrame, filters) -> np.ndarray:
+    start, end, categories, merchants = filters
+    mask = pd.Series(True, index=df.index)
+    if start is not None or end is not None:
+        mask &= df["Date"].notna()
+    if start is not None:
+        mask &= df["Date"] >= start
+    if end is not None:
+        mask &= df["Date"] < end
+    if categories:
+        mask &= df["Category"].isin(categories)
+    if merchants:
+        mask &= df["Description"].isin(merchants)
+    return mask.to_numpy()
+
+
+def test_filtered_rows_match_boolean_mask(client, session, dataset):
+    entry = backend._get_session(session(dataset)["X-Session-Id"])
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        filters = random_filters(dataset, rng)
+        rows = backend._filtered_rows(entry, filters)
+        assert np.array_equal(rows, np.flatnonzero(mask_filter(dataset, filters))), filters
+
+
+def test_filtered_dashboard_matches_masked_dataset(client, session, dataset):
+    headers = session(dataset)
+    entry = backend._get_session(headers["X-Session-Id"])
+    query = {"from": "2024-03-01", "to": "2024-09-30", "category": ["Shopping", "Food & Dining"]}
+    response = client.get("/dashboard", query_string=query, headers=headers)
+    assert response.status_code == 200
+    filters = (pd.Timestamp("2024-03-01"), pd.Timestamp("2024-10-01"), ("Food & Dining", "Shopping"), ())
+    masked = backend._compact_transactions(dataset[mask_filter(dataset, filters)])
+    with backend.app.app_context():
+        expected = backend.jsonify(backend._dashboard_payload(
+            {"aggregates": backend._build_aggregates(masked), "profile": entry["profile"]})).get_data()
+    assert response.get_json() == json.loads(expected)
@@ -0,0 +1,127 @@
+"""Gemini model selection: which errors skip to the next model behind a breaker, and
+how the resolved model, breakers and clients are reused (against a stub client)."""
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import app as backend
+
+
+@pytest.mark.parametrize("error, unusable", [
+    (google_exceptions.NotFound("models/gemini-x is not found"), True),
+    (google_exceptions.InternalServerError("An internal error has occurred"), True),
+    (google_exceptions.ServiceUnavailable("The model is overloaded"), True),
+    (RuntimeError("404 NOT_FOUND models/gemini-x"), True),
+    (RuntimeError("503 UNAVAILABLE"), True),
+    (google_exceptions.TooManyRequests("Quota exceeded, limit: 1500"), False),
+    (google_exceptions.PermissionDenied("Consumer project 1500023 has been suspended"), False),
+    (RuntimeError("429 quota exceeded, limit: 1500, retry in 404ms"), False),
+    (RuntimeError("400 API key not valid"), False),
+])
+def test_model_errors(error, unusable):
+    assert backend._llm_model_error(error) is unusable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Stub Gemini: models named in `down` raise NotFound; every call is logged in `calls`."""
+    clock = Clock()
+    state = {"down": set(), "calls": [], "built": []}
+
+    class StubModel:
+        def __init__(self, name):
+            state["built"].append(name)
+            self.name = name
+
+        def generate_content(self, prompt):
+            state["calls"].append(self.name)
+            if self.name in state["down"]:
+                raise google_exceptions.NotFound(f"{self.name} is not found")
+            if "quota" in state["down"]:
+                raise google_exceptions.TooManyRequests("Quota exceeded")
+            return type("Response", (), {"text": f"answer from {self.name}"})()
+
+    monkeypatch.setattr(backend, "GEMINI_API_KEY", "stub-key")
+    monkeypatch.setattr(backend.genai, "GenerativeModel", StubModel)
+    monkeypatch.setattr(backend, "_LLM_STATE", {"clients": {}, "resolved": None, "breakers": {}})
+    monkeypatch.setattr(backend.time, "monotonic", clock)
+    state["clock"] = clock
+    return state
+
+
+def test_resolved_model_is_reused_within_ttl(models):
+    first, second, third = backend._LLM_MODELS[:3]
+    models["down"] = {first, second}
+    assert backend._llm_chat("q") == (f"answer from {third}", {"model": third})
+    assert models["calls"] == [first, second, third]
+    models["calls"].clear()
+    for _ in range(5):
+        models["clock"].now += 60
+        assert backend._llm_chat("q")[1] == {"model": third}
+    assert models["calls"] == [third] * 5
+    # Once the TTL is over, preferred models whose breakers closed are tried again
+    models["clock"].now += backend.LLM_MODEL_TTL_SECONDS
+    models["calls"].clear()
+    backend._llm_chat("q")
+    assert models["calls"] == [first, second, third]
+
+
+def test_breaker_backs_off_and_recovers(models):
+    first, second = backend._LLM_MODELS[:2]
+    models["down"] = {first}
+    backend._llm_chat("q")
+    assert backend._LLM_STATE["breakers"][first] == (1, models["clock"].now + backend.LLM_BREAKER_SECONDS)
+    backend._LLM_STATE["resolved"] = None
+    models["calls"].clear()
+    backend._llm_chat("q")
+    assert models["calls"] == [second]  # Skipped while the breaker is open
+    # Retried once it closes; a second failure doubles the backoff
+    models["clock"].now += backend.LLM_BREAKER_SECONDS
+    backend._LLM_STATE["resolved"] = None
+    models["calls"].clear()
+    backend._llm_chat("q")
+    assert models["calls"] == [first, second]
+    assert backend._LLM_STATE["breakers"][first] == (2, models["clock"].now + 2 * backend.LLM_BREAKER_SECONDS)
+    # Back up: the next try closes the breaker and the model is preferred again
+    models["down"] = set()
+    models["clock"].now += 2 * backend.LLM_BREAKER_SECONDS
+    backend._LLM_STATE["resolved"] = None
+    assert backend._llm_chat("q")[1] == {"model": first}
+    assert first not in backend._LLM_STATE["breakers"]
+
+
+def test_backoff_is_capped(models):
+    first = backend._LLM_MODELS[0]
+    models["down"] = {first}
+    for _ in range(20):
+        backend._LLM_STATE["resolved"] = None
+        backend._llm_chat("q")
+        models["clock"].now = backend._LLM_STATE["breakers"][first][1]
+    assert backend._LLM_STATE["breakers"][first][0] == 20
+    backend._LLM_STATE["resolved"] = None
+    backend._llm_chat("q")
+    assert backend._LLM_STATE["breakers"][first][1] - models["clock"].now == backend._LLM_BREAKER_MAX_SECONDS
+
+
+def test_quota_errors_stop_without_opening_breakers(models):
+    models["down"] = {"quota"}
+    with pytest.raises(RuntimeError, match="Quota exceeded"):
+        backend._llm_chat("q")
+    assert models["calls"] == backend._LLM_MODELS[:1]
+    assert backend._LLM_STATE["breakers"] == {}
+
+
+def test_clients_are_reused(models):
+    models["down"] = {backend._LLM_MODELS[0]}
+    for _ in range(5):
+        backend._LLM_STATE["resolved"] = None
+        models["clock"].now += backend.LLM_BREAKER_SECONDS * 100
+        backend._llm_chat("q")
+    assert sorted(models["built"]) == sorted(backend._LLM_MODELS[:2])
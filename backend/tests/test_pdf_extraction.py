@@ -0,0 +1,22 @@
+"""Kotak PDF pages extracted by the process pool, against a single-process extraction."""
+import io
+import os
+
+import pytest
+
+import app as backend
+
+STATEMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          "MykotakSatementsampless")
+
+
+@pytest.mark.parametrize("name", sorted(os.listdir(STATEMENTS)))
+def test_parallel_extraction_matches_sequential(monkeypatch, name):
+    monkeypatch.setattr(backend, "PDF_PARALLEL_MIN_PAGES", 1)
+    with open(os.path.join(STATEMENTS, name), "rb") as f:
+        data = f.read()
+    sequential = backend._extract_pdf_kotak(io.BytesIO(data), workers=1)
+    parallel = backend._extract_pdf_kotak(io.BytesIO(data), workers=2)
+    assert len(sequential) > 0
+    assert parallel.reset_index(drop=True).equals(sequential.reset_index(drop=True))
+    assert backend._PDF_POOL["workers"] == 2
@@ -0,0 +1,74 @@
+"""Hybrid-mode /chat answers computed locally by _query_plan / _answer_query_plan."""
+import pandas as pd
+import pytest
+
+import app as backend
+
+ROWS = [
+    ("2024-12-24", "UPI Payment - Zomato", "Food & Dining", -600.00),
+    ("2025-03-02", "UPI Payment - Swiggy", "Food & Dining", -250.00),
+    ("2025-03-15", "UPI Payment - Zomato", "Food & Dining", -400.00),
+    ("2025-04-03", "UPI Payment - Swiggy", "Food & Dining", -150.00),
+    ("2025-04-20", "UPI Payment - Amazon", "Shopping", -1200.00),
+    ("2025-05-05", "UPI Payment - Amazon", "Shopping", -800.00),
+    ("2025-05-10", "Salary Credit", "Income", 50000.00),
+    ("2025-05-18", "UPI Payment - Uber India", "Transportation", -320.00),
+    ("2025-06-01", "UPI Payment - Uber India", "Transportation", 90.00),
+    ("2025-06-12", "ATM Cash Withdrawal", "Cash Withdrawal", -2000.00),
+]
+
+
+@pytest.fixture
+def headers(client, session, monkeypatch):
+    monkeypatch.setattr(backend, "ANSWER_MODE", "hybrid")
+    df = pd.DataFrame(ROWS, columns=["Date", "Description", "Category", "Amount"])
+    return session(df.assign(Date=pd.to_datetime(df["Date"])))
+
+
+def ask(client, headers, question):
+    return client.post("/chat", json={"query": question}, headers=headers).get_json()
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What is my total spending?", "Your total spending is 44370.00."),
+    ("How much did I spend on Shopping?", "You spent -2000.00 on Shopping."),
+    ("how much on food in March 2025", "You spent -650.00 on Food & Dining in March 2025."),
+    ("How much did I spend in May 2025?", "You spent 48880.00 in May 2025."),
+    ("how much did I spend on swiggy and zomato", "You spent -1400.00 at swiggy and zomato."),
+    ("How many zomato transactions?", "You have 2 transactions at zomato."),
+    ("average amazon payment", "Your average transaction at amazon is -1000.00."),
+    ("How much did I spend from 2025-04-01 to 2025-04-30?", "You spent -1350.00 from 2025-04-01 to 2025-04-30."),
+    ("how many transactions over 1000 in 2025", "You have 3 transactions in 2025 over Rs 1000."),
+    ("how many transactions in 2023", "You have 0 transactions in 2023."),
+    # A span that ends before it starts holds no transactions
+    ("from march 2025 to january 2020 how much", "You spent 0.00 from March 2025 to January 2020."),
+    ("how many transactions from june 2025 to march 2025", "You have 0 transactions from June 2025 to March 2025."),
+])
+def test_local_answers(client, headers, question, answer):
+    payload = ask(client, headers, question)
+    assert payload["response"] == answer
+    assert payload["meta"]["rule"] == "query"
+
+
+@pytest.mark.parametrize("question, amount, description", [
+    # Unscoped extremes are signed; scoped ones rank by size, so expenses are not "lowest"
+    ("Show my highest transaction", "50000.00", "Salary Credit"),
+    ("highest food transaction", "-600.00", "UPI Payment - Zomato"),
+    ("lowest uber india payment", "90.00", "UPI Payment - Uber India"),
+])
+def test_extremes(client, headers, question, amount, description):
+    response = ask(client, headers, question)["response"]
+    assert f" is {amount} on " in response
+    assert response.endswith(description)
+
+
+@pytest.mark.parametrize("question", [
+    "Where can I save money?",
+    "how much did I spend last week",
+    "how much may i spend",
+    "how much did I spend on swiggy and flipkart",
+    "which category do I spend the most on",
+])
+def test_other_questions_go_to_the_llm(client, headers, question):
+    assert backend._query_plan(backend._get_session(headers["X-Session-Id"]), question) is None
+    assert ask(client, headers, question)["meta"]["rule"] == "no-llm"
@@ -0,0 +1,50 @@
+"""Recurring-payment detection on planted subscriptions among non-periodic repeat merchants."""
+import numpy as np
+import pandas as pd
+
+import app as backend
+
+
+def payments(name: str, days, amounts) -> pd.DataFrame:
+    days = np.asarray(days)
+    return pd.DataFrame({"Date": pd.Timestamp("2024-01-05") + pd.to_timedelta(days, unit="D"),
+                         "Description": name, "Category": "Other",
+                         "Amount": np.broadcast_to(np.asarray(amounts, dtype=float), days.shape)})
+
+
+def planted() -> pd.DataFrame:
+    rng = np.random.default_rng(19)
+    frames = [
+        # Subscriptions, paid a day or two early or late
+        payments("Gym Weekly", np.arange(20) * 7 + rng.integers(-1, 2, 20), -300),
+        payments("Spotify", np.round(np.arange(12) * 30.44) + rng.integers(-2, 3, 12), -119),
+        # A price rise halfway still reads as one subscription
+        payments("Netflix", np.round(np.arange(10) * 30.44), [-499] * 5 + [-549] * 5),
+        payments("Amazon Prime", [0, 366, 730], -1499),
+        # Repeat merchants without a rhythm, or without a steady amount
+        payments("Swiggy", np.sort(rng.choice(700, 25, replace=False)), -250),
+        payments("Grocery Store", np.round(np.arange(12) * 30.44), -rng.uniform(500, 3000, 12).round(2)),
+        payments("Fuel", [0, 3, 50, 52, 140, 300], -2000),
+        # Too few payments to tell
+        payments("Insurance", [0, 365], -12000),
+    ]
+    df = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+    return backend._compact_transactions(df)
+
+
+def test_planted_subscriptions_are_found():
+    recurring = backend._recurring_payments(planted())
+    assert dict(recurring["period"]) == {"Gym Weekly": "weekly", "Spotify": "monthly", "Netflix": "monthly",
+                                         "Amazon Prime": "yearly"}
+    assert recurring.loc["Amazon Prime", "amount"] == -1499
+    assert recurring.loc["Gym Weekly", "count"] == 20
+    # Costliest first
+    assert list(recurring["annual_cost"]) == sorted(recurring["annual_cost"], reverse=True)
+
+
+def test_recurring_endpoint(client, session):
+    headers = session(planted())
+    payload = client.get("/recurring", headers=headers).get_json()
+    merchants = {payment["merchant"]: payment["period"] for payment in payload["recurring"]}
+    assert merchants == {"Gym Weekly": "weekly", "Spotify": "monthly", "Netflix": "monthly", "Amazon Prime": "yearly"}
+    assert payload["annualTotal"] == sum(payment["annualCost"] for payment in payload["recurring"])
@@ -0,0 +1,59 @@
+"""/chat retrieval context: the transactions a question is about, within CHAT_CONTEXT_ROWS."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def headers(session):
+    rng = np.random.default_rng(22)
+    count = 20_000
+    noise = pd.DataFrame({
+        "Date": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730, count), unit="D"),
+        "Description": [f"UPI Payment - Shop {i}" for i in rng.integers(0, 2000, count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation"], count),
+        "Amount": -rng.gamma(2.0, 400.0, count).round(2),
+    })
+    planted = pd.DataFrame({
+        "Date": pd.to_datetime(["2025-03-01"] * 30 + ["2025-05-01"] * 30 + ["2024-07-01"] * 20)
+        + pd.to_timedelta(np.r_[np.arange(30) % 28, np.arange(30) % 28, np.arange(20)], unit="D"),
+        "Description": ["POS DMART Thane"] * 60 + ["Zerodha Broking"] * 20,
+        "Category": ["Groceries"] * 60 + ["Investments"] * 20,
+        "Amount": np.r_[-rng.uniform(100, 900, 60).round(2), -np.arange(1000.0, 11000.0, 500.0)],
+    })
+    df = pd.concat([noise, planted], ignore_index=True).sample(frac=1, random_state=0).reset_index(drop=True)
+    return session(df)
+
+
+@pytest.mark.parametrize("question, relevant", [
+    ("How much did I spend at DMART in March 2025?",
+     lambda df: (df["Description"] == "POS DMART Thane") & (df["Date"].dt.strftime("%Y-%m") == "2025-03")),
+    ("Zerodha investments over 4000?",
+     lambda df: (df["Description"] == "Zerodha Broking") & (df["Amount"].abs() > 4000)),
+])
+def test_retrieval_returns_relevant_rows(client, headers, question, relevant):
+    entry = backend._get_session(headers["X-Session-Id"])
+    rows = backend._retrieve_rows(entry, question, backend.CHAT_CONTEXT_ROWS)
+    wanted = np.flatnonzero(relevant(entry["df"]).to_numpy())
+    assert len(rows) <= backend.CHAT_CONTEXT_ROWS
+    assert set(wanted) <= set(rows)
+    # Rows of the merchant outside the question's ranges are left out
+    merchant = entry["df"]["Description"].iloc[wanted[0]]
+    assert set(np.flatnonzero((entry["df"]["Description"] == merchant).to_numpy())) & set(rows) == set(wanted)
+
+
+def test_prompt_stays_within_budget(client, headers, monkeypatch):
+    prompts = []
+    monkeypatch.setattr(backend, "ANSWER_MODE", "ai-only")
+    monkeypatch.setattr(backend, "CHAT_CONTEXT_MODE", "retrieval")
+    monkeypatch.setattr(backend, "CHAT_CACHE_MAX_MB", 0)
+    monkeypatch.setattr(backend, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(backend, "_llm_chat", lambda prompt: (prompts.append(prompt) or "ok", {"model": "stub"}))
+    response = client.post("/chat", json={"query": "How much did I spend at DMART in March 2025?"}, headers=headers)
+    assert response.status_code == 200
+    lines = [line for line in prompts[0].splitlines() if line.startswith("On ")]
+    assert len(lines) <= backend.CHAT_CONTEXT_ROWS
+    assert sum("DMART" in line and line.startswith("On 2025-03") for line in lines) == 30
+    assert len(prompts[0]) < backend.CSV_CONTEXT_MAX_CHARS // 4
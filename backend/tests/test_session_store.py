@@ -0,0 +1,57 @@
+"""Session memory accounting and eviction."""
+import numpy as np
+import pandas as pd
+
+import app as backend
+
+
+def transactions(count: int) -> pd.DataFrame:
+    rng = np.random.default_rng(count)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, count), unit="D"),
+        "Description": [f"UPI Payment - Merchant {i}" for i in rng.integers(0, count // 4, count)],
+        "Category": rng.choice(["Food & Dining", "Shopping", "Transportation"], count),
+        "Amount": -rng.integers(1, 5000, count).astype(float),
+    })
+
+
+def test_on_demand_data_is_accounted(client, session):
+    sid = session(transactions(2000))["X-Session-Id"]
+    entry = backend._get_session(sid)
+    stored = entry["bytes"]
+    backend._retrieval_index(entry)
+    backend._filter_index(entry)
+    for month in range(1, 11):
+        backend._filtered_view(entry, (pd.Timestamp(f"2025-{month:02d}-01"), None, (), ()))
+    backend._chat_context(entry, None)
+    assert len(entry["views"]) == backend._FILTER_VIEWS_MAX
+    assert entry["bytes"] > stored
+    assert entry["bytes"] == backend._entry_bytes(entry)
+
+
+def test_cached_payloads_are_accounted(client, session):
+    headers = session(transactions(2000))
+    entry = backend._get_session(headers["X-Session-Id"])
+    sections = list(backend._ANALYTICS_SECTIONS)
+    for query in ["", "?from=2025-03-01"]:
+        assert client.get("/dashboard" + query, headers=headers).status_code == 200
+        for first in sections:
+            for second in sections:
+                url = f"/advanced-analytics{query}{'&' if query else '?'}sections={first},{second}"
+                assert client.get(url, headers=headers).status_code == 200
+    assert len(entry["payloads"]) == backend._PAYLOADS_MAX
+    (view,) = entry["views"].values()
+    assert len(view["payloads"]) == backend._PAYLOADS_MAX
+    assert view["bytes"] == backend._nbytes(next(iter(entry["views"]))) \
+        + backend._nbytes(view["aggregates"]) + backend._nbytes(view["payloads"])
+    assert entry["bytes"] == backend._entry_bytes(entry)
+
+
+def test_growing_session_evicts_older_ones(client, session, monkeypatch):
+    older = session(transactions(2000))["X-Session-Id"]
+    newer = session(transactions(2000))["X-Session-Id"]
+    entry = backend._get_session(newer)
+    monkeypatch.setattr(backend, "SESSION_STORE_MAX_MB", (backend._get_session(older)["bytes"] + entry["bytes"] + 1) / 2 ** 20)
+    backend._retrieval_index(entry)
+    assert backend._get_session(older) is None
+    assert backend._get_session(newer) is entry
@@ -0,0 +1,51 @@
+"""Streamed CSV uploads must profile the statement like whole-file ones."""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import app as backend
+
+SAMPLES = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def statement(name: str, repeat=()) -> bytes:
+    """A sample statement with the rows at positions `repeat` appended again."""
+    df = pd.read_csv(os.path.join(SAMPLES, name), dtype=str, keep_default_na=False)
+    return pd.concat([df, df.iloc[list(repeat)]]).to_csv(index=False).encode()
+
+
+@pytest.mark.parametrize("bank, name, repeat", [
+    ("sbi", "sbi_sample.csv", ()),
+    ("sbi", "sbi_sample.csv", (1, 2, 2, 7, 0)),
+    ("kotak", "kotak_sample.csv", (3, 30)),
+    ("axis", "axis_sample.csv", (0,)),
+])
+@pytest.mark.parametrize("chunk_rows", [3, 7])
+def test_streamed_profile_matches_whole_file(monkeypatch, bank, name, repeat, chunk_rows):
+    data = statement(name, repeat)
+    monkeypatch.setattr(backend, "CSV_CHUNK_ROWS", 0)
+    whole = backend._parse_upload(io.BytesIO(data), bank, name)[2]
+    monkeypatch.setattr(backend, "CSV_CHUNK_ROWS", chunk_rows)
+    streamed = backend._parse_upload(io.BytesIO(data), bank, name)[2]
+    assert streamed == whole
+    assert whole["duplicates"] == len(repeat)
+
+
+@pytest.mark.parametrize("chunk_rows", [0, 3])
+def test_append_over_known_chunks(client, monkeypatch, chunk_rows):
+    # Chunks made only of rows already in the session must not add their raw columns
+    monkeypatch.setattr(backend, "CSV_CHUNK_ROWS", chunk_rows)
+    monkeypatch.setattr(backend, "PARSE_CACHE_DIR", "")
+    monkeypatch.setattr(backend, "ASYNC_UPLOADS", False)
+    headers = {"X-Session-Id": f"append-known-{chunk_rows}"}
+    df = pd.read_csv(os.path.join(SAMPLES, "sbi_sample.csv"), dtype=str, keep_default_na=False)
+    for data, mode in ((df.iloc[:6].to_csv(index=False).encode(), "replace"), (statement("sbi_sample.csv"), "append")):
+        response = client.post("/upload", headers=headers, data={
+            "bank": "sbi", "mode": mode, "file": (io.BytesIO(data), "statement.csv")})
+        assert response.status_code == 200
+    quality = client.get("/advanced-analytics", headers=headers).get_json()["dataQuality"]
+    assert quality["total"] == 10
+    assert (quality["missing"], quality["completeness"]) == (0, 100)
+    assert "Txn Date" not in backend._get_session(headers["X-Session-Id"])["profile"]["columns"]
@@ -18,6 +18,7 @@ export class UploadPage implements OnInit {
   detectedBank: string | null = null;
   fileStructure: any = null;
   uploadTimer: number = 0;
+  uploadStage: string = '';
   private timerInterval: any;
 
   @ViewChild('fileInput') fileInput!: ElementRef;
@@ -180,6 +181,11 @@ export class UploadPage implements OnInit {
       next: (response: any) => {
         console.log('Upload success:', response);
         sessionStorage.removeItem('aiInsights');
+        if (response.job_id) {
+          // Async ingestion: wait for the background job before opening the dashboard
+          this.waitForUploadJob(response.job_id);
+          return;
+        }
         setTimeout(() => {
           this.router.navigate(['/dashboard']);
         }, 500);
@@ -197,4 +203,26 @@ export class UploadPage implements OnInit {
       }
     });
   }
+
+  waitForUploadJob(jobId: string): void {
+    this.financeService.getUploadStatus(jobId).subscribe({
+      next: (job: any) => {
+        this.uploadStage = `${job.stage} (${job.percent}%)`;
+        if (job.status === 'done') {
+          this.uploadStage = '';
+          this.router.navigate(['/dashboard']);
+        } else if (job.status === 'error') {
+          this.uploadStage = '';
+          alert('Upload failed. ' + (job.error || 'Please try again.'));
+        } else {
+          setTimeout(() => this.waitForUploadJob(jobId), 1000);
+        }
+      },
+      error: (error: any) => {
+        console.error('Upload status error:', error);
+        this.uploadStage = '';
+        alert('Upload failed. ' + (error.message || 'Please try again.'));
+      }
+    });
+  }
 }
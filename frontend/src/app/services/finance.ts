@@ -1,5 +1,5 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpHeaders } from '@angular/common/http';
 import { Observable } from 'rxjs';
 
 @Injectable({
@@ -7,29 +7,79 @@ import { Observable } from 'rxjs';
 })
 export class FinanceService {
   private apiBaseUrl = 'http://localhost:5000';
+  // The backend keeps one dataset per session id, so each browser gets its own data
+  private headers = new HttpHeaders({ 'X-Session-Id': FinanceService.sessionId() });
 
   constructor(private http: HttpClient) { }
 
+  private static sessionId(): string {
+    let id = localStorage.getItem('financeSessionId');
+    if (!id) {
+      id = crypto.randomUUID();
+      localStorage.setItem('financeSessionId', id);
+    }
+    return id;
+  }
+
   pingBackend(): Observable<any> {
     return this.http.get(this.apiBaseUrl);
   }
 
-  uploadFile(file: File, bankType: string): Observable<any> {
+  uploadFile(file: File, bankType: string, mode: 'replace' | 'append' = 'replace'): Observable<any> {
     const formData = new FormData();
     formData.append('file', file);
     formData.append('bank', bankType);
-    return this.http.post(`${this.apiBaseUrl}/upload`, formData);
+    formData.append('mode', mode);
+    return this.http.post(`${this.apiBaseUrl}/upload`, formData, { headers: this.headers });
+  }
+
+  getUploadStatus(jobId: string): Observable<any> {
+    return this.http.get(`${this.apiBaseUrl}/upload/status/${jobId}`, { headers: this.headers });
   }
 
   getDashboardData(): Observable<any> {
-    return this.http.get(`${this.apiBaseUrl}/dashboard`);
+    return this.http.get(`${this.apiBaseUrl}/dashboard`, { headers: this.headers });
   }
 
   getChatResponse(message: string): Observable<any> {
-    return this.http.post(`${this.apiBaseUrl}/chat`, { message });
+    return this.http.post(`${this.apiBaseUrl}/chat`, { message }, { headers: this.headers });
+  }
+
+  // Server-Sent Events from /chat/stream: {delta} messages as the answer is written, then {done, response, meta}
+  streamChatResponse(query: string): Observable<any> {
+    return new Observable((observer) => {
+      const controller = new AbortController();
+      fetch(`${this.apiBaseUrl}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-Session-Id': FinanceService.sessionId() },
+        body: JSON.stringify({ query }),
+        signal: controller.signal,
+      }).then(async (response) => {
+        const reader = response.body!.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += value;
+          const messages = buffer.split('\n\n');
+          buffer = messages.pop()!;
+          for (const message of messages) {
+            if (message.startsWith('data: ')) {
+              observer.next(JSON.parse(message.slice(6)));
+            }
+          }
+        }
+        observer.complete();
+      }).catch((error) => observer.error(error));
+      return () => controller.abort();
+    });
   }
 
   getAdvancedAnalytics(): Observable<any> {
-    return this.http.get(`${this.apiBaseUrl}/advanced-analytics`);
+    return this.http.get(`${this.apiBaseUrl}/advanced-analytics`, { headers: this.headers });
+  }
+
+  getRecurringPayments(): Observable<any> {
+    return this.http.get(`${this.apiBaseUrl}/recurring`, { headers: this.headers });
   }
 }